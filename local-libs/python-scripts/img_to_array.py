@@ -1,81 +1,237 @@
 #!/usr/bin/env python3
 
-# Converts a grayscale image into a format able to be
+# Converts grayscale images into a format able to be
 # displayed by the SSD1306 driver in horizontal addressing mode
 
 # usage: python3 img_to_array.py <logo.bmp>
+#        python3 img_to_array.py assets/ --out-dir include/   (every image in a directory)
+#        python3 img_to_array.py walk.png --sprite 32x32      (sprite sheet, one array per frame)
+#        python3 img_to_array.py logo.bmp --width 128 --height 64
+#        python3 img_to_array.py frames/ --animation walk      (keyframe + RLE deltas, see oled_anim.py)
 
-# depends on the Pillow library
-# `python3 -m pip install --upgrade Pillow`
+# depends on the Pillow and NumPy libraries
+# `python3 -m pip install --upgrade Pillow numpy`
 
-from PIL import Image
+import argparse
+import hashlib
+import json
 import sys
 from pathlib import Path
 
+import numpy as np
+from PIL import Image
+
+from oled_anim import encode_animation
+
 OLED_HEIGHT = 32
 OLED_WIDTH = 128
 OLED_PAGE_HEIGHT = 8
 
-if len(sys.argv) < 2:
-    print("No image path provided.")
-    sys.exit()
-
-img_path = sys.argv[1]
-
-try:
-    im = Image.open(img_path)
-except OSError:
-    raise Exception("Oops! The image could not be opened.")
-
-img_width = im.size[0]
-img_height = im.size[1]
-
-if img_width > OLED_WIDTH or img_height > OLED_HEIGHT:
-    print(f'Your image is f{img_width} pixels wide and {img_height} pixels high, but...')
-    raise Exception(f"OLED display only {OLED_WIDTH} pixels wide and {OLED_HEIGHT} pixels high!")
-
-if not (im.mode == "1" or im.mode == "L"):
-    raise Exception("Image must be grayscale only")
-
-# black or white
-out = im.convert("1")
-
-img_name = Path(im.filename).stem
-
-# `pixels` is a flattened array with the top left pixel at index 0
-# and bottom right pixel at the width*height-1
-pixels = list(out.getdata())
-
-# swap white for black and swap (255, 0) for (1, 0)
-pixels = [0 if x == 255 else 1 for x in pixels]
-
-# our goal is to divide the image into 8-pixel high pages
-# and turn a pixel column into one byte, eg for one page:
-# 0 1 0 ....
-# 1 0 0
-# 1 1 1
-# 0 0 1
-# 1 1 0
-# 0 1 0
-# 1 1 1
-# 0 0 1 ....
-
-# we get 0x6A, 0xAE, 0x33 ... and so on
-# as `pixels` is flattened, each bit in a column is IMG_WIDTH apart from the next
-
-buffer = []
-for i in range(img_height // OLED_PAGE_HEIGHT):
-    start_index = i*img_width*OLED_PAGE_HEIGHT
-    for j in range(img_width):
-        out_byte = 0
-        for k in range(OLED_PAGE_HEIGHT):
-            out_byte |= pixels[k*img_width + start_index + j] << k
-        buffer.append(f'{out_byte:#04x}')
-
-buffer = ", ".join(buffer)
-buffer_hex = f'static uint8_t {img_name}[] = {{{buffer}}}\n'
-
-with open(f'{img_name}.h', 'wt') as file:
-    file.write(f'#define IMG_WIDTH {img_width}\n')
-    file.write(f'#define IMG_HEIGHT {img_height}\n\n')
-    file.write(buffer_hex)
+IMAGE_SUFFIXES = {".bmp", ".png", ".gif", ".pbm", ".pgm", ".tif", ".tiff"}
+CACHE_NAME = ".img_to_array_cache.json"
+# bump when the generated output changes, so cached headers are rebuilt
+FORMAT_VERSION = 2
+
+
+def load_bitmap(img_path):
+    """Open a grayscale image and return it as a (height, width) bool array, True = pixel on"""
+    try:
+        im = Image.open(img_path)
+    except OSError:
+        raise Exception(f"Oops! The image {img_path} could not be opened.")
+
+    if not (im.mode == "1" or im.mode == "L"):
+        raise Exception(f"{img_path}: image must be grayscale only")
+
+    # black or white; white is off and black is on
+    return ~np.asarray(im.convert("1"), dtype=bool)
+
+
+def pack_pages(bitmap):
+    """Pack a (height, width) bitmap into SSD1306 page bytes
+
+    Each 8-pixel high page becomes `width` bytes, one per column, with the
+    top pixel of the column in bit 0. A height that is not a multiple of 8
+    is padded with off pixels instead of dropping the last rows.
+    """
+    height, width = bitmap.shape
+    pages = -(-height // OLED_PAGE_HEIGHT)
+    padded = np.zeros((pages * OLED_PAGE_HEIGHT, width), dtype=np.uint8)
+    padded[:height] = bitmap
+    # (pages, 8, width): bit-pack the 8 rows of every column of every page
+    return np.packbits(padded.reshape(pages, OLED_PAGE_HEIGHT, width), axis=1, bitorder="little").ravel()
+
+
+def split_sprites(bitmap, frame_width, frame_height):
+    """Cut a sprite sheet into frames, left to right and top to bottom: (frames, h, w)"""
+    height, width = bitmap.shape
+    if width % frame_width or height % frame_height:
+        raise Exception(f"Sprite sheet of {width}x{height} is not a grid of {frame_width}x{frame_height} frames")
+    rows, cols = height // frame_height, width // frame_width
+    return (bitmap.reshape(rows, frame_height, cols, frame_width)
+            .transpose(0, 2, 1, 3)
+            .reshape(rows * cols, frame_height, frame_width))
+
+
+def c_array(name, data):
+    """`static uint8_t name[] = {...};` with 16 bytes per line"""
+    lines = []
+    for start in range(0, len(data), 16):
+        lines.append("    " + ", ".join(f"{byte:#04x}" for byte in data[start:start + 16].tolist()))
+    return f"static uint8_t {name}[] = {{\n" + ",\n".join(lines) + "\n};\n"
+
+
+def c_offsets(name, offsets):
+    """`static uint32_t name[] = {...};` with 8 offsets per line"""
+    lines = []
+    for start in range(0, len(offsets), 8):
+        lines.append("    " + ", ".join(str(offset) for offset in offsets[start:start + 8]))
+    return f"static uint32_t {name}[] = {{\n" + ",\n".join(lines) + "\n};\n"
+
+
+def check_size(name, width, height, oled_width, oled_height):
+    if width > oled_width or height > oled_height:
+        print(f"{name} is {width} pixels wide and {height} pixels high, but...")
+        raise Exception(f"OLED display only {oled_width} pixels wide and {oled_height} pixels high!")
+
+
+def image_header(name, bitmap, oled_width, oled_height):
+    """Header for a single image, as the original script wrote it"""
+    height, width = bitmap.shape
+    check_size(name, width, height, oled_width, oled_height)
+    return (f"#define IMG_WIDTH {width}\n"
+            f"#define IMG_HEIGHT {height}\n\n"
+            + c_array(name, pack_pages(bitmap)))
+
+
+def sprite_header(name, bitmap, frame_width, frame_height, oled_width, oled_height):
+    """Header for a sprite sheet: one array per frame plus a table of frames"""
+    check_size(name, frame_width, frame_height, oled_width, oled_height)
+    frames = split_sprites(bitmap, frame_width, frame_height)
+    prefix = name.upper()
+    out = [f"#define {prefix}_WIDTH {frame_width}\n",
+           f"#define {prefix}_HEIGHT {frame_height}\n",
+           f"#define {prefix}_FRAMES {len(frames)}\n\n"]
+    for i, frame in enumerate(frames):
+        out.append(c_array(f"{name}_{i}", pack_pages(frame)))
+    out.append(f"\nstatic uint8_t *{name}_frames[] = {{"
+               + ", ".join(f"{name}_{i}" for i in range(len(frames))) + "};\n")
+    return "".join(out)
+
+
+def animation_header(name, bitmaps, oled_width, oled_height):
+    """Header for an animation: keyframe + RLE delta stream and where every frame starts"""
+    height, width = bitmaps[0].shape
+    if any(bitmap.shape != (height, width) for bitmap in bitmaps):
+        raise Exception(f"{name}: every frame of an animation must be {width}x{height}")
+    check_size(name, width, height, oled_width, oled_height)
+    pages = -(-height // OLED_PAGE_HEIGHT)
+    frames = np.stack([pack_pages(bitmap).reshape(pages, width) for bitmap in bitmaps])
+    stream, offsets = encode_animation(frames)
+    prefix = name.upper()
+    return (f"#define {prefix}_WIDTH {width}\n"
+            f"#define {prefix}_HEIGHT {height}\n"
+            f"#define {prefix}_PAGES {pages}\n"
+            f"#define {prefix}_FRAMES {len(frames)}\n\n"
+            + c_array(f"{name}_anim", np.frombuffer(stream, dtype=np.uint8)) + "\n"
+            + c_offsets(f"{name}_offsets", offsets))
+
+
+def collect_images(paths):
+    """Expand directories into the images they contain (sorted by name)"""
+    images = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            images.extend(sorted(p for p in path.iterdir() if p.suffix.lower() in IMAGE_SUFFIXES))
+        else:
+            images.append(path)
+    return images
+
+
+def content_hash(img_paths, options):
+    digest = hashlib.sha256()
+    for img_path in img_paths:
+        digest.update(img_path.read_bytes())
+    digest.update(json.dumps(options, sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+def parse_size(text):
+    try:
+        width, height = (int(v) for v in text.lower().split("x"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid size '{text}' (WIDTHxHEIGHT, e.g. 32x32)")
+    return width, height
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert grayscale images to SSD1306 page arrays")
+    parser.add_argument("images", nargs="+", help="image files or directories of images")
+    parser.add_argument("--width", type=int, default=OLED_WIDTH, help="display width in pixels")
+    parser.add_argument("--height", type=int, default=OLED_HEIGHT, help="display height in pixels")
+    parser.add_argument("--sprite", type=parse_size, default=None,
+                        help="treat every image as a sprite sheet of WIDTHxHEIGHT frames")
+    parser.add_argument("--animation", metavar="NAME", default=None,
+                        help="encode all the frames, in order, as one animation in NAME.h")
+    parser.add_argument("--out-dir", default=".", help="directory for the generated headers")
+    parser.add_argument("--force", action="store_true", help="ignore the cache and regenerate everything")
+    args = parser.parse_args()
+
+    out_dir = Path(args.out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    cache_path = out_dir / CACHE_NAME
+    cache = {}
+    if cache_path.exists() and not args.force:
+        try:
+            cache = json.loads(cache_path.read_text())
+        except ValueError:
+            cache = {}
+
+    options = {"version": FORMAT_VERSION, "width": args.width, "height": args.height, "sprite": args.sprite}
+    images = collect_images(args.images)
+    if not images:
+        print("No image path provided.")
+        sys.exit(1)
+
+    if args.animation:
+        header_path = out_dir / f"{args.animation}.h"
+        digest = content_hash(images, dict(options, animation=[str(p) for p in images]))
+        if cache.get(str(header_path)) == digest and header_path.exists():
+            print(f"{header_path} unchanged")
+            return
+        bitmaps = []
+        for img_path in images:
+            bitmap = load_bitmap(img_path)
+            bitmaps.extend(split_sprites(bitmap, *args.sprite) if args.sprite else [bitmap])
+        header = animation_header(args.animation, bitmaps, args.width, args.height)
+        with open(header_path, "wt") as file:
+            file.write(header)
+        cache[str(header_path)] = digest
+        cache_path.write_text(json.dumps(cache, indent=1, sort_keys=True))
+        print(f"{header_path}: {len(bitmaps)} frames")
+        return
+
+    generated = 0
+    for img_path in images:
+        name = img_path.stem
+        header_path = out_dir / f"{name}.h"
+        digest = content_hash([img_path], options)
+        if cache.get(str(header_path)) == digest and header_path.exists():
+            continue
+
+        bitmap = load_bitmap(img_path)
+        if args.sprite:
+            header = sprite_header(name, bitmap, *args.sprite, args.width, args.height)
+        else:
+            header = image_header(name, bitmap, args.width, args.height)
+        with open(header_path, "wt") as file:
+            file.write(header)
+        cache[str(header_path)] = digest
+        generated += 1
+
+    cache_path.write_text(json.dumps(cache, indent=1, sort_keys=True))
+    print(f"{generated} header(s) generated, {len(images) - generated} unchanged")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+
+# Keyframe + delta, run-length encoded OLED animations for the SSD1306 driver
+#
+# An animation is a single byte stream:
+#   - frame 0 (keyframe): the whole frame, every page (width bytes) run-length
+#     encoded on its own
+#   - every next frame: delta records against the previous frame, one per
+#     changed page, followed by END:
+#         [page] [first column] [length] RLE(previous XOR current, `length` bytes)
+# XOR leaves unchanged columns inside the record as runs of zeros, which the
+# RLE squeezes to two bytes.
+#
+# RLE control byte c:
+#   c & 0x80 -> the next byte repeated (c & 0x7f) + 2 times (2..129)
+#   else     -> c + 1 literal bytes follow (1..128)
+#
+# ssd1306_anim_draw_next() in ../ssd1306/ssd1306.c decodes the same stream into
+# the display buffer and ssd1306_show_partial() sends only what changed. This
+# module is the host-side reference: encoder, decoder and a size/bandwidth
+# report that simulates the partial update.
+
+# usage: python3 oled_anim.py walk.png --sprite 32x32             (report)
+#        python3 oled_anim.py frames/ --header walk.h             (check a generated header)
+
+# depends on the Pillow and NumPy libraries
+# `python3 -m pip install --upgrade Pillow numpy`
+
+import argparse
+import re
+from pathlib import Path
+
+import numpy as np
+
+END = 0xFF
+MAX_LITERAL = 128
+MAX_REPEAT = 129
+
+# bytes on the wire (address byte included) of the two ways of refreshing
+FULL_COMMAND_BYTES = 6 * 3      # ssd1306_show: six separate [addr, 0x00, cmd] writes
+WINDOW_BYTES = 8                # ssd1306_show_partial: [addr, 0x00, 6 window commands]
+DATA_OVERHEAD = 2               # [addr, 0x40] before every data transfer
+I2C_BITS_PER_BYTE = 9           # 8 data bits + ACK
+
+
+def rle_encode(data):
+    """RLE of a uint8 array (see the control byte at the top)"""
+    data = np.asarray(data, dtype=np.uint8)
+    out = bytearray()
+    if not len(data):
+        return bytes(out)
+    # runs of equal bytes: (value, length)
+    starts = np.flatnonzero(np.diff(data) != 0) + 1
+    lengths = np.diff(np.append(np.insert(starts, 0, 0), len(data)))
+    values = data[np.insert(starts, 0, 0)]
+
+    literal = bytearray()
+
+    def flush_literal():
+        for i in range(0, len(literal), MAX_LITERAL):
+            chunk = literal[i:i + MAX_LITERAL]
+            out.append(len(chunk) - 1)
+            out.extend(chunk)
+        literal.clear()
+
+    for value, length in zip(values.tolist(), lengths.tolist()):
+        # a run of 2 only pays off when it does not split a literal
+        if length >= 3 or (length == 2 and not literal):
+            flush_literal()
+            while length >= 2:
+                n = min(length, MAX_REPEAT)
+                out.append(0x80 | (n - 2))
+                out.append(value)
+                length -= n
+            if length:
+                literal.append(value)
+        else:
+            literal.extend([value] * length)
+    flush_literal()
+    return bytes(out)
+
+
+def rle_decode(stream, pos, count):
+    """Decode `count` bytes starting at stream[pos]; returns (bytes, next position)"""
+    out = bytearray()
+    while len(out) < count:
+        c = stream[pos]
+        if c & 0x80:
+            out.extend(bytes([stream[pos + 1]]) * ((c & 0x7F) + 2))
+            pos += 2
+        else:
+            out.extend(stream[pos + 1:pos + 2 + c])
+            pos += c + 2
+    if len(out) != count:
+        raise ValueError(f"RLE run crosses the end of a record at byte {pos}")
+    return np.frombuffer(bytes(out), dtype=np.uint8), pos
+
+
+def encode_animation(frames):
+    """Encode (frames, pages, width) page bytes; returns (stream, offset of every frame)"""
+    frames = np.asarray(frames, dtype=np.uint8)
+    _, pages, width = frames.shape
+    if pages >= END or width > 255:
+        raise ValueError(f"Animation of {width} columns and {pages} pages does not fit the record format")
+    stream = bytearray(b"".join(rle_encode(row) for row in frames[0]))
+    offsets = [0]
+    for previous, current in zip(frames[:-1], frames[1:]):
+        offsets.append(len(stream))
+        diff = previous ^ current
+        for page in np.flatnonzero(diff.any(axis=1)).tolist():
+            columns = np.flatnonzero(diff[page])
+            first, last = int(columns[0]), int(columns[-1])
+            stream.extend((page, first, last - first + 1))
+            stream.extend(rle_encode(diff[page, first:last + 1]))
+        stream.append(END)
+    return bytes(stream), offsets
+
+
+def decode_animation(stream, frames, pages, width):
+    """Reference decoder: (frames, pages, width) page bytes"""
+    out = np.zeros((frames, pages, width), dtype=np.uint8)
+    pos = 0
+    for page in range(pages):
+        out[0, page], pos = rle_decode(stream, pos, width)
+    for i in range(1, frames):
+        out[i] = out[i - 1]
+        while stream[pos] != END:
+            page, first, length = stream[pos:pos + 3]
+            delta, pos = rle_decode(stream, pos + 3, length)
+            out[i, page, first:first + length] ^= delta
+        pos += 1
+    return out
+
+
+def full_update_bytes(display_pages, display_width):
+    """Bytes on the wire of ssd1306_show"""
+    return FULL_COMMAND_BYTES + DATA_OVERHEAD + display_pages * display_width
+
+
+def partial_update_bytes(panel, buffer):
+    """Bytes on the wire of ssd1306_show_partial going from `panel` to `buffer` (pages, width)"""
+    diff = panel != buffer
+    total = 0
+    for page in np.flatnonzero(diff.any(axis=1)):
+        columns = np.flatnonzero(diff[page])
+        total += WINDOW_BYTES + DATA_OVERHEAD + int(columns[-1] - columns[0] + 1)
+    # the driver falls back to a full refresh when that is cheaper
+    return min(total, full_update_bytes(*buffer.shape))
+
+
+def report(frames, display_width, display_height, stream=None, i2c_khz=(100, 400)):
+    """Lines comparing raw arrays vs keyframe+delta and full vs partial refreshes
+
+    The animation is placed at the top left corner of an otherwise blank display.
+    """
+    frames = np.asarray(frames, dtype=np.uint8)
+    n, pages, width = frames.shape
+    if stream is None:
+        stream, _ = encode_animation(frames)
+    raw = frames.size
+    display_pages = -(-display_height // 8)
+
+    screen = np.zeros((n, display_pages, display_width), dtype=np.uint8)
+    screen[:, :pages, :width] = frames
+    full = full_update_bytes(display_pages, display_width)
+    partial = [partial_update_bytes(screen[i - 1], screen[i]) for i in range(1, n)]
+    # looping back to the keyframe is one more partial update
+    partial.append(partial_update_bytes(screen[-1], screen[0]))
+    partial = np.array(partial)
+
+    lines = [
+        f"{n} frames of {width}x{pages * 8} ({pages} pages) on a {display_width}x{display_height} display",
+        f"Flash: {raw} B as raw arrays, {len(stream)} B as keyframe + RLE deltas "
+        f"({100.0 * len(stream) / raw:.1f}%, {len(stream) / n:.1f} B/frame)",
+        f"I2C per frame: {full} B with ssd1306_show, {partial.mean():.1f} B on average with "
+        f"ssd1306_show_partial (max {partial.max()}, {100.0 * partial.mean() / full:.1f}%)",
+    ]
+    for khz in i2c_khz:
+        bits = 1000.0 * I2C_BITS_PER_BYTE / (khz * 1000.0)
+        lines.append(f"  at {khz} kHz: {full * bits:.2f} ms full, {partial.mean() * bits:.2f} ms partial")
+    return lines
+
+
+def read_header(path):
+    """(stream, offsets, width, height, frames) from a header written by img_to_array.py --animation"""
+    text = Path(path).read_text()
+    defines = dict(re.findall(r"#define \w+_(WIDTH|HEIGHT|FRAMES) (\d+)", text))
+    anim = re.search(r"_anim\[\] = \{(.*?)\};", text, re.S).group(1)
+    offsets = re.search(r"_offsets\[\] = \{(.*?)\};", text, re.S).group(1)
+    return (bytes(int(v, 16) for v in re.findall(r"0x[0-9a-f]+", anim)),
+            [int(v) for v in re.findall(r"\d+", offsets)],
+            int(defines["WIDTH"]), int(defines["HEIGHT"]), int(defines["FRAMES"]))
+
+
+def main():
+    from img_to_array import OLED_WIDTH, OLED_HEIGHT, collect_images, load_bitmap, pack_pages, \
+        parse_size, split_sprites
+
+    parser = argparse.ArgumentParser(description="Size and I2C bandwidth report of an OLED animation")
+    parser.add_argument("images", nargs="+", help="frames in order: image files, directories or sprite sheets")
+    parser.add_argument("--sprite", type=parse_size, default=None, help="cut every image into WIDTHxHEIGHT frames")
+    parser.add_argument("--width", type=int, default=OLED_WIDTH, help="display width in pixels")
+    parser.add_argument("--height", type=int, default=OLED_HEIGHT, help="display height in pixels")
+    parser.add_argument("--header", default=None,
+                        help="also decode this header from img_to_array.py --animation and compare")
+    args = parser.parse_args()
+
+    bitmaps = []
+    for img_path in collect_images(args.images):
+        bitmap = load_bitmap(img_path)
+        bitmaps.extend(split_sprites(bitmap, *args.sprite) if args.sprite else [bitmap])
+    frames = np.stack([pack_pages(b).reshape(-(-b.shape[0] // 8), b.shape[1]) for b in bitmaps])
+
+    stream, _ = encode_animation(frames)
+    if not np.array_equal(decode_animation(stream, *frames.shape), frames):
+        raise Exception("Round trip failed: decoded frames differ from the images")
+    if args.header:
+        stream, offsets, width, height, n = read_header(args.header)
+        decoded = decode_animation(stream, n, -(-height // 8), width)
+        if not np.array_equal(decoded, frames):
+            raise Exception(f"{args.header} does not decode to these images")
+        print(f"{args.header}: {n} frames decode to the images")
+
+    for line in report(frames, args.width, args.height, stream):
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
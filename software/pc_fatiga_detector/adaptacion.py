@@ -0,0 +1,203 @@
+# adaptacion.py - Umbrales EAR/MAR adaptados a la línea base de cada conductor
+# Un umbral EAR fijo de 0.25 no sirve a todos: con ojos estrechos el EAR
+# abierto ronda 0.22 y cada frame parece un cierre. En modo adaptativo se
+# estiman en línea el EAR con ojos abiertos y el MAR con boca neutra del
+# conductor, con memoria constante y O(1) por frame:
+#   - Calentamiento (`calentamiento` s): media y varianza exactas (Welford),
+#     descartando pestañeos y bostezos (muestras a más de 2.5 desviaciones).
+#     Mientras tanto rigen los umbrales fijos.
+#   - Después: media móvil exponencial con semivida de `semivida` s para
+#     seguir cambios lentos (luz, postura de la cámara). No se actualiza
+#     durante un cierre y ni el EAR ni el MAR pueden alejarse más de
+#     `deriva_max` (relativa, ±10 %) de la línea base del calentamiento,
+#     para que un conductor que se va quedando dormido no arrastre el
+#     umbral consigo.
+# Umbrales: EAR < factor_ear × EAR abierto; MAR >= MAR neutro + margen_mar.
+#
+# La línea base se guarda como perfil JSON por conductor (directorio
+# `perfiles/`); en turnos posteriores se carga y no hace falta calentar.
+
+import json
+import math
+import os
+import time
+
+LIMITES_EAR = (0.12, 0.35)
+LIMITES_MAR = (0.10, 0.60)
+DESVIACIONES_ATIPICO = 2.5      # Muestras más alejadas no cuentan para la línea base
+MUESTRAS_MINIMAS = 30           # Antes de esto no se descartan atípicos
+
+
+class EstadisticaEnLinea:
+    """Media y varianza en línea: Welford mientras calienta y EWMA después"""
+
+    def __init__(self):
+        self.n = 0
+        self.media = 0.0
+        self.m2 = 0.0           # Suma de cuadrados de desviaciones (Welford)
+        self.varianza = 0.0
+
+    def atipico(self, x, lado):
+        """True si x se aleja más de 2.5 desviaciones por `lado` (-1 abajo, +1 arriba)"""
+        if self.n < MUESTRAS_MINIMAS:
+            return False
+        return lado * (x - self.media) > DESVIACIONES_ATIPICO * math.sqrt(self.varianza)
+
+    def agregar(self, x):
+        """Actualización exacta (Welford)"""
+        self.n += 1
+        delta = x - self.media
+        self.media += delta / self.n
+        self.m2 += delta * (x - self.media)
+        self.varianza = self.m2 / self.n
+
+    def suavizar(self, x, alfa):
+        """Actualización exponencial con peso `alfa`"""
+        self.n += 1
+        delta = x - self.media
+        self.media += alfa * delta
+        self.varianza = (1.0 - alfa) * (self.varianza + alfa * delta * delta)
+
+
+class AdaptacionConductor:
+    """Línea base de EAR abierto y MAR neutro de un conductor y umbrales derivados"""
+
+    habilitada = True
+
+    def __init__(self, conductor="conductor", directorio="perfiles", calentamiento=30.0,
+                 factor_ear=0.8, margen_mar=0.15, semivida=300.0, deriva_max=0.10):
+        self.conductor = conductor
+        self.ruta = os.path.join(directorio, f"{conductor}.json")
+        self.calentamiento = calentamiento
+        self.factor_ear = factor_ear
+        self.margen_mar = margen_mar
+        self.semivida = semivida
+        self.deriva_max = deriva_max
+
+        self.ear = EstadisticaEnLinea()
+        self.mar = EstadisticaEnLinea()
+        self.lista = False              # Línea base disponible (calentada o cargada)
+        self.ajuste_ear = 0.0           # Ajuste manual con las teclas +/-
+        self._t_inicio = None
+        self._t_previo = None
+        self._ear_referencia = None     # Línea base al terminar el calentamiento
+        self._mar_referencia = None
+        self.cargar()
+
+    def cargar(self):
+        """Cargar el perfil guardado del conductor, si existe (se salta el calentamiento)"""
+        if not os.path.exists(self.ruta):
+            print(f"[INFO] Sin perfil de {self.conductor}: calentamiento de {self.calentamiento:.0f}s")
+            return
+        with open(self.ruta) as f:
+            perfil = json.load(f)
+        for estadistica, clave in ((self.ear, "ear"), (self.mar, "mar")):
+            estadistica.media = perfil[f"{clave}_media"]
+            estadistica.varianza = perfil[f"{clave}_varianza"]
+            estadistica.n = perfil["muestras"]
+        self.ajuste_ear = perfil.get("ajuste_ear", 0.0)
+        self._fijar_referencia()
+        print(f"[INFO] Perfil de {self.conductor} cargado: {self._texto_umbrales()}")
+
+    def guardar(self):
+        """Guardar la línea base actual en el perfil del conductor"""
+        if not self.lista:
+            return
+        os.makedirs(os.path.dirname(self.ruta) or ".", exist_ok=True)
+        perfil = {
+            "conductor": self.conductor,
+            "ear_media": self.ear.media,
+            "ear_varianza": self.ear.varianza,
+            "mar_media": self.mar.media,
+            "mar_varianza": self.mar.varianza,
+            "muestras": self.ear.n,
+            "ajuste_ear": self.ajuste_ear,
+            "actualizado": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        temporal = self.ruta + ".tmp"
+        with open(temporal, "w") as f:
+            json.dump(perfil, f, indent=2)
+        os.replace(temporal, self.ruta)
+        print(f"[INFO] Perfil de {self.conductor} guardado en {self.ruta}")
+
+    def _fijar_referencia(self):
+        self.lista = True
+        self._ear_referencia = self.ear.media
+        self._mar_referencia = self.mar.media
+
+    @property
+    def ear_umbral(self):
+        return min(max(self.factor_ear * self.ear.media + self.ajuste_ear, LIMITES_EAR[0]), LIMITES_EAR[1])
+
+    @property
+    def mar_umbral(self):
+        return min(max(self.mar.media + self.margen_mar, LIMITES_MAR[0]), LIMITES_MAR[1])
+
+    def _texto_umbrales(self):
+        return (f"EAR abierto {self.ear.media:.3f}, MAR neutro {self.mar.media:.3f} → "
+                f"EAR < {self.ear_umbral:.3f}, MAR >= {self.mar_umbral:.3f}")
+
+    def actualizar(self, t, ear, mar, maquina):
+        """Incorporar el frame t y, con la línea base lista, fijar los umbrales de `maquina`"""
+        if self._t_inicio is None:
+            self._t_inicio = t
+        dt = t - self._t_previo if self._t_previo is not None else 0.0
+        self._t_previo = t
+
+        if not self.lista:
+            # Calentamiento: muestras exactas sin pestañeos ni bostezos
+            if not self.ear.atipico(ear, -1) and not self.mar.atipico(mar, +1):
+                self.ear.agregar(ear)
+                self.mar.agregar(mar)
+            if t - self._t_inicio >= self.calentamiento and self.ear.n >= MUESTRAS_MINIMAS:
+                self._fijar_referencia()
+                print(f"[INFO] Línea base de {self.conductor}: {self._texto_umbrales()}")
+            else:
+                return
+        elif not maquina.cerrado and dt > 0.0:
+            # Seguimiento lento, acotado alrededor de la referencia
+            alfa = 1.0 - 0.5 ** (dt / self.semivida)
+            if not self.ear.atipico(ear, -1):
+                self.ear.suavizar(ear, alfa)
+                self.ear.media = min(max(self.ear.media, self._ear_referencia * (1.0 - self.deriva_max)),
+                                     self._ear_referencia * (1.0 + self.deriva_max))
+            if not self.mar.atipico(mar, +1):
+                self.mar.suavizar(mar, alfa)
+                self.mar.media = min(max(self.mar.media, self._mar_referencia * (1.0 - self.deriva_max)),
+                                     self._mar_referencia * (1.0 + self.deriva_max))
+
+        maquina.ear_umbral = self.ear_umbral
+        maquina.mar_umbral = self.mar_umbral
+
+    def ajustar_ear(self, maquina, delta):
+        """Tecla +/-: desplazar el umbral EAR adaptado (el ajuste se guarda en el perfil)"""
+        self.ajuste_ear += delta
+        if self.lista:
+            maquina.ear_umbral = self.ear_umbral
+        else:
+            maquina.ear_umbral = min(max(maquina.ear_umbral + delta, 0.1), 0.5)
+
+    def cerrar(self):
+        self.guardar()
+
+
+class AdaptacionNula:
+    """Umbrales fijos: solo atiende al ajuste manual con +/-"""
+
+    habilitada = False
+
+    def actualizar(self, t, ear, mar, maquina):
+        pass
+
+    def ajustar_ear(self, maquina, delta):
+        maquina.ear_umbral = min(max(maquina.ear_umbral + delta, 0.1), 0.5)
+
+    def cerrar(self):
+        pass
+
+
+def crear_adaptacion(conductor=None, directorio="perfiles"):
+    """Adaptación por conductor si se da su identificador, si no umbrales fijos"""
+    if conductor:
+        return AdaptacionConductor(conductor, directorio)
+    return AdaptacionNula()
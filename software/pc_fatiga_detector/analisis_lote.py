@@ -0,0 +1,530 @@
+# analisis_lote.py - Análisis offline en paralelo de archivos de video
+# Procesa horas de grabaciones de cabina en mucho menos tiempo que su
+# duración:
+#   1. Cada video se divide en tramos de unos --tramo segundos que empiezan
+#      en un fotograma clave (localizados leyendo los paquetes sin
+#      decodificar), así que cada trabajador salta a su tramo sin decodificar
+#      lo anterior.
+#   2. Un pool de procesos (uno por núcleo, OpenCV a un hilo, como en
+#      supervisor.py) ejecuta FaceMesh y EAR/MAR sobre los tramos de todos los
+#      videos a la vez. Cada trabajador crea un FaceMesh al arrancar y lo
+#      reutiliza en todos sus tramos.
+#   3. La máquina de estados (cierres, pestañeos/min, alertas) es secuencial,
+#      pero cuesta microsegundos por frame: el proceso principal la ejecuta
+#      sobre los tramos en orden a medida que llegan, pasando el estado de un
+#      tramo al siguiente, con el mismo resultado que un pase único.
+# Por video se escribe en --salida/<nombre>/ el registro por frame
+# (metricas.reg, el formato de registro.py) y resumen.json (alertas, tasa de
+# pestañeos, duración de los cierres); resumen.csv reúne una fila por video.
+#
+# Cada tramo terminado se guarda en tramos/ de forma atómica. Si el análisis se
+# interrumpe, al relanzar el mismo comando solo se procesan los que faltan. Con
+# otros umbrales, la máquina se vuelve a ejecutar sobre metricas.reg sin
+# repetir FaceMesh.
+#
+# Uso:
+#   python analisis_lote.py grabaciones/ --salida informes/
+#   python analisis_lote.py turno1.mp4 turno2.mp4 --salida informes/ --config config_fatiga.json
+
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import shutil
+import signal
+import time
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+from calibracion import cargar_config
+from estado_fatiga import MaquinaEstadoFatiga, MODO_ORIGINAL, MODO_PRUEBA_RAPIDA
+from fuentes import FPS_POR_DEFECTO
+from metricas import MotorMetricas, COL_EAR, COL_MAR
+from registro import (DTYPE_REGISTRO, DTYPE_EPISODIO, CONDICIONES, BANDERA_CERRADO, BANDERA_ALERTA,
+                      codificar_cierre, codificar_puntos, episodios_alerta, escribir_registro, leer_registro)
+from seguimiento import InferenciaEspaciada
+
+EXTENSIONES_VIDEO = (".mp4", ".avi", ".mkv", ".mov", ".m4v", ".webm")
+DURACION_TRAMO = 60.0       # Segundos por tramo como máximo (menos si hay poco video para los núcleos)
+TRAMO_MINIMO = 10.0         # Más corto, el salto al tramo y el seguimiento que empieza de cero no compensan
+TRAMOS_POR_PROCESO = 4      # Con menos tramos, los últimos núcleos quedan ociosos al final del lote
+VERSION_TRAMOS = 3          # Cambiar si cambia lo que calcula el trabajador: invalida los tramos guardados
+
+Tramo = namedtuple("Tramo", ["video", "indice", "inicio", "fin", "fps", "ruta"])
+
+_INDICE_CONDICION = {condicion: i for i, condicion in enumerate(CONDICIONES)}
+
+
+def buscar_videos(rutas):
+    """Expandir los directorios en los videos que contienen (por nombre)"""
+    videos = []
+    for ruta in rutas:
+        if os.path.isdir(ruta):
+            videos.extend(sorted(os.path.join(ruta, nombre) for nombre in os.listdir(ruta)
+                                 if nombre.lower().endswith(EXTENSIONES_VIDEO)))
+        else:
+            videos.append(ruta)
+    return videos
+
+
+def fotogramas_clave(ruta):
+    """(índices de los fotogramas clave, número de frames), leyendo los paquetes sin decodificar
+
+    Los índices son None si el backend no permite leer paquetes.
+    """
+    cap = cv2.VideoCapture(ruta, cv2.CAP_FFMPEG, [cv2.CAP_PROP_FORMAT, -1])
+    if not cap.isOpened():
+        return None, 0
+    claves = []
+    n = 0
+    while cap.grab():
+        if cap.get(cv2.CAP_PROP_LRF_HAS_KEY_FRAME):
+            claves.append(n)
+        n += 1
+    cap.release()
+    return (claves or None), n
+
+
+def planificar_tramos(claves, frames, fps, duracion_tramo):
+    """Límites [inicio, fin) de los tramos, cortando en el primer fotograma clave tras cada objetivo
+
+    Si el siguiente fotograma clave queda a más de medio tramo, se corta en el
+    objetivo: el salto sigue siendo exacto, solo decodifica desde el clave anterior.
+    """
+    paso = max(int(round(duracion_tramo * fps)), 1)
+    objetivos = np.arange(paso, frames, paso)
+    if claves is not None and len(objetivos):
+        claves = np.asarray(claves)
+        i = np.searchsorted(claves, objetivos)
+        siguiente = claves[np.minimum(i, len(claves) - 1)]
+        cerca = (i < len(claves)) & (siguiente - objetivos <= paso // 2)
+        objetivos = np.where(cerca, siguiente, objetivos)
+    limites = np.unique(np.concatenate(([0], objetivos, [frames])))
+    return [[int(a), int(b)] for a, b in zip(limites[:-1], limites[1:])]
+
+
+def propiedades_video(ruta):
+    """(fps, frames según el contenedor) o None si el video no se puede abrir"""
+    cap = cv2.VideoCapture(ruta)
+    if not cap.isOpened():
+        return None
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    return (fps if fps and fps > 0 else FPS_POR_DEFECTO), frames
+
+
+def identidad_video(ruta):
+    info = os.stat(ruta)
+    return {"ruta": os.path.abspath(ruta), "tamano": info.st_size, "mtime": info.st_mtime}
+
+
+def _escribir_json(ruta, datos):
+    temporal = ruta + ".tmp"
+    with open(temporal, "w") as f:
+        json.dump(datos, f, indent=2, ensure_ascii=False)
+    os.replace(temporal, ruta)
+
+
+def preparar_video(ruta, directorio, inferencia, duracion_tramo):
+    """Plan de tramos del video: el de plan.json si sigue valiendo (mismo video y opciones), si no uno nuevo"""
+    ruta_plan = os.path.join(directorio, "plan.json")
+    clave = {"version": VERSION_TRAMOS, "video": identidad_video(ruta), "inferencia": inferencia}
+    if os.path.exists(ruta_plan):
+        with open(ruta_plan) as f:
+            plan = json.load(f)
+        if all(plan.get(k) == v for k, v in clave.items()):
+            return plan
+        # Otro video con el mismo nombre u otras opciones de inferencia: lo guardado no vale
+        print(f"[INFO] {ruta}: el video o las opciones cambiaron, se analiza de nuevo")
+        for nombre in ("metricas.reg", "resumen.json", "plan.json"):
+            if os.path.exists(os.path.join(directorio, nombre)):
+                os.remove(os.path.join(directorio, nombre))
+        shutil.rmtree(os.path.join(directorio, "tramos"), ignore_errors=True)
+
+    fps, frames = propiedades_video(ruta)
+    claves, paquetes = fotogramas_clave(ruta)
+    if claves is None:
+        print(f"[ADVERTENCIA] {ruta}: no se pudieron leer los fotogramas clave; tramos de duración fija")
+    plan = dict(clave, fps=fps, frames=paquetes or frames,
+                tramos=planificar_tramos(claves, paquetes or frames, fps, duracion_tramo))
+    os.makedirs(os.path.join(directorio, "tramos"), exist_ok=True)
+    _escribir_json(ruta_plan, plan)
+    return plan
+
+
+# Estado de cada proceso del pool (lo rellena _iniciar_trabajador)
+_trabajador = {}
+
+
+def _iniciar_trabajador(opciones):
+    """Inicializador del pool: OpenCV a un hilo y un FaceMesh para todos los tramos del proceso"""
+    # Ctrl+C lo atiende el proceso principal, que termina el pool
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    os.environ["OMP_NUM_THREADS"] = "1"
+    cv2.setNumThreads(1)
+    import mediapipe as mp  # Cada trabajador carga su propio MediaPipe
+
+    _trabajador["facemesh"] = mp.solutions.face_mesh.FaceMesh(min_detection_confidence=0.5,
+                                                              min_tracking_confidence=0.5)
+    _trabajador["opciones"] = opciones
+
+
+def analizar_tramo(tramo):
+    """FaceMesh y EAR/MAR de los frames [inicio, fin) de un video, guardados en tramo.ruta
+
+    Devuelve (video, índice del tramo, frames leídos, segundos, error o None).
+    """
+    t0 = time.perf_counter()
+    opciones = _trabajador["opciones"]
+    try:
+        motor = MotorMetricas(max_caras=1)
+        # El seguimiento y el recorte de la cara empiezan de cero en cada tramo
+        inferencia = InferenciaEspaciada(_trabajador["facemesh"], motor, intervalo_max=opciones["intervalo_max"],
+                                         roi=opciones["roi"])
+        registros = np.zeros(tramo.fin - tramo.inicio, DTYPE_REGISTRO)
+        registros["ear"] = np.nan
+        registros["mar"] = np.nan
+
+        cap = cv2.VideoCapture(tramo.video)
+        if tramo.inicio:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, tramo.inicio)
+        n = 0
+        frame = None
+        while n < len(registros):
+            exito, frame = cap.read(frame)
+            if not exito:
+                break
+            fila = registros[n]
+            t = (tramo.inicio + n) / tramo.fps
+            fila["t"] = t
+            n_caras, _ = inferencia.procesar(frame, t)
+            if n_caras:
+                metricas = motor.calcular()
+                inferencia.registrar_ear(metricas[0, COL_EAR], opciones["ear_umbral"])
+                fila["caras"] = 1
+                fila["puntos"] = codificar_puntos(motor.puntos[0])
+                fila["ear"] = metricas[0, COL_EAR]
+                fila["mar"] = metricas[0, COL_MAR]
+            n += 1
+        cap.release()
+
+        # Escritura atómica: un tramo existe entero o no existe
+        temporal = tramo.ruta + ".tmp.npy"
+        np.save(temporal, registros[:n])
+        os.replace(temporal, tramo.ruta)
+        return tramo.video, tramo.indice, n, time.perf_counter() - t0, None
+    except Exception as e:
+        return tramo.video, tramo.indice, 0, time.perf_counter() - t0, f"{type(e).__name__}: {e}"
+
+
+def aplicar_maquina(registros, maquina, cierres):
+    """Rellenar el estado de `maquina` en los registros, que solo avanza con los frames con cara
+
+    Los frames sin cara guardan el estado vigente, como la grabación del
+    detector. Las duraciones de los cierres terminados se añaden a `cierres`.
+    """
+    n = len(registros)
+    tiempo_cierre = [0.0] * n
+    pestaneos = [0] * n
+    pestaneos_minuto = [0] * n
+    condicion = [0] * n
+    banderas = [0] * n
+    actualizar = maquina.actualizar
+    for i, (t, ear, mar, caras) in enumerate(zip(registros["t"].tolist(), registros["ear"].tolist(),
+                                                  registros["mar"].tolist(), registros["caras"].tolist())):
+        if caras:
+            actualizar(t, ear, mar)
+            if maquina.fin_cierre is not None:
+                cierres.append(maquina.fin_cierre)
+        tiempo_cierre[i] = maquina.tiempo_cierre
+        pestaneos[i] = maquina.pestaneos
+        pestaneos_minuto[i] = maquina.pestaneos_por_minuto
+        condicion[i] = _INDICE_CONDICION[maquina.condicion]
+        banderas[i] = (BANDERA_CERRADO if maquina.cerrado else 0) | (BANDERA_ALERTA if maquina.alerta else 0)
+    registros["cierre_ms"] = codificar_cierre(tiempo_cierre)
+    registros["pestaneos"] = pestaneos
+    registros["pestaneos_minuto"] = pestaneos_minuto
+    registros["condicion"] = condicion
+    registros["banderas"] = banderas
+
+
+def _redondear(x, decimales=3):
+    return None if x is None or not np.isfinite(x) else round(float(x), decimales)
+
+
+def resumir(ruta, plan, parametros, registros, cierres, maquina, segundos_calculo):
+    """Resumen de un video: alertas y sus episodios, tasa de pestañeos y duración de los cierres"""
+    n = len(registros)
+    fps = plan["fps"]
+    duracion = n / fps
+    con_cara = registros["caras"] > 0
+    alerta = (registros["banderas"] & BANDERA_ALERTA) != 0
+    episodios = episodios_alerta(registros)
+    cierres = np.asarray(cierres, dtype=np.float64)
+    # La tasa por minuto solo es real con un minuto de historial (antes vale PESTANEOS_INICIALES)
+    tasas = registros["pestaneos_minuto"][con_cara & (registros["t"] > registros["t"][0] + 60.0)] if n else []
+    return {
+        "video": os.path.abspath(ruta),
+        "fps": fps,
+        "frames": n,
+        "duracion_s": _redondear(duracion, 2),
+        "frames_con_cara": int(con_cara.sum()),
+        "tramos": len(plan["tramos"]),
+        "parametros": parametros,
+        "alertas": len(episodios),
+        "tiempo_en_alerta_s": _redondear(alerta.sum() / fps, 2),
+        "episodios": [{campo: _redondear(e[campo]) for campo in DTYPE_EPISODIO.names} for e in episodios],
+        "pestaneos": int(maquina.pestaneos),
+        "pestaneos_minuto": _redondear(maquina.pestaneos / (duracion / 60.0), 2) if duracion else None,
+        "pestaneos_minuto_min": int(np.min(tasas)) if len(tasas) else None,
+        "cierres": {
+            "n": len(cierres),
+            "medio_s": _redondear(cierres.mean()) if len(cierres) else None,
+            "p95_s": _redondear(np.percentile(cierres, 95)) if len(cierres) else None,
+            "max_s": _redondear(cierres.max()) if len(cierres) else None,
+            "largos": int((cierres >= parametros["tiempo_alerta"]).sum()),
+        },
+        "calculo_s": _redondear(segundos_calculo, 2),
+    }
+
+
+class AnalisisVideo:
+    """Un video del lote: sus tramos y la máquina de estados que los recorre en orden"""
+
+    def __init__(self, ruta, directorio, plan, parametros):
+        self.ruta = ruta
+        self.directorio = directorio
+        self.plan = plan
+        self.parametros = parametros
+        self.maquina = MaquinaEstadoFatiga(parametros["ear_umbral"], parametros["mar_umbral"],
+                                           parametros["tiempo_alerta"], modo=parametros["modo"])
+        self.cierres = []
+        self._partes = []
+        self._listos = set()
+        self._siguiente = 0
+        self.segundos_calculo = 0.0
+        self.error = None
+        self.resumen = None
+
+    @property
+    def ruta_registro(self):
+        return os.path.join(self.directorio, "metricas.reg")
+
+    @property
+    def ruta_resumen(self):
+        return os.path.join(self.directorio, "resumen.json")
+
+    def ruta_tramo(self, indice):
+        return os.path.join(self.directorio, "tramos", f"tramo_{indice:05d}.npy")
+
+    def tramos_pendientes(self):
+        """Tramos sin guardar; los ya guardados (ejecución anterior) se dan por listos"""
+        pendientes = []
+        for i, (inicio, fin) in enumerate(self.plan["tramos"]):
+            if os.path.exists(self.ruta_tramo(i)):
+                self.tramo_listo(i)
+            else:
+                pendientes.append(Tramo(self.ruta, i, inicio, fin, self.plan["fps"], self.ruta_tramo(i)))
+        return pendientes
+
+    def tramo_listo(self, indice, segundos=0.0):
+        """Marcar un tramo como guardado y avanzar la máquina por todos los consecutivos ya listos
+
+        Devuelve True cuando el video está completo.
+        """
+        self._listos.add(indice)
+        self.segundos_calculo += segundos
+        while self._siguiente in self._listos:
+            registros = np.load(self.ruta_tramo(self._siguiente))
+            aplicar_maquina(registros, self.maquina, self.cierres)
+            self._partes.append(registros)
+            self._siguiente += 1
+        return self._siguiente == len(self.plan["tramos"])
+
+    def reproducir_registro(self):
+        """Otros umbrales sobre un video ya analizado: la máquina sobre metricas.reg, sin FaceMesh"""
+        registros, _ = leer_registro(self.ruta_registro)
+        registros = np.array(registros)
+        aplicar_maquina(registros, self.maquina, self.cierres)
+        self._partes = [registros]
+
+    def finalizar(self):
+        """Escribir metricas.reg y resumen.json y borrar los tramos (ya están en el registro)"""
+        registros = np.concatenate(self._partes) if self._partes else np.zeros(0, DTYPE_REGISTRO)
+        escribir_registro(self.ruta_registro, registros, t_inicio=self.plan["video"]["mtime"])
+        self.resumen = resumir(self.ruta, self.plan, self.parametros, registros, self.cierres,
+                               self.maquina, self.segundos_calculo)
+        _escribir_json(self.ruta_resumen, self.resumen)
+        shutil.rmtree(os.path.join(self.directorio, "tramos"), ignore_errors=True)
+        self._partes = []
+
+
+def linea_resumen(resumen):
+    cierres = resumen["cierres"]
+    return (f"{os.path.basename(resumen['video'])}: {resumen['duracion_s'] / 60.0:.1f} min, "
+            f"{resumen['alertas']} alertas ({resumen['tiempo_en_alerta_s']:.1f}s), "
+            f"{resumen['pestaneos_minuto'] or 0:.1f} pestañeos/min, {cierres['n']} cierres "
+            f"(máx {cierres['max_s'] or 0:.2f}s, {cierres['largos']} largos), "
+            f"cara en {100.0 * resumen['frames_con_cara'] / max(resumen['frames'], 1):.0f}% de los frames")
+
+
+def escribir_csv(ruta, resumenes):
+    """Una fila por video con las cifras principales del resumen"""
+    columnas = ["video", "duracion_s", "frames_con_cara_pct", "alertas", "tiempo_en_alerta_s", "pestaneos_minuto",
+                "pestaneos_minuto_min", "cierres", "cierre_medio_s", "cierre_max_s", "cierres_largos"]
+    with open(ruta, "w", newline="") as f:
+        escritor = csv.writer(f)
+        escritor.writerow(columnas)
+        for r in resumenes:
+            escritor.writerow([r["video"], r["duracion_s"], round(100.0 * r["frames_con_cara"] / max(r["frames"], 1), 1),
+                               r["alertas"], r["tiempo_en_alerta_s"], r["pestaneos_minuto"], r["pestaneos_minuto_min"],
+                               r["cierres"]["n"], r["cierres"]["medio_s"], r["cierres"]["max_s"],
+                               r["cierres"]["largos"]])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Análisis offline de fatiga en paralelo sobre archivos de video")
+    parser.add_argument("videos", nargs="+", help="archivos de video o directorios que los contienen")
+    parser.add_argument("--salida", default="analisis", help="directorio de resultados (uno por video)")
+    parser.add_argument("--procesos", type=int, default=None,
+                        help="procesos trabajadores (por defecto, uno por núcleo disponible)")
+    parser.add_argument("--tramo", type=float, default=DURACION_TRAMO,
+                        help="duración máxima de cada tramo en segundos")
+    parser.add_argument("--modo", choices=(MODO_ORIGINAL, MODO_PRUEBA_RAPIDA), default=MODO_ORIGINAL)
+    parser.add_argument("--ear-umbral", type=float, default=0.25)
+    parser.add_argument("--mar-umbral", type=float, default=0.2)
+    parser.add_argument("--tiempo-alerta", type=float, default=1.5)
+    parser.add_argument("--config", default=None,
+                        help="umbrales EAR/MAR y tiempo de alerta generados por calibracion.py")
+    parser.add_argument("--intervalo-max", type=int, default=1,
+                        help="FaceMesh como mínimo cada N frames con seguimiento óptico entre medias")
+    parser.add_argument("--roi", action="store_true", help="FaceMesh sobre un recorte alrededor de la cara")
+    args = parser.parse_args()
+
+    if args.config:
+        args.ear_umbral, args.mar_umbral, args.tiempo_alerta = cargar_config(args.config)
+    parametros = {"modo": args.modo, "ear_umbral": args.ear_umbral, "mar_umbral": args.mar_umbral,
+                  "tiempo_alerta": args.tiempo_alerta}
+    # Lo que cambia el resultado de los trabajadores; el umbral EAR solo guía el seguimiento
+    inferencia = {"intervalo_max": args.intervalo_max, "roi": args.roi}
+    if args.intervalo_max > 1:
+        inferencia["ear_umbral"] = args.ear_umbral
+    procesos = args.procesos or (len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity")
+                                 else os.cpu_count())
+
+    videos = []
+    for ruta in buscar_videos(args.videos):
+        propiedades = propiedades_video(ruta)
+        if propiedades is None:
+            print(f"[ERROR] No se puede abrir el video {ruta}")
+            continue
+        videos.append((ruta, propiedades))
+    if not videos:
+        print("[ERROR] Ningún video que analizar")
+        return
+
+    # Tramos lo bastante cortos para que todos los núcleos trabajen hasta el final
+    total = sum(frames / fps for _, (fps, frames) in videos)
+    duracion_tramo = max(min(args.tramo, total / (TRAMOS_POR_PROCESO * procesos)), TRAMO_MINIMO)
+
+    print("=" * 70)
+    print(f"ANÁLISIS POR LOTES: {len(videos)} videos ({total / 3600.0:.2f} h), {procesos} procesos")
+    print("=" * 70)
+
+    analisis = []
+    tareas = []
+    nombres = set()
+    for ruta, _ in videos:
+        nombre = os.path.splitext(os.path.basename(ruta))[0]
+        base, k = nombre, 2
+        while nombre in nombres:
+            nombre, k = f"{base}_{k}", k + 1
+        nombres.add(nombre)
+        directorio = os.path.join(args.salida, nombre)
+        os.makedirs(directorio, exist_ok=True)
+        plan = preparar_video(ruta, directorio, inferencia, duracion_tramo)
+        video = AnalisisVideo(ruta, directorio, plan, parametros)
+        analisis.append(video)
+
+        if os.path.exists(video.ruta_resumen) and os.path.exists(video.ruta_registro):
+            with open(video.ruta_resumen) as f:
+                resumen = json.load(f)
+            if resumen.get("parametros") == parametros:
+                video.resumen = resumen
+                print(f"[INFO] {ruta}: ya analizado")
+                continue
+        if os.path.exists(video.ruta_registro):
+            video.reproducir_registro()
+            video.finalizar()
+            print(f"[INFO] {ruta}: otros umbrales, máquina de estados sobre {video.ruta_registro}")
+            continue
+        pendientes = video.tramos_pendientes()
+        if len(pendientes) < len(plan["tramos"]):
+            print(f"[INFO] {ruta}: se reanuda, {len(plan['tramos']) - len(pendientes)}/{len(plan['tramos'])} "
+                  "tramos ya analizados")
+        if not pendientes:
+            video.finalizar()
+        tareas.extend(pendientes)
+
+    por_ruta = {video.ruta: video for video in analisis}
+    frames_analizados = 0
+    t0 = time.perf_counter()
+    if tareas:
+        print(f"[INFO] {len(tareas)} tramos de ~{duracion_tramo:.0f}s en {procesos} procesos")
+        opciones = {"intervalo_max": args.intervalo_max, "roi": args.roi, "ear_umbral": args.ear_umbral}
+        # spawn: cada trabajador arranca limpio (sin hilos ni estado de MediaPipe heredados)
+        contexto = multiprocessing.get_context("spawn")
+        hechos = 0
+        t_progreso = t0
+        with contexto.Pool(procesos, initializer=_iniciar_trabajador, initargs=(opciones,)) as pool:
+            try:
+                for ruta, indice, frames, segundos, error in pool.imap_unordered(analizar_tramo, tareas):
+                    hechos += 1
+                    frames_analizados += frames
+                    video = por_ruta[ruta]
+                    if error:
+                        if video.error is None:
+                            print(f"[ERROR] {ruta}, tramo {indice}: {error}")
+                        video.error = error
+                        continue
+                    if video.tramo_listo(indice, segundos) and video.error is None:
+                        video.finalizar()
+                        print(f"[INFO] {linea_resumen(video.resumen)}")
+                    ahora = time.perf_counter()
+                    if ahora - t_progreso >= 10.0:
+                        t_progreso = ahora
+                        print(f"[INFO] {hechos}/{len(tareas)} tramos, "
+                              f"{frames_analizados / (ahora - t0):.0f} frames/s")
+            except KeyboardInterrupt:
+                # Un segundo Ctrl+C no debe cortar la parada de los trabajadores
+                signal.signal(signal.SIGINT, signal.SIG_IGN)
+                pool.terminate()
+                print(f"\n[INFO] Análisis interrumpido con {hechos}/{len(tareas)} tramos terminados; "
+                      "el mismo comando continúa donde se quedó")
+                return
+    duracion = time.perf_counter() - t0
+
+    resumenes = [video.resumen for video in analisis if video.resumen is not None]
+    if resumenes:
+        escribir_csv(os.path.join(args.salida, "resumen.csv"), resumenes)
+
+    print("\n" + "=" * 70)
+    print("RESUMEN DEL ANÁLISIS:")
+    for resumen in resumenes:
+        print(linea_resumen(resumen))
+    fallidos = [video.ruta for video in analisis if video.error is not None]
+    if fallidos:
+        print(f"Con errores (relanzar para reintentar sus tramos): {', '.join(fallidos)}")
+    if frames_analizados and duracion > 0:
+        print(f"FaceMesh: {frames_analizados} frames en {duracion:.1f}s "
+              f"({frames_analizados / duracion:.0f} frames/s, {procesos} procesos)")
+    print(f"Resultados en {args.salida}/ (resumen.csv, <video>/resumen.json y metricas.reg)")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    main()
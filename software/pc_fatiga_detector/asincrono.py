@@ -0,0 +1,470 @@
+# asincrono.py - Detector de fatiga (semántica de detector_original.py) sobre asyncio
+# Un solo bucle de eventos coordina todo lo que no es cálculo:
+#   - Visión: leer el frame y ejecutar FaceMesh (o el seguimiento) ocurre en
+#     un hilo de inferencia dedicado (run_in_executor); mientras tanto el
+#     bucle sigue atendiendo el puerto serie, los temporizadores y el control.
+#     Lectura e inferencia van en la misma llamada y un frame no empieza hasta
+#     que el anterior se ha consumido, así que los buffers preasignados de la
+#     captura y del motor de métricas se usan igual que en el bucle síncrono.
+#   - Puerto serie: EnlaceSerieAsincrono abre el puerto en un hilo (abrir
+#     /dev/rfcomm0 puede tardar segundos), escribe sin bloquear y deja lo que
+#     no cabe a la espera de que el descriptor admita escritura. El latido
+#     'p' durante la alerta y los reintentos de conexión son temporizadores.
+#     Con el protocolo de tramas, las confirmaciones del vehículo se leen con
+#     un lector del bucle (add_reader) sobre el mismo descriptor.
+#   - Ventana de pestañeos: con reloj real, un temporizador cierra cada
+#     segundo de la ventana aunque la inferencia vaya a menos de 1 fps.
+#   - Sumideros: cualquier función (t, maquina, puntos, ear, mar) que no
+#     bloquee (registro binario, publicación en memoria compartida...); se
+#     añaden a la lista sin tocar el bucle.
+# Ctrl+C o SIGTERM cancelan las tareas y el cierre libera la cámara, cierra el
+# puerto serie y los sumideros e imprime el resumen.
+#
+# Uso:
+#   python asincrono.py --fuente 0 --puerto-bt /dev/rfcomm0
+#   python asincrono.py --fuente sesion.npz --headless
+
+import argparse
+import asyncio
+import os
+import signal
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import serial
+
+from adaptacion import crear_adaptacion
+from bluetooth import EnlaceComandos, PUERTO_POR_DEFECTO
+from calibracion import cargar_config
+from captura import crear_captura
+from control import CanalControl
+from estado_fatiga import MaquinaEstadoFatiga, MODO_ORIGINAL
+from fuentes import abrir_fuente, RelojReal
+from instrumentacion import crear_instrumentacion
+from metricas import MotorMetricas, COL_EAR, COL_MAR
+from presencia import DetectorPresencia
+from protocolo import resumen_confirmaciones, PROTOCOLO_TRAMAS, PROTOCOLO_ASCII
+from publicacion import crear_publicador
+from registro import crear_grabador
+from seguimiento import InferenciaEspaciada
+
+PERIODO_VENTANA = 1.0       # Segundos entre cierres de la ventana de pestañeos por temporizador
+
+
+class EnlaceSerieAsincrono(EnlaceComandos):
+    """Comandos al vehículo desde el bucle de eventos: la política de EnlaceComandos con escritura no bloqueante
+
+    Misma interfaz y estadísticas que bluetooth.DespachadorBluetooth, sin hilo
+    propio; todo ocurre en el bucle de eventos, así que no hace falta cerrojo.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._bucle = None
+        self._tarea = None
+        self._despertar = None
+        self._salida = bytearray()      # Bytes a la espera de que el puerto admita escritura
+
+    def iniciar(self):
+        """Arrancar la tarea de envío (desde el bucle de eventos)"""
+        self._bucle = asyncio.get_running_loop()
+        self._despertar = asyncio.Event()
+        self._tarea = self._bucle.create_task(self._enviar_pendientes(), name="bluetooth")
+        return self
+
+    def _avisar(self):
+        self._despertar.set()
+
+    def estadisticas(self):
+        estadisticas = super().estadisticas()
+        estadisticas["bytes_pendientes"] = len(self._salida)
+        return estadisticas
+
+    async def _conectar(self):
+        ahora = time.monotonic()
+        if not self._puede_conectar(ahora):
+            return False
+        try:
+            # Abrir el puerto puede bloquear (conexión RFCOMM): en un hilo
+            self._serial = await self._bucle.run_in_executor(
+                None, lambda: serial.Serial(self.puerto, self.baudios, timeout=0, write_timeout=0))
+            os.set_blocking(self._serial.fileno(), False)
+            if self.tramas:
+                self._bucle.add_reader(self._serial.fileno(), self._leer)
+        except Exception as e:
+            self._conexion_fallida(e, time.monotonic())
+            return False
+        self._conexion_abierta()
+        return True
+
+    def _desconectar(self):
+        if self._serial is not None:
+            self._bucle.remove_writer(self._serial.fileno())
+            self._bucle.remove_reader(self._serial.fileno())
+            try:
+                self._serial.close()
+            except Exception:
+                pass
+            self._serial = None
+            self._salida.clear()
+
+    async def _enviar_pendientes(self):
+        # Primer intento de conexión al arrancar (informa del estado del enlace)
+        await self._conectar()
+        while True:
+            comandos = self._listos(time.monotonic())
+            if comandos and (self._serial is not None or await self._conectar()):
+                self._enviar_listos(comandos)
+            self._despertar.clear()
+            try:
+                await asyncio.wait_for(self._despertar.wait(), self._espera(time.monotonic()))
+            except asyncio.TimeoutError:
+                pass
+
+    def _leer(self):
+        """Hay bytes del vehículo: procesar las confirmaciones"""
+        try:
+            datos = os.read(self._serial.fileno(), 256)
+        except BlockingIOError:
+            return
+        except OSError:
+            # Enlace caído: se detecta y se reconecta en la siguiente escritura
+            self._bucle.remove_reader(self._serial.fileno())
+            return
+        self._alimentar(datos)
+
+    def _escribir_bytes(self, datos):
+        """Escribir sin bloquear; lo que no quepa se envía cuando el puerto lo admita"""
+        if self._salida:
+            self._salida += datos
+            return True
+        try:
+            escritos = os.write(self._serial.fileno(), datos)
+        except BlockingIOError:
+            escritos = 0
+        except OSError as e:
+            self._fallo(e)
+            return False
+        if escritos < len(datos):
+            self._salida += datos[escritos:]
+            self._bucle.add_writer(self._serial.fileno(), self._vaciar)
+        return True
+
+    def _vaciar(self):
+        """El puerto admite escritura: enviar lo pendiente"""
+        try:
+            escritos = os.write(self._serial.fileno(), self._salida)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            self._fallo(e)
+            return
+        del self._salida[:escritos]
+        if not self._salida:
+            self._bucle.remove_writer(self._serial.fileno())
+
+    async def detener(self):
+        """Cancelar la tarea de envío y cerrar el puerto serie"""
+        if self._tarea is not None:
+            self._tarea.cancel()
+            try:
+                await self._tarea
+            except asyncio.CancelledError:
+                pass
+        self._desconectar()
+
+
+class DetectorAsincrono:
+    """Captura, inferencia, máquina de estados, Bluetooth y sumideros coordinados por asyncio"""
+
+    def __init__(self, args):
+        self.args = args
+        self.motor = MotorMetricas(max_caras=1)
+
+        ear_umbral, mar_umbral, tiempo_alerta = 0.25, 0.2, 1.5
+        if args.config:
+            ear_umbral, mar_umbral, tiempo_alerta = cargar_config(args.config)
+            print(f"[INFO] Configuración {args.config}: EAR < {ear_umbral}, MAR >= {mar_umbral}, "
+                  f"alerta tras {tiempo_alerta}s")
+        self.maquina = MaquinaEstadoFatiga(ear_umbral, mar_umbral, tiempo_alerta=tiempo_alerta,
+                                           modo=MODO_ORIGINAL)
+        self.adaptacion = crear_adaptacion(args.conductor, args.perfiles)
+
+        self.fuente = abrir_fuente(args.fuente, tiempo_real=args.tiempo_real)
+        print(f"[INFO] Iniciando fuente de video: {args.fuente}")
+        self.captura = crear_captura(self.fuente)
+        self.reloj_real = isinstance(self.captura.reloj, RelojReal)
+
+        self.instr = crear_instrumentacion(args.metricas, args.periodo_metricas)
+        if self.instr.habilitada:
+            print(f"[INFO] Exportando métricas de rendimiento a {args.metricas}")
+        self.grabador = crear_grabador(args.grabar)
+        if self.grabador.habilitado:
+            print(f"[INFO] Grabando registro binario en {args.grabar}")
+        self.publicador = crear_publicador(args.publicar)
+        if self.publicador.habilitado:
+            print(f"[INFO] Publicando métricas en memoria compartida '{args.publicar}'")
+
+        # Sumideros por frame: funciones (t, maquina, puntos, ear, mar) que no bloquean
+        self.sumideros = []
+        if self.grabador.habilitado:
+            self.sumideros.append(self.grabador.agregar)
+        if self.publicador.habilitado:
+            self.sumideros.append(self.publicador.publicar)
+
+        self.enlace = EnlaceSerieAsincrono(args.puerto_bt, instrumentacion=self.instr,
+                                           protocolo=args.protocolo)
+        self.canal = CanalControl()
+        self.visualizacion = None
+        self.overlay = None
+
+        # Un único hilo de inferencia: FaceMesh y los buffers no se comparten entre hilos
+        self.ejecutor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="inferencia")
+        self.inferencia = None
+        self.puerta = None
+        self._t_cara = None             # Último frame con cara (reloj de la fuente)
+        self.duracion_bucle = 0.0
+
+    def _paso(self):
+        """Leer el siguiente frame e inferir sus puntos (en el hilo de inferencia)"""
+        t_etapa = self.instr.t()
+        frame_capturado = self.captura.leer()
+        if frame_capturado is None:
+            return None, 0, None
+        self.instr.registrar("captura", t_etapa)
+        if frame_capturado.puntos is not None:
+            # Registro de landmarks: sin imagen ni FaceMesh
+            self.motor.puntos[0] = frame_capturado.puntos
+            return frame_capturado, 1, None
+        n_caras, face_landmarks = self.inferencia.procesar(frame_capturado.imagen, frame_capturado.t_captura)
+        return frame_capturado, n_caras, face_landmarks
+
+    def _mostrar(self, frame, face_landmarks, n_caras, ear, mar, alerta):
+        """Dibujar y mostrar el frame (en el hilo de inferencia, que es el dueño de la ventana)"""
+        if self.puerta is not None and self.puerta.ausente:
+            self.overlay.dibujar_espera(frame)
+        if n_caras:
+            self.overlay.dibujar_landmarks(frame, face_landmarks, self.motor.puntos[0], self.inferencia.roi)
+            self.overlay.dibujar_panel(frame, ear, mar, self.maquina.mar_umbral, self.maquina.pestaneos,
+                                       self.maquina.tiempo_cierre, alerta)
+        self.visualizacion.mostrar('Sistema de Detección de Fatiga - asyncio', frame, self.canal, espera_ms=1)
+
+    async def _vision(self):
+        """Bucle por frame: inferencia en el ejecutor, decisión y comandos en el bucle de eventos"""
+        bucle = asyncio.get_running_loop()
+        maquina = self.maquina
+        t_inicio = time.perf_counter()
+        try:
+            while self.captura.activa:
+                frame_capturado, n_caras, face_landmarks = await bucle.run_in_executor(self.ejecutor, self._paso)
+                if frame_capturado is None:
+                    print('[ADVERTENCIA] Sin frames nuevos de la cámara.')
+                    continue
+                t_frame = frame_capturado.t_captura
+                t_etapa = self.instr.t()
+                alerta = False
+                t_cierre = None
+                ear = mar = np.nan
+                if n_caras:
+                    metricas = self.motor.calcular()
+                    ear, mar = metricas[0, COL_EAR], metricas[0, COL_MAR]
+                    self.inferencia.registrar_ear(ear, maquina.ear_umbral)
+                    self.adaptacion.actualizar(t_frame, ear, mar, maquina)
+                    alerta = maquina.actualizar(t_frame, ear, mar)
+                    if maquina.tiempo_cierre >= maquina.tiempo_alerta and self.reloj_real:
+                        t_cierre = maquina.t_inicio_cierre
+                    self._t_cara = t_frame
+                t_etapa = self.instr.registrar("estado", t_etapa)
+
+                # El comando sale en la siguiente vuelta del bucle, antes que los sumideros lentos
+                self.enlace.actualizar_parada(alerta, t_cierre)
+                puntos = self.motor.puntos[0] if n_caras else None
+                for sumidero in self.sumideros:
+                    sumidero(t_frame, maquina, puntos, ear, mar)
+                t_etapa = self.instr.registrar("sumideros", t_etapa)
+
+                if self.puerta is not None and self.puerta.cambio:
+                    if self.puerta.ausente:
+                        print(f"[INFO] Sin conductor: modo espera, sondeo cada {self.args.sondeo_ausente:.1f}s")
+                    else:
+                        print(f"[INFO] Conductor detectado tras {self.puerta.duracion_ausencia:.1f}s en espera")
+                if self.visualizacion is not None:
+                    frame = frame_capturado.imagen
+                    if frame is None:
+                        frame = self.inferencia.pool.lienzo("lienzo", (480, 640, 3))
+                    await bucle.run_in_executor(self.ejecutor, self._mostrar, frame, face_landmarks,
+                                                n_caras, ear, mar, alerta)
+                    self.instr.registrar("ventana", t_etapa)
+
+                if self.reloj_real:
+                    self.instr.valor("captura_a_resultado", time.time() - t_frame)
+                self.instr.fin_frame(self.captura.frames_descartados)
+
+                # Sin conductor y con cámara real, dormir hasta el próximo sondeo (sin bloquear el bucle)
+                if self.reloj_real and self.puerta is not None and self.puerta.ausente:
+                    await asyncio.sleep(self.puerta.espera(time.time()))
+
+                if self._atender_teclas():
+                    break
+        finally:
+            self.duracion_bucle = time.perf_counter() - t_inicio
+
+    def _atender_teclas(self):
+        """Controles (teclado de la ventana o stdin); True para salir"""
+        for tecla in self.canal.pendientes():
+            if tecla == 'c':
+                print("\n[INFO] Programa finalizado por el usuario")
+                return True
+            elif tecla == 'r':
+                print("[INFO] Contadores reseteados")
+                self.maquina.reiniciar()
+            elif tecla in ('+', '='):
+                self.adaptacion.ajustar_ear(self.maquina, +0.01)
+                print(f"[AJUSTE] ear_limiar aumentado a: {self.maquina.ear_umbral:.3f}")
+            elif tecla in ('-', '_'):
+                self.adaptacion.ajustar_ear(self.maquina, -0.01)
+                print(f"[AJUSTE] ear_limiar disminuido a: {self.maquina.ear_umbral:.3f}")
+        return False
+
+    async def _ventana_pestaneos(self):
+        """Con reloj real, cerrar cada segundo de la ventana de pestañeos aunque no lleguen frames con cara
+
+        Solo mientras el conductor está presente (último frame con cara hace
+        menos de 2 s): sin conductor la ventana se congela, como en el bucle
+        síncrono, para no dar una tasa baja falsa a su vuelta.
+        """
+        while True:
+            await asyncio.sleep(PERIODO_VENTANA)
+            ahora = time.time()
+            if self._t_cara is not None and ahora - self._t_cara < 2 * PERIODO_VENTANA:
+                self.maquina.actualizar_tasa(ahora)
+
+    async def ejecutar(self):
+        """Arrancar las tareas, esperar al fin de la fuente o a una señal y cerrar todo"""
+        import mediapipe as mp
+
+        bucle = asyncio.get_running_loop()
+        self.enlace.iniciar()
+        if self.args.headless:
+            self.canal.escuchar_stdin()
+        else:
+            import visualizacion
+            self.visualizacion = visualizacion
+            self.overlay = visualizacion.RenderizadorOriginal(contornos=not self.args.sin_contornos)
+
+        with mp.solutions.face_mesh.FaceMesh(min_detection_confidence=0.5,
+                                             min_tracking_confidence=0.5) as facemesh:
+            if self.args.presencia:
+                self.puerta = DetectorPresencia(self.args.sondeo_ausente, instrumentacion=self.instr)
+            self.inferencia = InferenciaEspaciada(facemesh, self.motor, intervalo_max=self.args.intervalo_max,
+                                                  instrumentacion=self.instr, roi=self.args.roi,
+                                                  presupuesto_ms=self.args.presupuesto_ms, presencia=self.puerta)
+            vision = bucle.create_task(self._vision(), name="vision")
+            temporizadores = [bucle.create_task(self._ventana_pestaneos(), name="ventana")] if self.reloj_real else []
+            for senal in (signal.SIGINT, signal.SIGTERM):
+                bucle.add_signal_handler(senal, vision.cancel)
+            try:
+                await vision
+            except asyncio.CancelledError:
+                print("\n[INFO] Deteniendo el detector...")
+            finally:
+                for senal in (signal.SIGINT, signal.SIGTERM):
+                    bucle.remove_signal_handler(senal)
+                for tarea in temporizadores:
+                    tarea.cancel()
+                await asyncio.gather(*temporizadores, return_exceptions=True)
+                # La inferencia en curso termina antes de liberar la cámara y FaceMesh
+                await bucle.run_in_executor(self.ejecutor, self.captura.detener)
+                self.ejecutor.shutdown(wait=True)
+        await self.cerrar()
+
+    async def cerrar(self):
+        """Liberar cámara, puerto serie y sumideros e imprimir el resumen"""
+        self.fuente.release()
+        if self.visualizacion is not None:
+            self.visualizacion.cerrar()
+        # Dar una vuelta al bucle para que salga el último comando pendiente
+        await asyncio.sleep(0)
+        bt_estadisticas = self.enlace.estadisticas()
+        await self.enlace.detener()
+        if bt_estadisticas["conectado"]:
+            print("[INFO] Conexión Bluetooth cerrada")
+        self.instr.cerrar()
+        self.grabador.cerrar()
+        self.publicador.cerrar()
+        self.adaptacion.cerrar()
+
+        maquina = self.maquina
+        print("\n" + "=" * 70)
+        print("RESUMEN DEL SISTEMA (asyncio):")
+        print(f"Total de detecciones de posible fatiga: {maquina.pestaneos}")
+        print(f"Frames capturados: {self.captura.frames_capturados}, "
+              f"descartados: {self.captura.frames_descartados}")
+        if self.grabador.habilitado:
+            print(self.grabador.resumen())
+        if self.publicador.habilitado:
+            print(self.publicador.resumen())
+        if self.args.intervalo_max > 1 or self.args.roi or self.args.presencia:
+            print(self.inferencia.resumen())
+        if self.duracion_bucle > 0:
+            print(f"FPS efectivos: {self.captura.frames_entregados / self.duracion_bucle:.1f}")
+        print(f"Bluetooth: {bt_estadisticas['enviados']} comandos enviados, "
+              f"{bt_estadisticas['colapsados']} colapsados, "
+              f"latencia de escritura media {bt_estadisticas['latencia_media_ms']:.2f} ms "
+              f"(máx {bt_estadisticas['latencia_max_ms']:.2f} ms)")
+        if bt_estadisticas.get("tramas_enviadas"):
+            print(resumen_confirmaciones(bt_estadisticas))
+        print(f"Parámetros usados: EAR < {round(maquina.ear_umbral, 3)}, MAR < {round(maquina.mar_umbral, 3)}")
+        print("=" * 70)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Detector de fatiga con Bluetooth sobre asyncio")
+    parser.add_argument("--fuente", default="0",
+                        help="índice de cámara, video, directorio de imágenes o registro .npz/.reg")
+    parser.add_argument("--tiempo-real", action="store_true",
+                        help="reproducir fuentes grabadas a su ritmo real (por defecto, máxima velocidad)")
+    parser.add_argument("--headless", action="store_true",
+                        help="sin ventana ni dibujo; controles por stdin")
+    parser.add_argument("--puerto-bt", default=PUERTO_POR_DEFECTO,
+                        help="puerto serie del enlace Bluetooth con el vehículo")
+    parser.add_argument("--protocolo", choices=[PROTOCOLO_TRAMAS, PROTOCOLO_ASCII], default=PROTOCOLO_TRAMAS,
+                        help="tramas con secuencia, CRC y confirmación (protocolo.py) o "
+                             "caracteres sueltos para el firmware anterior")
+    parser.add_argument("--sin-contornos", action="store_true",
+                        help="no dibujar los contornos de FaceMesh (solo los 20 puntos de interés)")
+    parser.add_argument("--intervalo-max", type=int, default=1,
+                        help="ejecutar FaceMesh como mínimo cada N frames (1 = en todos los frames)")
+    parser.add_argument("--roi", action="store_true",
+                        help="pasar a FaceMesh solo un recorte alrededor de la cara")
+    parser.add_argument("--presupuesto-ms", type=float, default=15.0,
+                        help="latencia objetivo de cada inferencia de FaceMesh con --roi")
+    parser.add_argument("--presencia", action="store_true",
+                        help="sin rostro durante 1 s, pausar FaceMesh y sondear a baja frecuencia")
+    parser.add_argument("--sondeo-ausente", type=float, default=0.5,
+                        help="segundos entre sondeos sin conductor con --presencia")
+    parser.add_argument("--conductor", default=None,
+                        help="adaptar los umbrales a la línea base de este conductor (perfil guardado)")
+    parser.add_argument("--perfiles", default="perfiles",
+                        help="directorio de perfiles de conductor")
+    parser.add_argument("--config", default=None,
+                        help="umbrales EAR/MAR y tiempo de alerta generados por calibracion.py")
+    parser.add_argument("--grabar", default=None,
+                        help="grabar por frame puntos, EAR/MAR y estado en este registro binario (.reg)")
+    parser.add_argument("--publicar", default=None,
+                        help="publicar cada frame en memoria compartida con este nombre (publicacion.py)")
+    parser.add_argument("--metricas", default=None,
+                        help="exportar tiempos por etapa a este fichero (.jsonl o .prom)")
+    parser.add_argument("--periodo-metricas", type=float, default=5.0,
+                        help="segundos entre exportaciones de métricas")
+    args = parser.parse_args()
+
+    print("=" * 70)
+    print("SISTEMA DE DETECCIÓN DE FATIGA CON BLUETOOTH (asyncio)")
+    print("=" * 70)
+    asyncio.run(DetectorAsincrono(args).ejecutar())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,558 @@
+# benchmark.py - Banco de pruebas de rendimiento del detector de fatiga
+# Mide, sin cámara y solo con CPU:
+#   - métricas EAR/MAR (extracción de los 20 puntos + cálculo, por frame y en lote)
+#   - la máquina de estados de fatiga en sus dos modos (original y prueba rápida)
+#   - el seguimiento Lucas-Kanade de los 20 puntos que sustituye a FaceMesh entre inferencias
+#   - la grabación binaria por frame y el reproceso de un registro mapeado en memoria
+#   - la publicación en el anillo de memoria compartida y la lectura por lotes
+#   - el análisis de la telemetría del vehículo (printf del firmware) a 1 kHz
+#   - overlay de prueba_rapida.py y detector_original.py (si hay pantalla/MediaPipe)
+#   - el pipeline completo de ambos scripts en modo headless, sobre un flujo
+#     sintético de landmarks y sobre los videos que se indiquen con --video
+# Cada resultado da throughput y latencias p50/p95/p99; el conjunto se guarda
+# en JSON para comparar entre commits con --comparar.
+#
+# Uso:
+#   python benchmark.py --salida base.json
+#   python benchmark.py --video prueba.mp4 --comparar base.json
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+from estado_fatiga import MaquinaEstadoFatiga, MODO_ORIGINAL, MODO_PRUEBA_RAPIDA
+from metricas import MotorMetricas, INDICES, N_PUNTOS, COL_EAR, COL_MAR
+from publicacion import PublicadorMetricas, SuscriptorMetricas
+from registro import (GrabadorRegistro, DTYPE_EPISODIO, TOLERANCIA_REPROCESO, diferencia_metricas,
+                      leer_registro, reprocesar)
+from seguimiento import SeguidorLK
+from telemetria import Telemetria
+
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+SCRIPTS = ("prueba_rapida.py", "detector_original.py")
+
+# Landmark con la interfaz de MediaPipe (atributos x, y)
+Landmark = namedtuple("Landmark", ["x", "y"])
+
+
+def generar_landmarks(ruta, duracion=60.0, fps=30.0, semilla=0):
+    """Guardar un registro sintético de landmarks (.npz) con pestañeos, microsueños y bostezos
+
+    Ojos abiertos (EAR ~0.30) con ruido, pestañeos de 150 ms cada 2-5 s, un
+    cierre de 2 s cada 20 s (debe alertar) y un bostezo de 2 s con ojos
+    entornados cada 20 s, desfasado (no debe alertar). La cara se desplaza
+    lentamente para que los puntos no sean constantes.
+    """
+    rng = np.random.default_rng(semilla)
+    n = int(duracion * fps)
+    t = np.arange(n) / fps
+
+    ear = 0.30 + rng.normal(0.0, 0.01, n)
+    mar = 0.05 + rng.normal(0.0, 0.005, n)
+    t_pestaneo = rng.uniform(2.0, 5.0)
+    while t_pestaneo < duracion:
+        ear[(t >= t_pestaneo) & (t < t_pestaneo + 0.15)] = 0.08
+        t_pestaneo += rng.uniform(2.0, 5.0)
+    fase = t % 20.0
+    ear[(fase >= 8.0) & (fase < 10.0)] = 0.10
+    bostezo = (fase >= 15.0) & (fase < 17.0)
+    ear[bostezo] = 0.15
+    mar[bostezo] = 0.60
+
+    # Centro de la cara con deriva lenta
+    centro = np.cumsum(rng.normal(0.0, 0.0005, (n, 2)), axis=0) + 0.5
+
+    puntos = np.empty((n, N_PUNTOS, 2))
+    ancho_ojo, ancho_boca = 0.06, 0.10
+    for base, dx in ((0, 0.06), (6, -0.06)):
+        # Orden por ojo: vertical 1 (a, b), vertical 2 (a, b), horizontal (a, b)
+        cx = centro[:, 0] + dx
+        cy = centro[:, 1] - 0.05
+        abertura = ear * ancho_ojo / 2.0
+        for k, (x, signo) in enumerate(((-1 / 6, -1), (-1 / 6, 1), (1 / 6, -1), (1 / 6, 1))):
+            puntos[:, base + k, 0] = cx + x * ancho_ojo
+            puntos[:, base + k, 1] = cy + signo * abertura
+        puntos[:, base + 4] = np.stack([cx - ancho_ojo / 2, cy], axis=1)
+        puntos[:, base + 5] = np.stack([cx + ancho_ojo / 2, cy], axis=1)
+    # Boca: tres pares verticales y el horizontal; MAR = suma verticales / (2 * horizontal)
+    cx = centro[:, 0]
+    cy = centro[:, 1] + 0.08
+    abertura = mar * ancho_boca / 3.0
+    for k, x in enumerate((-0.25, 0.0, 0.25)):
+        puntos[:, 12 + 2 * k, 0] = cx + x * ancho_boca
+        puntos[:, 12 + 2 * k, 1] = cy - abertura
+        puntos[:, 13 + 2 * k, 0] = cx + x * ancho_boca
+        puntos[:, 13 + 2 * k, 1] = cy + abertura
+    puntos[:, 18] = np.stack([cx - ancho_boca / 2, cy], axis=1)
+    puntos[:, 19] = np.stack([cx + ancho_boca / 2, cy], axis=1)
+
+    np.savez(ruta, t=t, puntos=puntos)
+    return puntos
+
+
+def resumen_tiempos(tiempos, unidades=1):
+    """Throughput y percentiles de una serie de duraciones (s) de `unidades` elementos cada una"""
+    ms = np.asarray(tiempos) * 1000.0
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    total = float(np.sum(tiempos))
+    return {
+        "n": len(ms),
+        "throughput_hz": len(ms) * unidades / total if total > 0 else 0.0,
+        "media_ms": float(ms.mean()),
+        "p50_ms": float(p50),
+        "p95_ms": float(p95),
+        "p99_ms": float(p99),
+        "max_ms": float(ms.max()),
+    }
+
+
+def _cronometrar(funcion, n, calentamiento=50):
+    """Ejecutar funcion(i) n veces y devolver la duración de cada llamada"""
+    for i in range(min(calentamiento, n)):
+        funcion(i)
+    tiempos = np.empty(n)
+    reloj = time.perf_counter
+    for i in range(n):
+        t0 = reloj()
+        funcion(i)
+        tiempos[i] = reloj() - t0
+    return tiempos
+
+
+def bench_metricas(puntos):
+    """EAR/MAR por frame (con extracción desde landmarks de MediaPipe) y en lote"""
+    resultados = {}
+    n = len(puntos)
+    motor = MotorMetricas(max_caras=1)
+
+    # Listas de 478 landmarks como las de FaceMesh, con los 20 puntos de interés
+    caras = []
+    for i in range(0, n, max(n // 200, 1)):
+        landmarks = [Landmark(0.0, 0.0)] * 478
+        for j, indice in enumerate(INDICES):
+            landmarks[indice] = Landmark(*puntos[i, j])
+        caras.append(landmarks)
+
+    def extraer_y_calcular(i):
+        motor.extraer(caras[i % len(caras)])
+        motor.calcular()
+
+    resultados["metricas.extraer_calcular"] = resumen_tiempos(_cronometrar(extraer_y_calcular, n))
+    resultados["metricas.calcular"] = resumen_tiempos(
+        _cronometrar(lambda i: motor.calcular(puntos[i]), n))
+
+    motor_lote = MotorMetricas(max_caras=1)
+    lote = resumen_tiempos(_cronometrar(lambda i: motor_lote.calcular(puntos), 20, calentamiento=2),
+                           unidades=n)
+    resultados["metricas.lote"] = lote
+    return resultados
+
+
+def bench_estado(puntos, fps=30.0, conductores=100):
+    """Máquina de estados de fatiga: un conductor por frame y muchos conductores a la vez"""
+    metricas = MotorMetricas(max_caras=1).calcular(puntos)
+    ear = metricas[:, COL_EAR].tolist()
+    mar = metricas[:, COL_MAR].tolist()
+    n = len(ear)
+    resultados = {}
+    for modo in (MODO_ORIGINAL, MODO_PRUEBA_RAPIDA):
+        maquina = MaquinaEstadoFatiga(modo=modo)
+        # El tiempo sigue avanzando también tras el calentamiento
+        frames = itertools.count()
+
+        def actualizar(i):
+            maquina.actualizar(next(frames) / fps, ear[i], mar[i])
+
+        resultados[f"estado.{modo}"] = resumen_tiempos(_cronometrar(actualizar, n))
+
+    # Muchos conductores en un solo proceso: una actualización de cada uno por frame
+    maquinas = [MaquinaEstadoFatiga() for _ in range(conductores)]
+    frames = itertools.count()
+
+    def actualizar_todos(i):
+        t = next(frames) / fps
+        for k, maquina in enumerate(maquinas):
+            j = (i + 37 * k) % n
+            maquina.actualizar(t, ear[j], mar[j])
+
+    resultados["estado.conductores"] = resumen_tiempos(_cronometrar(actualizar_todos, min(n, 1000)),
+                                                       unidades=conductores)
+    return resultados
+
+
+def bench_seguimiento(puntos, ancho=1280, alto=720):
+    """Seguimiento LK (con conversión a gris) de los 20 puntos sobre una textura en movimiento"""
+    rng = np.random.default_rng(0)
+    textura = cv2.GaussianBlur(rng.integers(0, 256, (alto + 64, ancho + 64), dtype=np.uint8), (0, 0), 2)
+    n = min(len(puntos), 300)
+    # Desplazamiento de 1 px por frame en diagonal (32 posiciones distintas)
+    frames = [cv2.cvtColor(textura[k % 32:k % 32 + alto, k % 32:k % 32 + ancho], cv2.COLOR_GRAY2BGR)
+              for k in range(33)]
+    seguidor = SeguidorLK()
+    actual = puntos[0].copy()
+    seguidor.iniciar(cv2.cvtColor(frames[0], cv2.COLOR_BGR2GRAY), actual)
+
+    def seguir(i):
+        gris = cv2.cvtColor(frames[1 + i % 32], cv2.COLOR_BGR2GRAY)
+        if not seguidor.seguir(gris, actual) or i % 32 == 31:
+            seguidor.iniciar(gris, puntos[0])
+
+    return {"seguimiento.lk_720p": resumen_tiempos(_cronometrar(seguir, n))}
+
+
+def bench_registro(puntos, directorio, fps=30.0):
+    """Coste por frame de la grabación binaria y reproceso completo del registro mapeado
+
+    Comprueba además que el reproceso da los mismos EAR/MAR que se grabaron,
+    también con la cara saliendo del encuadre (puntos fuera de [0, 1]).
+    """
+    puntos = puntos.copy()
+    puntos[::7] -= np.float32(0.3)
+    metricas = MotorMetricas(max_caras=1).calcular(puntos)
+    maquina = MaquinaEstadoFatiga()
+    ruta = os.path.join(directorio, "sesion.reg")
+    grabador = GrabadorRegistro(ruta)
+    n = len(puntos)
+    frames = itertools.count()
+
+    def agregar(i):
+        k = next(frames)
+        maquina.actualizar(k / fps, metricas[i, COL_EAR], metricas[i, COL_MAR])
+        grabador.agregar(k / fps, maquina, puntos[i], metricas[i, COL_EAR], metricas[i, COL_MAR])
+
+    resultados = {"registro.agregar": resumen_tiempos(_cronometrar(agregar, n))}
+    grabador.cerrar()
+
+    registros, _ = leer_registro(ruta)
+    tiempos = [time.perf_counter()]
+    for _ in range(5):
+        resultado = reprocesar(registros)
+        tiempos.append(time.perf_counter())
+    ear, mar = diferencia_metricas(registros, resultado)
+    if max(ear, mar) > TOLERANCIA_REPROCESO:
+        raise RuntimeError(f"El reproceso no reproduce los EAR/MAR grabados (diferencia {ear:.1e} / {mar:.1e})")
+    resultados["registro.reproceso"] = resumen_tiempos(np.diff(tiempos), unidades=len(registros))
+    return resultados
+
+
+def bench_publicacion(puntos, capacidad=4096, lote=256, fps=30.0):
+    """Coste por frame de publicar en el anillo y lectura por lotes de un suscriptor"""
+    metricas = MotorMetricas(max_caras=1).calcular(puntos)
+    maquina = MaquinaEstadoFatiga()
+    nombre = f"fatiga_bench_{os.getpid()}"
+    publicador = PublicadorMetricas(nombre, capacidad)
+    suscriptor = SuscriptorMetricas(nombre)
+    n = len(puntos)
+    frames = itertools.count()
+
+    def publicar(i):
+        k = next(frames)
+        publicador.publicar(k / fps, maquina, puntos[i], metricas[i, COL_EAR], metricas[i, COL_MAR])
+
+    resultados = {"publicacion.publicar": resumen_tiempos(_cronometrar(publicar, n))}
+
+    # Lectura: el publicador adelanta `lote` frames y el suscriptor los copia de una vez
+    suscriptor.siguiente = publicador.publicados + 1
+    tiempos = np.empty(max(n // lote, 1))
+    for j in range(len(tiempos)):
+        for i in range(lote):
+            publicar(i % n)
+        t0 = time.perf_counter()
+        suscriptor.leer()
+        tiempos[j] = time.perf_counter() - t0
+    resultados["publicacion.leer"] = resumen_tiempos(tiempos, unidades=lote)
+    suscriptor.cerrar()
+    publicador.cerrar()
+    return resultados
+
+
+def bench_telemetria(duracion=60.0, hz=1000.0, periodo_lectura=0.01):
+    """Análisis de los printf del vehículo con el ultrasonido a `hz` (el firmware va a 10 Hz)
+
+    El flujo se entrega en bloques de `periodo_lectura` segundos, como las
+    lecturas del puerto USB, y cada línea de motores es la de la tarea de 100 ms.
+    """
+    rng = np.random.default_rng(0)
+    n = int(duracion * hz)
+    cm = 20.0 + 80.0 * rng.random(n)
+    lineas = [f"[Ultrasonic] Leitura: {d:.2f} cm\r\n".encode() for d in cm]
+    cada_motor = max(int(hz * 0.1), 1)
+    for i in range(0, n, cada_motor):
+        lineas[i] += "[Motor] Livre - andando para frente\r\n".encode()
+    por_bloque = max(int(hz * periodo_lectura), 1)
+    bloques = [b"".join(lineas[i:i + por_bloque]) for i in range(0, n, por_bloque)]
+
+    telemetria = Telemetria(capacidad=n)
+    tiempos = np.empty(len(bloques))
+    for j, bloque in enumerate(bloques):
+        t0 = time.perf_counter()
+        telemetria.alimentar(bloque, j * periodo_lectura)
+        tiempos[j] = time.perf_counter() - t0
+    lineas_bloque = telemetria.lineas / len(bloques)
+    resultados = {"telemetria.alimentar": resumen_tiempos(tiempos, unidades=lineas_bloque)}
+
+    episodios = np.zeros(30, DTYPE_EPISODIO)
+    episodios["t_alerta"] = np.linspace(1.0, duracion - 1.0, len(episodios))
+    episodios["t_cierre"] = episodios["t_alerta"] - 1.5
+    episodios["t_fin"] = episodios["t_alerta"] + 2.0
+    tiempos = _cronometrar(lambda i: telemetria.alinear(episodios, velocidad=30.0), 20)
+    resultados["telemetria.alinear"] = resumen_tiempos(tiempos, unidades=len(episodios))
+    return resultados
+
+
+def _panel_referencia(frame, ear, mar, mar_limiar, pestaneos, tempo, alerta):
+    """Panel de detector_original.py dibujado directamente con cv2 (referencia del overlay cacheado)"""
+    duplex = cv2.FONT_HERSHEY_DUPLEX
+    blanco = (255, 255, 255)
+    estado_boca = "Abierto" if mar >= mar_limiar else "Cerrado"
+    cv2.rectangle(frame, (0, 1), (290, 140), (58, 58, 55), -1)
+    cv2.putText(frame, f"EAR: {round(ear, 2)}", (1, 24), duplex, 0.9, blanco, 2)
+    cv2.putText(frame, f"MAR: {round(mar, 2)} {estado_boca}", (1, 50), duplex, 0.9, blanco, 2)
+    cv2.putText(frame, f"Pestaneos: {pestaneos}", (1, 120), duplex, 0.9, (109, 233, 219), 2)
+    cv2.putText(frame, f"Tiempo: {round(tempo, 3)}", (1, 80), duplex, 0.9, blanco, 2)
+    if alerta:
+        cv2.rectangle(frame, (30, 400), (610, 452), (0, 0, 255), -1)
+        cv2.putText(frame, "Puede ser que esté con sueño,", (60, 420), duplex, 0.85, blanco, 1)
+        cv2.putText(frame, "considere descansar.", (180, 450), duplex, 0.85, blanco, 1)
+
+
+def bench_overlay(puntos, ancho=640, alto=480):
+    """Overlays cacheados de ambos scripts sobre frames de 640x480
+
+    Comprueba además que el panel cacheado de detector_original.py da los
+    mismos píxeles que dibujarlo directamente con cv2.
+    """
+    try:
+        import visualizacion
+    except Exception as e:
+        print(f"[ADVERTENCIA] Overlay no disponible ({e}); se omite")
+        return {}
+
+    motor = MotorMetricas(max_caras=1)
+    metricas = motor.calcular(puntos)
+    n = len(puntos)
+    base = np.random.default_rng(0).integers(0, 256, (alto, ancho, 3), dtype=np.uint8)
+    frame = base.copy()
+    resultados = {}
+
+    rapida = visualizacion.RenderizadorPruebaRapida()
+
+    def dibujar_rapida(i):
+        frame[...] = base
+        ear, mar = metricas[i, 2], metricas[i, 3]
+        condicion = "fatiga" if ear < 0.25 and mar < 0.2 else ("risa" if ear < 0.25 else "normal")
+        rapida.dibujar(frame, [(ear, mar, condicion, (i % 60) / 30.0)], i // 100, 0.25, 0.2, 1.5)
+
+    original = visualizacion.RenderizadorOriginal(contornos=False)
+    referencia = base.copy()
+    for i in range(min(n, 300)):
+        argumentos = (metricas[i, 2], metricas[i, 3], 0.2, i // 100, (i % 60) / 30.0, i % 90 > 45)
+        frame[...] = base
+        referencia[...] = base
+        original.dibujar_panel(frame, *argumentos)
+        _panel_referencia(referencia, *argumentos)
+        if not np.array_equal(frame, referencia):
+            raise RuntimeError(f"El panel cacheado no coincide con cv2 en el frame {i}")
+
+    def dibujar_original(i):
+        frame[...] = base
+        original.dibujar_landmarks(frame, None, puntos[i])
+        original.dibujar_panel(frame, metricas[i, 2], metricas[i, 3], 0.2, i // 100,
+                               (i % 60) / 30.0, i % 90 > 45)
+
+    # El tiempo de restaurar el frame se descuenta con una referencia vacía
+    copia = np.median(_cronometrar(lambda i: frame.__setitem__(Ellipsis, base), 200))
+    for nombre, funcion in (("overlay.prueba_rapida", dibujar_rapida),
+                            ("overlay.detector_original", dibujar_original)):
+        tiempos = np.maximum(_cronometrar(funcion, n) - copia, 0.0)
+        resultados[nombre] = resumen_tiempos(tiempos)
+    return resultados
+
+
+def _drenar_pty(maestro):
+    """Leer y descartar lo que el despachador escribe en el pseudo-terminal"""
+    try:
+        while True:
+            if not os.read(maestro, 1024):
+                return
+    except OSError:
+        return
+
+
+def bench_pipeline(script, fuente, nombre, directorio):
+    """Ejecutar un script en modo headless y leer sus histogramas de instrumentación"""
+    ruta_metricas = os.path.join(directorio, f"{nombre}.jsonl")
+    orden = [sys.executable, os.path.join(DIRECTORIO, script), "--fuente", fuente, "--headless",
+             "--metricas", ruta_metricas, "--periodo-metricas", "3600"]
+
+    maestro = None
+    if script == "detector_original.py":
+        # Enlace Bluetooth simulado: se mide también la escritura en el puerto
+        from bluetooth import crear_pty
+        maestro, ruta_pty = crear_pty()
+        threading.Thread(target=_drenar_pty, args=(maestro,), daemon=True).start()
+        orden += ["--puerto-bt", ruta_pty]
+
+    t0 = time.perf_counter()
+    proceso = subprocess.run(orden, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                             stderr=subprocess.PIPE, text=True, cwd=DIRECTORIO)
+    duracion = time.perf_counter() - t0
+    if maestro is not None:
+        os.close(maestro)
+    if proceso.returncode != 0 or not os.path.exists(ruta_metricas):
+        print(f"[ERROR] {script} falló con {fuente}:\n{proceso.stderr[-2000:]}")
+        return {}
+
+    with open(ruta_metricas) as f:
+        lineas = f.read().splitlines()
+    if not lineas:
+        return {}
+    datos = json.loads(lineas[-1])
+    etapas = datos["etapas"]
+
+    resultados = {}
+    frame = etapas.get("frame")
+    if frame and frame["n"]:
+        resultados[f"pipeline.{nombre}"] = {
+            "n": datos["frames"],
+            "throughput_hz": 1000.0 / frame["media_ms"] if frame["media_ms"] > 0 else 0.0,
+            "media_ms": frame["media_ms"],
+            "p50_ms": frame["p50_ms"],
+            "p95_ms": frame["p95_ms"],
+            "p99_ms": frame["p99_ms"],
+            "max_ms": frame["max_ms"],
+            "duracion_proceso_s": duracion,
+        }
+    for etapa, h in etapas.items():
+        if etapa != "frame" and h["n"]:
+            resultados[f"pipeline.{nombre}.{etapa}"] = {
+                "n": h["n"],
+                "throughput_hz": 1000.0 / h["media_ms"] if h["media_ms"] > 0 else 0.0,
+                **{k: h[k] for k in ("media_ms", "p50_ms", "p95_ms", "p99_ms", "max_ms")},
+            }
+    return resultados
+
+
+def _commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=DIRECTORIO,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def comparar(actual, ruta_base, tolerancia):
+    """Imprimir la variación frente a un resultado anterior; devuelve cuántas regresiones hay"""
+    with open(ruta_base) as f:
+        base = json.load(f)
+    print(f"\nComparación con {ruta_base} (commit {base.get('commit')})")
+    print(f"{'prueba':<56}{'p50 base':>10}{'p50':>10}{'Δ p50':>9}{'Δ thr':>9}")
+    regresiones = 0
+    for nombre, r in actual["resultados"].items():
+        b = base["resultados"].get(nombre)
+        if b is None:
+            continue
+        d_p50 = (r["p50_ms"] - b["p50_ms"]) / b["p50_ms"] if b["p50_ms"] > 0 else 0.0
+        d_thr = ((r["throughput_hz"] - b["throughput_hz"]) / b["throughput_hz"]
+                 if b["throughput_hz"] > 0 else 0.0)
+        marca = ""
+        if d_p50 > tolerancia or d_thr < -tolerancia:
+            marca = "  <-- REGRESIÓN"
+            regresiones += 1
+        print(f"{nombre:<56}{b['p50_ms']:>10.3f}{r['p50_ms']:>10.3f}"
+              f"{d_p50:>+9.1%}{d_thr:>+9.1%}{marca}")
+    return regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del detector de fatiga (solo CPU)")
+    parser.add_argument("--video", action="append", default=[],
+                        help="video grabado para el pipeline completo (se puede repetir)")
+    parser.add_argument("--duracion", type=float, default=60.0,
+                        help="segundos del flujo sintético de landmarks (a 30 fps)")
+    parser.add_argument("--salida", default=None,
+                        help="fichero JSON de resultados (por defecto benchmark_<commit>.json)")
+    parser.add_argument("--comparar", default=None,
+                        help="resultado JSON anterior con el que comparar")
+    parser.add_argument("--tolerancia", type=float, default=0.10,
+                        help="variación relativa a partir de la cual se marca una regresión")
+    parser.add_argument("--sin-overlay", action="store_true", help="no medir el overlay")
+    parser.add_argument("--sin-pipeline", action="store_true", help="no ejecutar los scripts completos")
+    args = parser.parse_args()
+
+    cv2.setNumThreads(1)
+    commit = _commit()
+    resultados = {}
+
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta_sintetico = os.path.join(directorio, "sintetico.npz")
+        puntos = generar_landmarks(ruta_sintetico, duracion=args.duracion)
+        print(f"[INFO] Flujo sintético: {len(puntos)} frames")
+
+        print("[INFO] Métricas EAR/MAR...")
+        resultados.update(bench_metricas(puntos))
+        print("[INFO] Máquina de estados...")
+        resultados.update(bench_estado(puntos))
+        print("[INFO] Seguimiento óptico...")
+        resultados.update(bench_seguimiento(puntos))
+        print("[INFO] Registro binario...")
+        resultados.update(bench_registro(puntos, directorio))
+        print("[INFO] Publicación en memoria compartida...")
+        resultados.update(bench_publicacion(puntos))
+        print("[INFO] Telemetría del vehículo...")
+        resultados.update(bench_telemetria())
+        if not args.sin_overlay:
+            print("[INFO] Overlay...")
+            resultados.update(bench_overlay(puntos))
+        if not args.sin_pipeline:
+            fuentes = [("sintetico", ruta_sintetico)]
+            fuentes += [(os.path.splitext(os.path.basename(v))[0], os.path.abspath(v))
+                        for v in args.video]
+            for script in SCRIPTS:
+                for nombre_fuente, fuente in fuentes:
+                    nombre = f"{os.path.splitext(script)[0]}.{nombre_fuente}"
+                    print(f"[INFO] Pipeline {nombre}...")
+                    resultados.update(bench_pipeline(script, fuente, nombre, directorio))
+
+    informe = {
+        "commit": commit,
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "plataforma": platform.platform(),
+        "procesador": platform.processor() or platform.machine(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+        "resultados": resultados,
+    }
+
+    print(f"\n{'prueba':<56}{'thr (Hz)':>12}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for nombre, r in resultados.items():
+        print(f"{nombre:<56}{r['throughput_hz']:>12.1f}{r['p50_ms']:>10.3f}"
+              f"{r['p95_ms']:>10.3f}{r['p99_ms']:>10.3f}")
+
+    salida = args.salida or f"benchmark_{commit or 'local'}.json"
+    with open(salida, "w") as f:
+        json.dump(informe, f, indent=2)
+    print(f"\n[INFO] Resultados guardados en {salida}")
+
+    if args.comparar:
+        regresiones = comparar(informe, args.comparar, args.tolerancia)
+        if regresiones:
+            print(f"[ADVERTENCIA] {regresiones} regresiones por encima del {args.tolerancia:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,372 @@
+# bluetooth.py - Despachador de comandos Bluetooth en segundo plano
+# El bucle de visión solo indica si hay alerta; un hilo aparte escribe en el
+# puerto serie. Mientras dura la alerta se envía un único 'p' como latido
+# periódico, holgadamente dentro del timeout de 2 s de vBluetoothTask en el
+# firmware, en lugar de un 'p' por frame. Si el enlace cae, se reconecta con
+# espera exponencial sin bloquear nunca el bucle de frames.
+# Con el protocolo de tramas (protocolo.py, por defecto) cada comando lleva
+# número de secuencia, marca de tiempo y CRC, y un segundo hilo lee las
+# confirmaciones del vehículo: ida y vuelta, tramas perdidas y el instante en
+# que el vehículo confirma la parada. Mientras la primera parada de una alerta
+# no se confirme, el 'p' se reenvía cada REENVIO_PARADA en lugar de esperar al
+# siguiente latido. Con protocolo="ascii" se envían los caracteres sueltos
+# del firmware anterior.
+# La política (latido, colapso, reenvío de la parada, espera de reconexión,
+# tramas y estadísticas) vive en EnlaceComandos; DespachadorBluetooth y
+# asincrono.EnlaceSerieAsincrono solo ponen el transporte: abrir el puerto,
+# escribir los bytes y leer las confirmaciones.
+
+import contextlib
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+
+import serial
+
+from instrumentacion import InstrumentacionNula
+from protocolo import (codificar, reloj_us, DecodificadorTramas, SeguimientoConfirmaciones,
+                       CONFIRMACION, ESTADO_PARADO, PROTOCOLO_TRAMAS)
+
+PUERTO_POR_DEFECTO = "/dev/rfcomm0"
+BAUDIOS = 9600
+TIMEOUT_VEHICULO = 2.0       # Segundos sin 'p' tras los que el vehículo continúa
+PERIODO_LATIDO = 0.5         # Envío periódico de 'p' durante la alerta (timeout / 4)
+REENVIO_PARADA = 0.15        # Reenvío del 'p' mientras el vehículo no confirma la parada
+TIMEOUT_CONFIRMACION = 1.0   # Trama sin confirmación tras este tiempo: perdida
+
+
+class EnlaceComandos(ABC):
+    """Política de envío de comandos al vehículo, independiente del transporte
+
+    Las subclases implementan los métodos abstractos (abrir, cerrar y escribir
+    el puerto, despertar a quien envía) y pasan lo leído a `_alimentar`;
+    `_cerrojo` protege el estado compartido entre quien envía y quien lee.
+    """
+
+    def __init__(self, puerto=PUERTO_POR_DEFECTO, baudios=BAUDIOS,
+                 periodo_latido=PERIODO_LATIDO, backoff_inicial=0.5, backoff_max=10.0,
+                 instrumentacion=None, protocolo=PROTOCOLO_TRAMAS):
+        self.puerto = puerto
+        self.baudios = baudios
+        self.periodo_latido = periodo_latido
+        self.backoff_inicial = backoff_inicial
+        self.backoff_max = backoff_max
+        self.instrumentacion = instrumentacion or InstrumentacionNula()
+        self.protocolo = protocolo
+        self.tramas = protocolo == PROTOCOLO_TRAMAS
+        self.confirmaciones = SeguimientoConfirmaciones(TIMEOUT_CONFIRMACION)
+        self._decodificador = DecodificadorTramas()
+        self._cerrojo = contextlib.nullcontext()
+        self._serial = None
+
+        self._parada_activa = False
+        self._t_origen = None         # Instante (time.time) en que empezó la condición de alerta
+        self._pendientes = []         # Comandos sueltos pendientes (sin duplicados)
+        self._ultimo_latido = None    # Instante del último 'p' escrito
+        self._seq_parada = None       # Primera trama 'p' de la alerta, hasta que el vehículo confirma
+        self._t_origen_parada = None
+        self._ultimo_seq = None
+        self._backoff = backoff_inicial
+        self._proximo_intento = 0.0
+
+        # Estadísticas
+        self.enviados = 0
+        self.colapsados = 0           # Solicitudes absorbidas sin escritura extra
+        self.conexiones = 0
+        self.errores = 0
+        self.latencia_total = 0.0
+        self.latencia_max = 0.0
+
+    @abstractmethod
+    def _avisar(self):
+        """Despertar a quien envía (se llama con `_cerrojo` tomado)"""
+
+    @abstractmethod
+    def _conectar(self):
+        """Abrir el puerto si ya toca (`_puede_conectar`); True si queda conectado
+
+        Anota el resultado con `_conexion_abierta` o `_conexion_fallida`. En
+        un transporte asíncrono es una corrutina.
+        """
+
+    @abstractmethod
+    def _desconectar(self):
+        """Cerrar el puerto (si está abierto) y dejar `_serial` a None"""
+
+    @abstractmethod
+    def _escribir_bytes(self, datos):
+        """Escribir `datos` en el puerto; False (tras `_fallo`) si el enlace cayó"""
+
+    def actualizar_parada(self, alerta, t_origen=None):
+        """Indicar (una vez por frame) si hay alerta; nunca bloquea el bucle de visión
+
+        `t_origen` (time.time) es el inicio del cierre de ojos que provocó la
+        alerta; si se da, se mide la latencia de extremo a extremo hasta que
+        el primer 'p' queda escrito en el puerto.
+        """
+        with self._cerrojo:
+            if alerta and not self._parada_activa:
+                # Inicio de alerta: el primer 'p' sale de inmediato
+                self._parada_activa = True
+                self._t_origen = t_origen
+                self._t_origen_parada = t_origen
+                self._ultimo_latido = None
+                self._seq_parada = None
+                self._avisar()
+            elif alerta:
+                self.colapsados += 1
+            else:
+                self._parada_activa = False
+
+    def enviar(self, comando):
+        """Encolar un comando suelto (p. ej. 'c'); los repetidos se colapsan"""
+        with self._cerrojo:
+            if comando in self._pendientes:
+                self.colapsados += 1
+            else:
+                self._pendientes.append(comando)
+                self._avisar()
+
+    @property
+    def conectado(self):
+        return self._serial is not None
+
+    def profundidad_cola(self):
+        """Comandos a la espera de escribirse (incluido el latido vencido)"""
+        with self._cerrojo:
+            return len(self._pendientes) + (1 if self._latido_vencido(time.monotonic()) else 0)
+
+    def estadisticas(self):
+        """Resumen de envíos, colapsos, reconexiones, latencia de escritura y confirmaciones"""
+        estadisticas = {
+            "conectado": self.conectado,
+            "protocolo": self.protocolo,
+            "enviados": self.enviados,
+            "colapsados": self.colapsados,
+            "profundidad_cola": self.profundidad_cola(),
+            "conexiones": self.conexiones,
+            "errores": self.errores,
+            "latencia_media_ms": 1000.0 * self.latencia_total / self.enviados if self.enviados else 0.0,
+            "latencia_max_ms": 1000.0 * self.latencia_max,
+        }
+        if self.tramas:
+            estadisticas.update(self.confirmaciones.estadisticas())
+        return estadisticas
+
+    def _periodo(self):
+        """Intervalo entre 'p': corto hasta que el vehículo confirma la parada"""
+        return REENVIO_PARADA if self._seq_parada is not None else self.periodo_latido
+
+    def _latido_vencido(self, ahora):
+        return self._parada_activa and (
+            self._ultimo_latido is None or ahora - self._ultimo_latido >= self._periodo())
+
+    def _espera(self, ahora):
+        """Segundos hasta el próximo latido o reintento de conexión (None: hasta que se pida algo)"""
+        espera = None
+        if self._parada_activa and self._ultimo_latido is not None:
+            espera = self._ultimo_latido + self._periodo() - ahora
+        if self._serial is None and (self._parada_activa or self._pendientes):
+            reintento = self._proximo_intento - ahora
+            espera = reintento if espera is None else max(espera, reintento)
+        return None if espera is None else max(espera, 0.0)
+
+    def _listos(self, ahora):
+        """Comandos que toca escribir ahora (pendientes y el latido vencido), con `_cerrojo` tomado"""
+        comandos = list(self._pendientes)
+        if self._latido_vencido(ahora) and "p" not in comandos:
+            comandos.append("p")
+        return comandos
+
+    def _puede_conectar(self, ahora):
+        return ahora >= self._proximo_intento
+
+    def _conexion_abierta(self):
+        self._backoff = self.backoff_inicial
+        self.conexiones += 1
+        print(f"[OK] Bluetooth conectado en {self.puerto}")
+
+    def _conexion_fallida(self, error, ahora):
+        self._proximo_intento = ahora + self._backoff
+        print(f"[ADVERTENCIA] Bluetooth no disponible ({error}); reintento en {self._backoff:.1f}s")
+        self._backoff = min(self._backoff * 2, self.backoff_max)
+
+    def _fallo(self, error):
+        """La escritura falló: cerrar el puerto y reintentar tras la espera actual"""
+        self.errores += 1
+        print(f"[ERROR] Fallo al enviar por Bluetooth: {error}")
+        self._desconectar()
+        self._proximo_intento = time.monotonic() + self._backoff
+
+    def _enviar_listos(self, comandos):
+        """Escribir `comandos` en orden hasta el primer fallo y anotar cada envío"""
+        for comando in comandos:
+            if not self._escribir(comando):
+                break
+            with self._cerrojo:
+                if comando in self._pendientes:
+                    self._pendientes.remove(comando)
+                if comando == "p":
+                    if self._ultimo_latido is None:
+                        print("[BLUETOOTH] Enviado comando 'p' - Vehículo debe detenerse")
+                        if self._t_origen is not None:
+                            self.instrumentacion.valor("cierre_a_comando", time.time() - self._t_origen)
+                            self._t_origen = None
+                        if self.tramas:
+                            self._seq_parada = self._ultimo_seq
+                    self._ultimo_latido = time.monotonic()
+
+    def _escribir(self, comando):
+        if self.tramas:
+            seq = self.confirmaciones.siguiente()
+            datos = codificar(comando, seq, reloj_us())
+            # Antes de escribir: la confirmación puede llegar antes de que write() vuelva
+            self.confirmaciones.enviada(seq)
+            self._ultimo_seq = seq
+        else:
+            datos = comando.encode() + b"\n"
+        t0 = time.perf_counter()
+        if not self._escribir_bytes(datos):
+            return False
+        latencia = time.perf_counter() - t0
+        self.instrumentacion.valor("escritura_serie", latencia)
+        self.enviados += 1
+        self.latencia_total += latencia
+        self.latencia_max = max(self.latencia_max, latencia)
+        return True
+
+    def _alimentar(self, datos):
+        """Bytes leídos del vehículo: procesar las confirmaciones"""
+        for trama in self._decodificador.alimentar(datos):
+            if trama.comando == CONFIRMACION:
+                self._confirmar(trama)
+
+    def _confirmar(self, trama):
+        ida_vuelta = self.confirmaciones.confirmada(trama)
+        if ida_vuelta is None:
+            return
+        self.instrumentacion.valor("ida_vuelta", ida_vuelta)
+        with self._cerrojo:
+            # Cualquier trama de esta alerta (seq >= la del primer 'p') que llegue con el vehículo parado
+            primera = (self._seq_parada is not None and trama.dato & ESTADO_PARADO
+                       and (trama.seq - self._seq_parada) & 0xFFFF < 0x8000)
+            if primera:
+                self._seq_parada = None
+                t_origen, self._t_origen_parada = self._t_origen_parada, None
+        if primera:
+            print(f"[BLUETOOTH] Parada confirmada por el vehículo (ida y vuelta {1000.0 * ida_vuelta:.1f} ms)")
+            if t_origen is not None:
+                self.instrumentacion.valor("cierre_a_confirmacion", time.time() - t_origen)
+
+
+class DespachadorBluetooth(EnlaceComandos):
+    """Hilo que envía los comandos al vehículo con latido, colapso y reconexión"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._cond = threading.Condition()
+        self._cerrojo = self._cond
+        self._activo = False
+        self._hilo = None
+        self._hilo_lector = None
+
+    def iniciar(self):
+        """Arrancar el hilo de envío"""
+        self._activo = True
+        self._hilo = threading.Thread(target=self._bucle, name="bluetooth", daemon=True)
+        self._hilo.start()
+        if self.tramas:
+            self._hilo_lector = threading.Thread(target=self._leer, name="bluetooth_lector", daemon=True)
+            self._hilo_lector.start()
+        return self
+
+    def _avisar(self):
+        self._cond.notify()
+
+    def _conectar(self):
+        ahora = time.monotonic()
+        if not self._puede_conectar(ahora):
+            return False
+        try:
+            # timeout de lectura para el hilo lector; el de envío nunca lee
+            self._serial = serial.Serial(self.puerto, self.baudios, timeout=0.1, write_timeout=0.5)
+        except Exception as e:
+            self._conexion_fallida(e, ahora)
+            return False
+        self._conexion_abierta()
+        return True
+
+    def _desconectar(self):
+        if self._serial is not None:
+            try:
+                self._serial.close()
+            except Exception:
+                pass
+            self._serial = None
+
+    def _bucle(self):
+        # Primer intento de conexión al arrancar (informa del estado del enlace)
+        self._conectar()
+        while True:
+            with self._cond:
+                while self._activo:
+                    ahora = time.monotonic()
+                    listo = self._pendientes or self._latido_vencido(ahora)
+                    if listo and (self._serial is not None or self._puede_conectar(ahora)):
+                        break
+                    self._cond.wait(self._espera(ahora))
+                if not self._activo:
+                    break
+                ahora = time.monotonic()
+                comandos = self._listos(ahora)
+
+            if self._serial is None and not self._conectar():
+                continue
+            self._enviar_listos(comandos)
+
+        self._desconectar()
+
+    def _leer(self):
+        """Hilo lector: confirmaciones del vehículo (solo con el protocolo de tramas)"""
+        while self._activo:
+            serie = self._serial
+            if serie is None:
+                time.sleep(0.1)
+                continue
+            try:
+                datos = serie.read(serie.in_waiting or 1)
+            except Exception:
+                # Puerto cerrado o caído: el hilo de envío lo detecta al escribir y reconecta
+                time.sleep(0.1)
+                continue
+            self._alimentar(datos)
+
+    def _escribir_bytes(self, datos):
+        try:
+            self._serial.write(datos)
+        except Exception as e:
+            self._fallo(e)
+            return False
+        return True
+
+    def detener(self):
+        """Parar el hilo y cerrar el puerto serie"""
+        with self._cond:
+            self._activo = False
+            self._cond.notify_all()
+        if self._hilo is not None:
+            self._hilo.join(timeout=2.0)
+        if self._hilo_lector is not None:
+            self._hilo_lector.join(timeout=2.0)
+
+
+def crear_pty():
+    """Crear un pseudo-terminal que hace de /dev/rfcomm0 en pruebas locales
+
+    Devuelve (fd_maestro, ruta_esclavo): el despachador abre `ruta_esclavo`
+    y la prueba lee lo enviado con os.read(fd_maestro, ...).
+    """
+    maestro, esclavo = os.openpty()
+    ruta = os.ttyname(esclavo)
+    return maestro, ruta
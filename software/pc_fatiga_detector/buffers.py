@@ -0,0 +1,75 @@
+# buffers.py - Buffers de frame preasignados y reutilizados
+# Las conversiones de color, reducciones y lecturas de la cámara escriben en
+# arrays que se reservan una vez (salidas dst= de OpenCV) en lugar de crear
+# uno nuevo por frame. Cada buffer tiene un nombre; solo se vuelve a reservar
+# si cambia su forma. El pool cuenta las reservas para comprobar que en
+# régimen estable el bucle no reserva memoria de frames.
+
+import cv2
+import numpy as np
+
+
+class PoolBuffers:
+    """Arrays de frame con nombre, reservados una vez y reutilizados"""
+
+    def __init__(self):
+        self._buffers = {}
+        self.usos = 0
+        self.asignaciones = 0
+        self.bytes_asignados = 0
+        self.ultima_asignacion = 0      # Número de uso en que se reservó el último buffer
+
+    def _registrar_asignacion(self, array):
+        self.asignaciones += 1
+        self.bytes_asignados += array.nbytes
+        self.ultima_asignacion = self.usos
+
+    def buffer(self, nombre, forma, dtype=np.uint8):
+        """Devolver el buffer `nombre` con esa forma (reservándolo solo si no existe o cambió)"""
+        self.usos += 1
+        array = self._buffers.get(nombre)
+        if array is None or array.shape != forma or array.dtype != dtype:
+            array = self._buffers[nombre] = np.empty(forma, dtype)
+            self._registrar_asignacion(array)
+        return array
+
+    def existente(self, nombre):
+        """Buffer `nombre` si ya existe (None si aún no se ha reservado)"""
+        return self._buffers.get(nombre)
+
+    def adoptar(self, nombre, array):
+        """Guardar como buffer `nombre` un array reservado fuera (p. ej. el primer frame leído)"""
+        self.usos += 1
+        if self._buffers.get(nombre) is not array:
+            self._buffers[nombre] = array
+            self._registrar_asignacion(array)
+        return array
+
+    def lienzo(self, nombre, forma):
+        """Buffer `nombre` puesto a negro (lienzo en blanco sobre el que dibujar)"""
+        array = self.buffer(nombre, forma)
+        array[...] = 0
+        return array
+
+    def convertir(self, nombre, imagen, codigo, canales=3):
+        """cv2.cvtColor escribiendo en el buffer `nombre`"""
+        forma = imagen.shape[:2] if canales == 1 else imagen.shape[:2] + (canales,)
+        return cv2.cvtColor(imagen, codigo, dst=self.buffer(nombre, forma))
+
+    def redimensionar(self, nombre, imagen, ancho, alto, interpolacion=cv2.INTER_AREA):
+        """cv2.resize escribiendo en el buffer `nombre`"""
+        forma = (alto, ancho) + imagen.shape[2:]
+        return cv2.resize(imagen, (ancho, alto), dst=self.buffer(nombre, forma, imagen.dtype),
+                          interpolation=interpolacion)
+
+    def resumen(self):
+        """Texto con las reservas hechas y cuándo fue la última"""
+        return (f"{self.asignaciones} reservas ({self.bytes_asignados / 1e6:.1f} MB) en "
+                f"{self.usos} usos, la última en el uso {self.ultima_asignacion}")
+
+
+def solo_lectura(array):
+    """Vista no modificable del array (MediaPipe la usa por referencia, sin copiarla)"""
+    vista = array.view()
+    vista.flags.writeable = False
+    return vista
@@ -0,0 +1,252 @@
+# calibracion.py - Calibración offline de umbrales sobre sesiones grabadas
+# Busca en toda la rejilla umbral EAR × umbral MAR × tiempo de alerta la
+# combinación que mejor separa los episodios de fatiga etiquetados, sin
+# repetir el bucle de la máquina de estados por combinación:
+#   1. EAR y MAR de todos los frames en una pasada (MotorMetricas en lote).
+#   2. Máscara de "ojos cerrados + boca neutra" para todos los pares de
+#      umbrales a la vez por broadcasting: (n_ear, n_mar, frames).
+#   3. Rachas de cierre (inicio y fin) de todos los pares en una sola
+#      diferencia; cada racha alerta con el tiempo t si dura >= t, y la alerta
+#      salta en el primer frame en que el cierre llega a t (igual que
+#      MaquinaEstadoFatiga, en ambos modos).
+#   4. Cada alerta se asigna al episodio etiquetado que la contiene; de ahí
+#      salen precisión, sensibilidad (recall), falsas alertas por hora y la
+#      latencia desde el inicio del episodio.
+# La recomendación prefiere combinaciones en el interior de la zona óptima
+# de la rejilla (ver mejores()).
+# La alerta por pocos pestañeos/min del modo original no se calibra aquí.
+#
+# Sesiones: registros .reg (--grabar) o .npz de landmarks. Las etiquetas de
+# `sesion.reg` se leen de `sesion.csv`: una línea `inicio,fin` por episodio
+# de fatiga, en segundos desde el primer frame de la sesión.
+#
+# Uso:
+#   python calibracion.py turno1.reg turno2.reg --salida config_fatiga.json
+#   python prueba_rapida.py --config config_fatiga.json
+
+import argparse
+import json
+import os
+import time
+from datetime import datetime
+
+import numpy as np
+
+from metricas import MotorMetricas, COL_EAR, COL_MAR
+from registro import leer_registro, puntos_registro
+
+# Rejilla por defecto: inicio, fin (incluido) y paso
+REJILLA_EAR = (0.15, 0.35, 0.01)
+REJILLA_MAR = (0.10, 0.60, 0.05)
+REJILLA_TIEMPO = (0.5, 3.0, 0.25)
+
+TOLERANCIA_EPISODIO = 1.0   # Segundos tras el fin del episodio en que una alerta aún cuenta como acierto
+
+
+def rango(inicio, fin, paso):
+    """Valores de inicio a fin (incluido) con el paso dado"""
+    return np.round(np.arange(inicio, fin + paso / 2.0, paso), 6)
+
+
+def cargar_sesion(ruta):
+    """Tiempos (desde el primer frame) y puntos (frames, 20, 2) de los frames con cara"""
+    if ruta.lower().endswith(".reg"):
+        registros, _ = leer_registro(ruta)
+        registros = registros[registros["caras"] > 0]
+        t, puntos = registros["t"], puntos_registro(registros)
+    else:
+        datos = np.load(ruta)
+        t, puntos = datos["t"], datos["puntos"]
+    t = np.asarray(t, dtype=np.float64)
+    return t - t[0], puntos
+
+
+def cargar_etiquetas(ruta):
+    """Episodios de fatiga (k, 2) con inicio y fin en segundos, ordenados por inicio"""
+    episodios = np.loadtxt(ruta, delimiter=",", ndmin=2, comments="#")
+    if episodios.size == 0:
+        return np.zeros((0, 2))
+    return episodios[np.argsort(episodios[:, 0])]
+
+
+def evaluar_sesion(t, ear, mar, episodios, umbrales_ear, umbrales_mar, tiempos_alerta,
+                   tolerancia=TOLERANCIA_EPISODIO):
+    """Contadores de una sesión para toda la rejilla (n_ear, n_mar, n_tiempo)
+
+    Devuelve un diccionario con arrays de la forma de la rejilla: alertas,
+    aciertos (alertas dentro de un episodio), episodios detectados y suma y
+    máximo de latencias de los detectados.
+    """
+    forma = (len(umbrales_ear), len(umbrales_mar), len(tiempos_alerta))
+    n_tiempos = forma[2]
+
+    # Rachas de cierre de todos los pares de umbrales: +1 al empezar, -1 tras el último frame
+    cerrado = (ear < umbrales_ear[:, None, None]) & (mar < umbrales_mar[None, :, None])
+    bordes = np.diff(np.pad(cerrado, ((0, 0), (0, 0), (1, 1))).view(np.int8), axis=-1)
+    i_ear, i_mar, inicio = np.nonzero(bordes == 1)
+    fin = np.nonzero(bordes == -1)[2] - 1
+    duracion = t[fin] - t[inicio]
+
+    # Alertas de cada racha para cada tiempo de alerta (rachas × n_tiempo)
+    alerta = duracion[:, None] >= tiempos_alerta[None, :]
+    r, i_tiempo = np.nonzero(alerta)
+    # Primer frame de la racha en que el cierre llega al tiempo de alerta
+    i_alerta = np.minimum(np.searchsorted(t, t[inicio[r]] + tiempos_alerta[i_tiempo] - 1e-9), fin[r])
+    t_alerta = t[i_alerta]
+    celda = (i_ear[r] * forma[1] + i_mar[r]) * n_tiempos + i_tiempo
+    n_celdas = int(np.prod(forma))
+
+    resultado = {"alertas": np.bincount(celda, minlength=n_celdas)}
+    if len(episodios):
+        k = np.searchsorted(episodios[:, 0], t_alerta, side="right") - 1
+        dentro = k >= 0
+        dentro[dentro] = t_alerta[dentro] <= episodios[k[dentro], 1] + tolerancia
+        resultado["aciertos"] = np.bincount(celda[dentro], minlength=n_celdas)
+        # Latencia de la primera alerta de cada episodio en cada celda
+        latencia = np.full((n_celdas, len(episodios)), np.inf)
+        np.minimum.at(latencia, (celda[dentro], k[dentro]), t_alerta[dentro] - episodios[k[dentro], 0])
+        detectado = np.isfinite(latencia)
+        resultado["detectados"] = detectado.sum(axis=1)
+        resultado["latencia_suma"] = np.where(detectado, latencia, 0.0).sum(axis=1)
+        resultado["latencia_max"] = np.where(detectado, latencia, 0.0).max(axis=1)
+    else:
+        resultado["aciertos"] = np.zeros(n_celdas, dtype=np.int64)
+        resultado["detectados"] = np.zeros(n_celdas, dtype=np.int64)
+        resultado["latencia_suma"] = np.zeros(n_celdas)
+        resultado["latencia_max"] = np.zeros(n_celdas)
+    return {nombre: valores.reshape(forma) for nombre, valores in resultado.items()}
+
+
+def calibrar(sesiones, umbrales_ear, umbrales_mar, tiempos_alerta, tolerancia=TOLERANCIA_EPISODIO):
+    """Acumular la rejilla sobre varias sesiones [(t, puntos, episodios)]; devuelve las métricas"""
+    motor = MotorMetricas(max_caras=1)
+    total = None
+    episodios_total = 0
+    horas = 0.0
+    for t, puntos, episodios in sesiones:
+        metricas = motor.calcular(puntos)
+        parcial = evaluar_sesion(t, metricas[:, COL_EAR], metricas[:, COL_MAR], episodios,
+                                 umbrales_ear, umbrales_mar, tiempos_alerta, tolerancia)
+        if total is None:
+            total = parcial
+        else:
+            for nombre in ("alertas", "aciertos", "detectados", "latencia_suma"):
+                total[nombre] = total[nombre] + parcial[nombre]
+            total["latencia_max"] = np.maximum(total["latencia_max"], parcial["latencia_max"])
+        episodios_total += len(episodios)
+        horas += (t[-1] - t[0]) / 3600.0 if len(t) else 0.0
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        precision = np.where(total["alertas"] > 0, total["aciertos"] / total["alertas"], 1.0)
+        recall = total["detectados"] / episodios_total if episodios_total else np.ones_like(precision)
+        latencia_media = np.where(total["detectados"] > 0,
+                                  total["latencia_suma"] / total["detectados"], np.nan)
+    falsas_hora = (total["alertas"] - total["aciertos"]) / horas if horas > 0 else np.zeros_like(precision)
+    return {
+        "precision": precision,
+        "recall": recall,
+        "latencia_media": latencia_media,
+        "latencia_max": total["latencia_max"],
+        "falsas_hora": falsas_hora,
+        "alertas": total["alertas"],
+        "episodios": episodios_total,
+        "horas": horas,
+    }
+
+
+def minimo_vecinos(valores):
+    """Mínimo de cada celda y sus vecinas (±1 en cada eje) de la rejilla"""
+    resultado = valores.copy()
+    for eje in range(valores.ndim):
+        ampliado = np.pad(resultado, [(1, 1) if k == eje else (0, 0) for k in range(valores.ndim)], mode="edge")
+        resultado = np.minimum(np.minimum(ampliado.take(range(0, valores.shape[eje]), axis=eje),
+                                          ampliado.take(range(2, valores.shape[eje] + 2), axis=eje)),
+                               resultado)
+    return resultado
+
+
+def mejores(resultado, beta=1.0, n=10):
+    """Índices (i_ear, i_mar, i_tiempo) de las mejores combinaciones y la F-beta de la rejilla
+
+    Se ordena primero por la peor F-beta entre la celda y sus vecinas (una
+    combinación en el borde de la zona óptima es frágil ante sesiones
+    nuevas), después por su propia F-beta, la latencia y las falsas alertas.
+    """
+    p, r = resultado["precision"], resultado["recall"]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        f = np.nan_to_num((1 + beta ** 2) * p * r / (beta ** 2 * p + r))
+    f_robusta = minimo_vecinos(f)
+    latencia = np.nan_to_num(resultado["latencia_media"], nan=np.inf)
+    # np.lexsort ordena por la última clave primero
+    orden = np.lexsort((resultado["falsas_hora"].ravel(), latencia.ravel(), -f.ravel(), -f_robusta.ravel()))
+    return [np.unravel_index(i, f.shape) for i in orden[:n]], f
+
+
+def cargar_config(ruta):
+    """Umbrales de una configuración generada por este script"""
+    with open(ruta) as f:
+        config = json.load(f)
+    return config["ear_umbral"], config["mar_umbral"], config["tiempo_alerta"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Calibración de umbrales EAR/MAR/tiempo sobre sesiones grabadas")
+    parser.add_argument("sesiones", nargs="+",
+                        help="registros .reg o .npz; las etiquetas se leen de <sesion>.csv")
+    parser.add_argument("--ear", type=float, nargs=3, default=REJILLA_EAR, metavar=("INI", "FIN", "PASO"))
+    parser.add_argument("--mar", type=float, nargs=3, default=REJILLA_MAR, metavar=("INI", "FIN", "PASO"))
+    parser.add_argument("--tiempo", type=float, nargs=3, default=REJILLA_TIEMPO, metavar=("INI", "FIN", "PASO"))
+    parser.add_argument("--tolerancia", type=float, default=TOLERANCIA_EPISODIO,
+                        help="segundos tras un episodio en que una alerta aún cuenta como acierto")
+    parser.add_argument("--beta", type=float, default=1.0,
+                        help="peso de la sensibilidad frente a la precisión (F-beta)")
+    parser.add_argument("--salida", default="config_fatiga.json", help="configuración recomendada")
+    args = parser.parse_args()
+
+    sesiones = []
+    for ruta in args.sesiones:
+        ruta_etiquetas = os.path.splitext(ruta)[0] + ".csv"
+        if not os.path.exists(ruta_etiquetas):
+            print(f"[ERROR] Falta el fichero de etiquetas {ruta_etiquetas}")
+            return
+        t, puntos = cargar_sesion(ruta)
+        episodios = cargar_etiquetas(ruta_etiquetas)
+        print(f"[INFO] {ruta}: {len(t)} frames con cara, {len(episodios)} episodios etiquetados")
+        sesiones.append((t, puntos, episodios))
+
+    umbrales_ear, umbrales_mar, tiempos = rango(*args.ear), rango(*args.mar), rango(*args.tiempo)
+    n_combinaciones = len(umbrales_ear) * len(umbrales_mar) * len(tiempos)
+    t0 = time.perf_counter()
+    resultado = calibrar(sesiones, umbrales_ear, umbrales_mar, tiempos, args.tolerancia)
+    print(f"[INFO] {n_combinaciones} combinaciones evaluadas en {time.perf_counter() - t0:.2f}s")
+
+    top, f = mejores(resultado, args.beta)
+    print(f"\n{'EAR':>6}{'MAR':>6}{'t (s)':>7}{'prec':>7}{'recall':>8}{'F':>7}{'lat (s)':>9}{'falsas/h':>10}")
+    for i in top:
+        print(f"{umbrales_ear[i[0]]:>6.2f}{umbrales_mar[i[1]]:>6.2f}{tiempos[i[2]]:>7.2f}"
+              f"{resultado['precision'][i]:>7.2f}{resultado['recall'][i]:>8.2f}{f[i]:>7.2f}"
+              f"{resultado['latencia_media'][i]:>9.2f}{resultado['falsas_hora'][i]:>10.1f}")
+
+    i = top[0]
+    config = {
+        "ear_umbral": float(umbrales_ear[i[0]]),
+        "mar_umbral": float(umbrales_mar[i[1]]),
+        "tiempo_alerta": float(tiempos[i[2]]),
+        "precision": float(resultado["precision"][i]),
+        "recall": float(resultado["recall"][i]),
+        "latencia_media_s": float(np.nan_to_num(resultado["latencia_media"][i])),
+        "latencia_max_s": float(resultado["latencia_max"][i]),
+        "falsas_alertas_hora": float(resultado["falsas_hora"][i]),
+        "episodios": resultado["episodios"],
+        "horas": resultado["horas"],
+        "sesiones": [os.path.basename(ruta) for ruta in args.sesiones],
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+    }
+    with open(args.salida, "w") as f_salida:
+        json.dump(config, f_salida, indent=2)
+    print(f"\n[INFO] Configuración recomendada guardada en {args.salida}: EAR < {config['ear_umbral']}, "
+          f"MAR >= {config['mar_umbral']}, alerta tras {config['tiempo_alerta']}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+# captura.py - Hilo productor de captura con buffer de un solo frame
+# El hilo lee la fuente continuamente y sobrescribe siempre el último frame,
+# así el bucle de inferencia actúa sobre la imagen más reciente y no sobre
+# frames acumulados en el driver de la cámara.
+#
+# Las imágenes se leen en buffers preasignados (tres en el hilo: el que se
+# está escribiendo, el del slot y el que tiene el consumidor), de modo que
+# en régimen estable no se reserva memoria por frame. Un frame entregado es
+# válido hasta la siguiente llamada a leer().
+
+import threading
+import time
+from collections import namedtuple
+
+from buffers import PoolBuffers
+from fuentes import RelojSimulado
+
+N_BUFFERS_HILO = 3
+
+# Frame capturado: imagen BGR, instante de captura, número de secuencia y,
+# en registros de landmarks, los 20 puntos ya extraídos (si no, None)
+FrameCapturado = namedtuple("FrameCapturado", ["imagen", "t_captura", "indice", "puntos"],
+                            defaults=[None])
+
+
+class CapturaHilo:
+    """Captura de video en segundo plano con buffer de último frame"""
+
+    def __init__(self, fuente, parar_si_falla=False):
+        self.fuente = fuente
+        self.reloj = fuente.reloj
+        self.parar_si_falla = parar_si_falla
+
+        self._cond = threading.Condition()
+        self._ultimo = None            # Único slot del buffer
+        self._ultimo_leido = -1        # Índice del último frame entregado
+        self._activa = False
+        self._hilo = None
+
+        # Buffers de imagen: el del slot y el entregado no se sobrescriben
+        self.pool = PoolBuffers()
+        self._buffer_slot = None
+        self._buffer_entregado = None
+
+        self.frames_capturados = 0
+        self.frames_entregados = 0     # Frames entregados al consumidor
+        self.frames_descartados = 0    # Frames sobrescritos sin procesar
+        self.fallos_lectura = 0
+
+    def iniciar(self):
+        """Arrancar el hilo productor"""
+        self._activa = True
+        self._hilo = threading.Thread(target=self._bucle, name="captura", daemon=True)
+        self._hilo.start()
+        return self
+
+    def _bucle(self):
+        while self._activa and self.fuente.isOpened():
+            with self._cond:
+                libre = next(i for i in range(N_BUFFERS_HILO)
+                             if i != self._buffer_slot and i != self._buffer_entregado)
+            nombre = f"captura{libre}"
+            exito, imagen, t_captura, puntos = self.fuente.leer(self.pool.existente(nombre))
+            if not exito:
+                self.fallos_lectura += 1
+                if self.parar_si_falla:
+                    break
+                time.sleep(0.005)
+                continue
+            if imagen is not None:
+                self.pool.adoptar(nombre, imagen)
+
+            with self._cond:
+                self._ultimo = FrameCapturado(imagen, t_captura, self.frames_capturados, puntos)
+                self._buffer_slot = libre
+                self.frames_capturados += 1
+                self._cond.notify()
+
+        with self._cond:
+            self._activa = False
+            self._cond.notify_all()
+
+    @property
+    def activa(self):
+        """True mientras el hilo siga produciendo o quede un frame sin leer"""
+        with self._cond:
+            return self._activa or self._hay_nuevo()
+
+    def _hay_nuevo(self):
+        return self._ultimo is not None and self._ultimo.indice > self._ultimo_leido
+
+    def leer(self, timeout=1.0):
+        """Devolver el frame más reciente no procesado (o None si no llega)
+
+        Los frames que el productor sobrescribió desde la última lectura se
+        suman a `frames_descartados`.
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._hay_nuevo() or not self._activa, timeout):
+                return None
+            if not self._hay_nuevo():
+                return None
+            frame = self._ultimo
+            self.frames_descartados += frame.indice - self._ultimo_leido - 1
+            self._ultimo_leido = frame.indice
+            self._buffer_entregado = self._buffer_slot
+            self.frames_entregados += 1
+            return frame
+
+    def detener(self):
+        """Parar el hilo productor (no libera la fuente)"""
+        with self._cond:
+            self._activa = False
+            self._cond.notify_all()
+        if self._hilo is not None:
+            self._hilo.join(timeout=2.0)
+
+
+class CapturaDirecta:
+    """Lectura síncrona sin descartes, para reproducciones deterministas
+
+    Misma interfaz que CapturaHilo: cada llamada a leer() devuelve el
+    siguiente frame de la fuente, de modo que la ejecución es repetible.
+    """
+
+    def __init__(self, fuente):
+        self.fuente = fuente
+        self.reloj = fuente.reloj
+        self._activa = False
+        self.pool = PoolBuffers()       # Un único buffer: el frame anterior ya no se usa
+
+        self.frames_capturados = 0
+        self.frames_entregados = 0
+        self.frames_descartados = 0
+        self.fallos_lectura = 0
+
+    def iniciar(self):
+        self._activa = True
+        return self
+
+    @property
+    def activa(self):
+        return self._activa and self.fuente.isOpened()
+
+    def leer(self, timeout=None):
+        exito, imagen, t_captura, puntos = self.fuente.leer(self.pool.existente("captura"))
+        if not exito:
+            self.fallos_lectura += 1
+            return None
+        if imagen is not None:
+            self.pool.adoptar("captura", imagen)
+        frame = FrameCapturado(imagen, t_captura, self.frames_capturados, puntos)
+        self.frames_capturados += 1
+        self.frames_entregados += 1
+        return frame
+
+    def detener(self):
+        self._activa = False
+
+
+def crear_captura(fuente, parar_si_falla=False):
+    """Elegir el modo de captura según la fuente
+
+    Las reproducciones con reloj simulado se leen de forma síncrona (cada
+    frame se procesa); la cámara y las reproducciones en tiempo real usan
+    el hilo con buffer de último frame.
+    """
+    if isinstance(fuente.reloj, RelojSimulado):
+        return CapturaDirecta(fuente).iniciar()
+    return CapturaHilo(fuente, parar_si_falla=parar_si_falla or not fuente.es_en_vivo).iniciar()
@@ -0,0 +1,42 @@
+# control.py - Canal de control no bloqueante
+# Las teclas de la ventana ('r', '+', '-', salir...) y, en modo headless,
+# las líneas escritas por stdin llegan al bucle principal a través de una
+# cola, sin que el bucle tenga que esperar a ninguna entrada.
+
+import queue
+import sys
+import threading
+
+
+class CanalControl:
+    """Cola de comandos de un carácter alimentada por teclado o stdin"""
+
+    def __init__(self):
+        self._cola = queue.Queue()
+        self._hilo = None
+
+    def enviar(self, comando):
+        """Añadir un comando (p. ej. la tecla leída con cv2.waitKey)"""
+        self._cola.put(comando)
+
+    def escuchar_stdin(self, entrada=None):
+        """Leer comandos de stdin en un hilo aparte (una tecla por carácter)"""
+        entrada = entrada or sys.stdin
+        self._hilo = threading.Thread(target=self._leer_lineas, args=(entrada,),
+                                      name="control-stdin", daemon=True)
+        self._hilo.start()
+        return self
+
+    def _leer_lineas(self, entrada):
+        for linea in entrada:
+            for comando in linea.strip():
+                self._cola.put(comando)
+
+    def pendientes(self):
+        """Devolver los comandos recibidos desde la última llamada (sin esperar)"""
+        comandos = []
+        while True:
+            try:
+                comandos.append(self._cola.get_nowait())
+            except queue.Empty:
+                return comandos
@@ -3,11 +3,69 @@
 # Desarrollado por: Maria Eduarda Santana Marques
 # Asignatura: Informática Industrial - Enero 2026
 
-import cv2
+import argparse
 import mediapipe as mp
-import numpy as np
 import time
-import serial
+
+from adaptacion import crear_adaptacion
+from bluetooth import DespachadorBluetooth, PUERTO_POR_DEFECTO
+from calibracion import cargar_config
+from captura import crear_captura
+from control import CanalControl
+from estado_fatiga import MaquinaEstadoFatiga, MODO_ORIGINAL
+from fuentes import abrir_fuente, RelojReal
+from instrumentacion import crear_instrumentacion
+from metricas import MotorMetricas, COL_EAR, COL_MAR
+from presencia import DetectorPresencia
+from protocolo import resumen_confirmaciones, PROTOCOLO_TRAMAS, PROTOCOLO_ASCII
+from publicacion import crear_publicador
+from registro import crear_grabador
+from seguimiento import InferenciaEspaciada
+
+# Fuente de frames: webcam (por defecto), video, directorio de imágenes o
+# registro de landmarks (.npz) para pruebas sin cámara
+parser = argparse.ArgumentParser(description="Detector de fatiga con Bluetooth")
+parser.add_argument("--fuente", default="0",
+                    help="índice de cámara, video, directorio de imágenes o registro .npz")
+parser.add_argument("--tiempo-real", action="store_true",
+                    help="reproducir fuentes grabadas a su ritmo real (por defecto, máxima velocidad)")
+parser.add_argument("--headless", action="store_true",
+                    help="sin ventana ni dibujo; controles por stdin")
+parser.add_argument("--puerto-bt", default=PUERTO_POR_DEFECTO,
+                    help="puerto serie del enlace Bluetooth con el vehículo")
+parser.add_argument("--protocolo", choices=[PROTOCOLO_TRAMAS, PROTOCOLO_ASCII], default=PROTOCOLO_TRAMAS,
+                    help="tramas con secuencia, CRC y confirmación (protocolo.py) o "
+                         "caracteres sueltos para el firmware anterior")
+parser.add_argument("--sin-contornos", action="store_true",
+                    help="no dibujar los contornos de FaceMesh (solo los 20 puntos de interés)")
+parser.add_argument("--intervalo-max", type=int, default=1,
+                    help="ejecutar FaceMesh como mínimo cada N frames, siguiendo los puntos "
+                         "con Lucas-Kanade entre medias (1 = FaceMesh en todos los frames)")
+parser.add_argument("--roi", action="store_true",
+                    help="pasar a FaceMesh solo un recorte alrededor de la cara, "
+                         "reducido según la latencia medida; frame completo si se pierde")
+parser.add_argument("--presupuesto-ms", type=float, default=15.0,
+                    help="latencia objetivo de cada inferencia de FaceMesh con --roi")
+parser.add_argument("--presencia", action="store_true",
+                    help="sin rostro durante 1 s, pausar FaceMesh y sondear con un detector "
+                         "barato (cambio de imagen + Haar) a baja frecuencia")
+parser.add_argument("--sondeo-ausente", type=float, default=0.5,
+                    help="segundos entre sondeos sin conductor con --presencia")
+parser.add_argument("--conductor", default=None,
+                    help="adaptar los umbrales a la línea base de este conductor (perfil guardado)")
+parser.add_argument("--perfiles", default="perfiles",
+                    help="directorio de perfiles de conductor")
+parser.add_argument("--config", default=None,
+                    help="umbrales EAR/MAR y tiempo de alerta generados por calibracion.py")
+parser.add_argument("--grabar", default=None,
+                    help="grabar por frame puntos, EAR/MAR y estado en este registro binario (.reg)")
+parser.add_argument("--publicar", default=None,
+                    help="publicar cada frame en memoria compartida con este nombre (publicacion.py)")
+parser.add_argument("--metricas", default=None,
+                    help="exportar tiempos por etapa a este fichero (.jsonl o .prom)")
+parser.add_argument("--periodo-metricas", type=float, default=5.0,
+                    help="segundos entre exportaciones de métricas")
+args = parser.parse_args()
 
 print("=" * 70)
 print("SISTEMA ORIGINAL DE DETECCIÓN DE FATIGA CON BLUETOOTH")
@@ -18,281 +76,248 @@ print("\n[NOTA] Este es el código EXACTO usado en el proyecto")
 print("       Incluye comunicación Bluetooth real con vehículo")
 print("=" * 70)
 
-# Inicializar MediaPipe
-mp_drawing = mp.solutions.drawing_utils
+# Inicializar MediaPipe (el dibujo vive en visualizacion.py)
 mp_face_mesh = mp.solutions.face_mesh
 
-# Puntos faciales para EAR (Eye Aspect Ratio)
-p_olho_esq = [385, 380, 387, 373, 362, 263]   # Ojo izquierdo
-p_olho_dir = [160, 144, 158, 153, 33, 133]    # Ojo derecho
-p_olhos = p_olho_esq + p_olho_dir
-
-# Puntos faciales para MAR (Mouth Aspect Ratio)
-p_boca = [82, 87, 13, 14, 312, 317, 78, 308]  # Boca
-
-def calculo_ear(face, p_olho_dir, p_olho_esq):
-    """Calcular Eye Aspect Ratio (EAR) - Relación de Aspecto del Ojo"""
-    try:
-        # Convertir landmarks a coordenadas 2D
-        face = np.array([[coord.x, coord.y] for coord in face])
-        face_esq = face[p_olho_esq, :]
-        face_dir = face[p_olho_dir, :]
-
-        # Cálculo EAR para ojo izquierdo
-        ear_esq = (np.linalg.norm(face_esq[0] - face_esq[1]) + 
-                  np.linalg.norm(face_esq[2] - face_esq[3])) / (2.0 * np.linalg.norm(face_esq[4] - face_esq[5]))
-        
-        # Cálculo EAR para ojo derecho
-        ear_dir = (np.linalg.norm(face_dir[0] - face_dir[1]) + 
-                  np.linalg.norm(face_dir[2] - face_dir[3])) / (2.0 * np.linalg.norm(face_dir[4] - face_dir[5]))
-        
-    except Exception as e:
-        # En caso de error en el cálculo
-        ear_esq = 0.0
-        ear_dir = 0.0
-    
-    # EAR promedio de ambos ojos
-    media_ear = (ear_esq + ear_dir) / 2.0
-    return media_ear
-
-def calculo_mar(face, p_boca):
-    """Calcular Mouth Aspect Ratio (MAR) - Relación de Aspecto de la Boca"""
-    try:
-        # Convertir landmarks a coordenadas 2D
-        face = np.array([[coord.x, coord.y] for coord in face])
-        boca = face[p_boca, :]
-        
-        # Cálculo MAR (distancia vertical / distancia horizontal)
-        mar = (np.linalg.norm(boca[0] - boca[1]) + 
-               np.linalg.norm(boca[2] - boca[3]) + 
-               np.linalg.norm(boca[4] - boca[5])) / (2.0 * np.linalg.norm(boca[6] - boca[7]))
-    except Exception as e:
-        mar = 0.0
-    
-    return mar
+# Motor de métricas: buffers preasignados, una sola pasada por frame
+motor_metricas = MotorMetricas(max_caras=1)
 
 # PARÁMETROS CALIBRADOS EXPERIMENTALMENTE
 ear_limiar = 0.25   # Umbral EAR: si < 0.25 → ojos cerrados
 mar_limiar = 0.2    # Umbral MAR: si > 0.2 → boca abierta
+tiempo_alerta = 1.5 # Segundos de ojos cerrados para la alerta
+if args.config:
+    # Umbrales recomendados por calibracion.py para este despliegue
+    ear_limiar, mar_limiar, tiempo_alerta = cargar_config(args.config)
+    print(f"[INFO] Configuración {args.config}: EAR < {ear_limiar}, MAR >= {mar_limiar}, "
+          f"alerta tras {tiempo_alerta}s")
+
+# Estado del sistema: cierre ocular, contador de detecciones y pestaneos por
+# minuto (ventana de 60 s en buffer circular) dentro de la máquina de estados
+maquina = MaquinaEstadoFatiga(ear_limiar, mar_limiar, tiempo_alerta=tiempo_alerta, modo=MODO_ORIGINAL)
+
+# Umbrales adaptados a la línea base del conductor (fijos sin --conductor)
+adaptacion = crear_adaptacion(args.conductor, args.perfiles)
 
-# Variables de estado del sistema
-dormindo = 0                # 0 = despierto, 1 = posible fatiga
-contagem_piscadas = 0       # Contador de detecciones
-c_tempo = 0                 # Contador de tiempo
-contagem_temporaria = 0     # Contador temporal
-contagem_lista = []         # Historial de detecciones
+# Inicializar captura de video (hilo productor con buffer de último frame;
+# las reproducciones grabadas se leen frame a frame con reloj simulado)
+fuente = abrir_fuente(args.fuente, tiempo_real=args.tiempo_real)
+print(f"[INFO] Iniciando fuente de video: {args.fuente}")
+captura = crear_captura(fuente)
+reloj = captura.reloj
+# Con reloj real, t_captura es comparable con time.time() y se puede medir
+# la latencia de extremo a extremo; en reproducciones simuladas no
+reloj_real = isinstance(reloj, RelojReal)
 
-t_piscadas = time.time()    # Tiempo de referencia
+# Instrumentación por etapa (objeto nulo sin coste si no se pide --metricas)
+instr = crear_instrumentacion(args.metricas, args.periodo_metricas)
+if instr.habilitada:
+    print(f"[INFO] Exportando métricas de rendimiento a {args.metricas}")
 
-# Inicializar captura de video
-cap = cv2.VideoCapture(0)
-print("[INFO] Iniciando cámara...")
+# Grabación binaria por frame (objeto nulo sin coste si no se pide --grabar)
+grabador = crear_grabador(args.grabar)
+if grabador.habilitado:
+    print(f"[INFO] Grabando registro binario en {args.grabar}")
+
+# Publicación por frame para otros procesos (objeto nulo si no se pide --publicar)
+publicador = crear_publicador(args.publicar)
+if publicador.habilitado:
+    print(f"[INFO] Publicando métricas en memoria compartida '{args.publicar}'")
 
 # CONFIGURACIÓN BLUETOOTH (conexión real con vehículo)
-porta_bt = "/dev/rfcomm0"  # Puerto Bluetooth en Linux
-try:
-    bt_serial = serial.Serial(porta_bt, 9600, timeout=1)
-    print(f"[OK] Bluetooth conectado en {porta_bt}")
-    print("[INFO] Comandos Bluetooth: 'p' = parar, 'c' = continuar")
-except Exception as e:
-    print(f"[ADVERTENCIA] Bluetooth no disponible: {e}")
-    print("[INFO] Sistema funcionando en modo local (sin Bluetooth)")
-    bt_serial = None
+# El despachador escribe en segundo plano: un 'p' inmediato al empezar la
+# alerta y luego un latido cada 0.5 s (el vehículo continúa tras 2 s sin 'p').
+# Si el puerto no está disponible, el sistema sigue en modo local y reintenta.
+porta_bt = args.puerto_bt  # Puerto Bluetooth en Linux
+bt_despachador = DespachadorBluetooth(porta_bt, instrumentacion=instr, protocolo=args.protocolo).iniciar()
+print("[INFO] Comandos Bluetooth: 'p' = parar, 'c' = continuar")
 
 print("\n[INSTRUCCIONES]")
-print("• Cerrar ojos + boca neutra > 1.5s → Alerta ROJA + comando Bluetooth 'p'")
+print(f"• Cerrar ojos + boca neutra > {tiempo_alerta}s → Alerta ROJA + comando Bluetooth 'p'")
 print("• Sonreír con ojos cerrados → NO alerta (algoritmo EAR+MAR funcionando)")
-print("• Presione 'c' para salir del programa")
+print("• Presione 'c' para salir, 'r' para resetear contadores, +/- para ajustar el umbral EAR")
+if args.headless:
+    print("  (modo headless: escriba la tecla + Enter en la consola)")
 print("-" * 60)
 
+# Canal de control no bloqueante; en modo headless no se importa ni se
+# llama a ningún código de ventana o dibujo
+canal = CanalControl()
+if args.headless:
+    visualizacion = None
+    canal.escuchar_stdin()
+else:
+    import visualizacion
+    overlay = visualizacion.RenderizadorOriginal(contornos=not args.sin_contornos)
+
 # Configurar FaceMesh de MediaPipe
 with mp_face_mesh.FaceMesh(
     min_detection_confidence=0.5,
     min_tracking_confidence=0.5
 ) as facemesh:
     
+    # FaceMesh cada N frames (adaptativo) con seguimiento óptico entre medias
+    # y, con --roi, sobre un recorte de la cara de tamaño adaptativo; con
+    # --presencia, sin conductor solo se sondea cada --sondeo-ausente segundos
+    puerta = DetectorPresencia(args.sondeo_ausente, instrumentacion=instr) if args.presencia else None
+    inferencia = InferenciaEspaciada(facemesh, motor_metricas, intervalo_max=args.intervalo_max,
+                                     instrumentacion=instr, roi=args.roi,
+                                     presupuesto_ms=args.presupuesto_ms, presencia=puerta)
+    
     # Bucle principal del sistema
-    while cap.isOpened():
-        sucesso, frame = cap.read()
-        if not sucesso:
-            print('[ADVERTENCIA] Ignorando frame vacío de la cámara.')
+    t_inicio_bucle = time.perf_counter()
+    salir = False
+    while captura.activa and not salir:
+        # Tomar solo el frame más reciente (los antiguos se descartan)
+        t_etapa = instr.t()
+        frame_capturado = captura.leer()
+        if frame_capturado is None:
+            print('[ADVERTENCIA] Sin frames nuevos de la cámara.')
             continue
+        t_etapa = instr.registrar("captura", t_etapa)
+        t_frame = frame_capturado.t_captura
+        alerta_frame = False
+        t_cierre = None             # Inicio del cierre de ojos que provoca la alerta
         
-        comprimento, largura, _ = frame.shape
+        if frame_capturado.puntos is not None:
+            # Registro de landmarks: sin imagen ni FaceMesh
+            frame = None if args.headless else inferencia.pool.lienzo("lienzo", (480, 640, 3))
+            motor_metricas.puntos[0] = frame_capturado.puntos
+            caras = [None]
+        else:
+            frame = frame_capturado.imagen
 
-        # Procesar frame para detección facial
-        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        saida_facemesh = facemesh.process(frame)
-        frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
+            # Procesar frame para detección facial: los 20 puntos quedan en
+            # el buffer del motor (landmarks de FaceMesh o seguimiento óptico)
+            n_caras, face_landmarks = inferencia.procesar(frame, t_frame)
+            caras = [face_landmarks] * n_caras
+            t_etapa = instr.t()
+            if puerta is not None and puerta.cambio:
+                if puerta.ausente:
+                    print(f"[INFO] Sin conductor: modo espera, sondeo cada {args.sondeo_ausente:.1f}s")
+                else:
+                    print(f"[INFO] Conductor detectado tras {puerta.duracion_ausencia:.1f}s en espera")
+            if visualizacion is not None and puerta is not None and puerta.ausente:
+                overlay.dibujar_espera(frame)
         
-        try:
-            # Si se detecta un rostro
-            for face_landmarks in saida_facemesh.multi_face_landmarks:
-                # Dibujar landmarks faciales (visualización)
-                mp_drawing.draw_landmarks(
-                    frame, 
-                    face_landmarks, 
-                    mp_face_mesh.FACEMESH_CONTOURS,
-                    landmark_drawing_spec=mp_drawing.DrawingSpec(
-                        color=(255, 102, 102), 
-                        thickness=1, 
-                        circle_radius=1
-                    ),
-                    connection_drawing_spec=mp_drawing.DrawingSpec(
-                        color=(102, 204, 0), 
-                        thickness=1, 
-                        circle_radius=1
-                    )
-                )
-                
-                face = face_landmarks.landmark
-                
-                # Dibujar puntos de interés (ojos y boca)
-                for id_coord, coord_xyz in enumerate(face):
-                    if id_coord in p_olhos:
-                        coord_cv = mp_drawing._normalized_to_pixel_coordinates(
-                            coord_xyz.x, coord_xyz.y, largura, comprimento
-                        )
-                        cv2.circle(frame, coord_cv, 2, (255, 0, 0), -1)
-                    
-                    if id_coord in p_boca:
-                        coord_cv = mp_drawing._normalized_to_pixel_coordinates(
-                            coord_xyz.x, coord_xyz.y, largura, comprimento
-                        )
-                        cv2.circle(frame, coord_cv, 2, (255, 0, 0), -1)
+        # Si se detecta un rostro
+        for face_landmarks in caras:
+            # Calcular métricas EAR y MAR (una sola pasada vectorizada)
+            metricas = motor_metricas.calcular()
+            ear = metricas[0, COL_EAR]
+            mar = metricas[0, COL_MAR]
+            inferencia.registrar_ear(ear, maquina.ear_umbral)
+            t_etapa = instr.registrar("metricas", t_etapa)
 
-                # Calcular métricas EAR y MAR
-                ear = calculo_ear(face, p_olho_dir, p_olho_esq)
-                mar = calculo_mar(face, p_boca)
-                
-                # Panel de información (fondo gris)
-                cv2.rectangle(frame, (0, 1), (290, 140), (58, 58, 55), -1)
-                
-                # Mostrar EAR
-                cv2.putText(
-                    frame, 
-                    f"EAR: {round(ear, 2)}", 
-                    (1, 24),
-                    cv2.FONT_HERSHEY_DUPLEX,
-                    0.9, 
-                    (255, 255, 255), 
-                    2
-                )
-                
-                # Mostrar MAR con estado
-                estado_boca = "Abierto" if mar >= mar_limiar else "Cerrado"
-                cv2.putText(
-                    frame, 
-                    f"MAR: {round(mar, 2)} {estado_boca}", 
-                    (1, 50),
-                    cv2.FONT_HERSHEY_DUPLEX,
-                    0.9, 
-                    (255, 255, 255), 
-                    2
-                )
-                
-                # LÓGICA DE DETECCIÓN EAR+MAR (ALGORITMO PRINCIPAL)
-                # Condición 1: Posible fatiga (ojos cerrados + boca neutra)
-                if ear < ear_limiar and mar < mar_limiar:
-                    t_inicial = time.time() if dormindo == 0 else t_inicial
-                    contagem_piscadas = contagem_piscadas + 1 if dormindo == 0 else contagem_piscadas
-                    dormindo = 1
-                
-                # Condición 2: Fin de posible fatiga o risa/bostezo
-                if (dormindo == 1 and ear >= ear_limiar) or (ear <= ear_limiar and mar >= mar_limiar):
-                    dormindo = 0
-                
-                # Cálculo de tiempo y estadísticas
-                t_final = time.time()
-                tempo_decorrido = t_final - t_piscadas
+            if visualizacion is not None:
+                overlay.dibujar_landmarks(frame, face_landmarks, motor_metricas.puntos[0],
+                                          inferencia.roi)
+                t_etapa = instr.registrar("render", t_etapa)
+            
+            # LÓGICA DE DETECCIÓN EAR+MAR (ALGORITMO PRINCIPAL)
+            # Posible fatiga = ojos cerrados + boca neutra; la risa o el
+            # bostezo (boca abierta) terminan el cierre sin alerta.
+            # CONDICIÓN DE ALERTA: Fatiga detectada
+            # 1. Pocos pestaneos por minuto (< 10) O
+            # 2. Ojos cerrados por más de 1.5 segundos
+            adaptacion.actualizar(t_frame, ear, mar, maquina)
+            alerta = maquina.actualizar(t_frame, ear, mar)
+            tempo = maquina.tiempo_cierre
+            if tempo >= maquina.tiempo_alerta and reloj_real:
+                t_cierre = maquina.t_inicio_cierre
+            t_etapa = instr.registrar("estado", t_etapa)
+            
+            if visualizacion is not None:
+                overlay.dibujar_panel(frame, ear, mar, maquina.mar_umbral,
+                                      maquina.pestaneos, tempo, alerta)
+                t_etapa = instr.registrar("render", t_etapa)
+            
+            alerta_frame = alerta_frame or alerta
 
-                if tempo_decorrido >= (c_tempo + 1):
-                    c_tempo = tempo_decorrido
-                    piscadas_ps = contagem_piscadas - contagem_temporaria
-                    contagem_temporaria = contagem_piscadas
-                    contagem_lista.append(piscadas_ps)
-                    contagem_lista = contagem_lista if (len(contagem_lista) <= 60) else contagem_lista[-60:]
-                
-                piscadas_pm = 15 if tempo_decorrido <= 60 else sum(contagem_lista)
+        # ENVÍO DE COMANDO BLUETOOTH: solo se marca el estado, nunca bloquea
+        bt_despachador.actualizar_parada(alerta_frame, t_cierre)
+        t_etapa = instr.registrar("bluetooth", t_etapa)
 
-                # Mostrar estadísticas
-                cv2.putText(
-                    frame, 
-                    f"Pestaneos: {contagem_piscadas}", 
-                    (1, 120),
-                    cv2.FONT_HERSHEY_DUPLEX,
-                    0.9, 
-                    (109, 233, 219), 
-                    2
-                )
-                
-                tempo = (t_final - t_inicial) if dormindo == 1 else 0.0
-                cv2.putText(
-                    frame, 
-                    f"Tiempo: {round(tempo, 3)}", 
-                    (1, 80),
-                    cv2.FONT_HERSHEY_DUPLEX,
-                    0.9, 
-                    (255, 255, 255), 
-                    2
-                )
-                
-                # CONDICIÓN DE ALERTA: Fatiga detectada
-                # 1. Pocos pestaneos por minuto (< 10) O
-                # 2. Ojos cerrados por más de 1.5 segundos
-                if piscadas_pm < 10 or tempo >= 1.5:
-                    # Barra de alerta ROJA
-                    cv2.rectangle(frame, (30, 400), (610, 452), (0, 0, 255), -1)
-                    cv2.putText(
-                        frame, 
-                        "Puede ser que esté con sueño,", 
-                        (60, 420),
-                        cv2.FONT_HERSHEY_DUPLEX, 
-                        0.85, 
-                        (255, 255, 255), 
-                        1
-                    )
-                    cv2.putText(
-                        frame, 
-                        "considere descansar.", 
-                        (180, 450),
-                        cv2.FONT_HERSHEY_DUPLEX, 
-                        0.85, 
-                        (255, 255, 255), 
-                        1
-                    )
-                    
-                    # ENVÍO DE COMANDO BLUETOOTH (si está disponible)
-                    if bt_serial:
-                        try:
-                            bt_serial.write(b"p\n")  # Comando 'p' = PARAR
-                            print(f"[BLUETOOTH] Enviado comando 'p' - Vehículo debe detenerse")
-                        except Exception as e:
-                            print(f"[ERROR] Fallo al enviar por Bluetooth: {e}")
-        
-        except Exception as e:
-            # Manejo de errores en el procesamiento
-            pass
+        # Grabación del frame (instante, puntos, EAR/MAR y estado)
+        if grabador.habilitado:
+            if caras:
+                grabador.agregar(t_frame, maquina, motor_metricas.puntos[0], ear, mar)
+            else:
+                grabador.agregar(t_frame, maquina)
+            t_etapa = instr.registrar("registro", t_etapa)
+        if publicador.habilitado:
+            if caras:
+                publicador.publicar(t_frame, maquina, motor_metricas.puntos[0], ear, mar)
+            else:
+                publicador.publicar(t_frame, maquina)
+            t_etapa = instr.registrar("publicacion", t_etapa)
+
+        # Mostrar frame en ventana (solo con pantalla)
+        if visualizacion is not None:
+            visualizacion.mostrar('Sistema de Detección de Fatiga - Código Original',
+                                  frame, canal, espera_ms=10)
+            instr.registrar("ventana", t_etapa)
 
-        # Mostrar frame en ventana
-        cv2.imshow('Sistema de Detección de Fatiga - Código Original', frame)
+        if reloj_real:
+            instr.valor("captura_a_resultado", time.time() - t_frame)
+        instr.contador("reservas_buffers", captura.pool.asignaciones + inferencia.pool.asignaciones)
+        instr.fin_frame(captura.frames_descartados)
+
+        # Sin conductor y con cámara real, dormir hasta el próximo sondeo
+        if reloj_real and puerta is not None and puerta.ausente:
+            time.sleep(puerta.espera(time.time()))
         
-        # Control de teclado: 'c' para salir
-        if cv2.waitKey(10) & 0xFF == ord('c'):
-            print("\n[INFO] Programa finalizado por el usuario")
-            break
+        # Controles (teclado de la ventana o stdin en modo headless)
+        for tecla in canal.pendientes():
+            if tecla == 'c':
+                print("\n[INFO] Programa finalizado por el usuario")
+                salir = True
+            elif tecla == 'r':
+                print("[INFO] Contadores reseteados")
+                maquina.reiniciar()
+            elif tecla in ('+', '='):
+                adaptacion.ajustar_ear(maquina, +0.01)
+                print(f"[AJUSTE] ear_limiar aumentado a: {maquina.ear_umbral:.3f}")
+            elif tecla in ('-', '_'):
+                adaptacion.ajustar_ear(maquina, -0.01)
+                print(f"[AJUSTE] ear_limiar disminuido a: {maquina.ear_umbral:.3f}")
+
+duracion_bucle = time.perf_counter() - t_inicio_bucle
 
 # Liberar recursos
-cap.release()
-cv2.destroyAllWindows()
+captura.detener()
+fuente.release()
+if visualizacion is not None:
+    visualizacion.cerrar()
 
-# Cerrar conexión Bluetooth si existe
-if bt_serial:
-    bt_serial.close()
+# Cerrar conexión Bluetooth
+bt_estadisticas = bt_despachador.estadisticas()
+bt_despachador.detener()
+if bt_estadisticas["conectado"]:
     print("[INFO] Conexión Bluetooth cerrada")
+instr.cerrar()
+grabador.cerrar()
+publicador.cerrar()
+adaptacion.cerrar()
 
 print("\n" + "=" * 70)
 print("RESUMEN DEL SISTEMA:")
-print(f"Total de detecciones de posible fatiga: {contagem_piscadas}")
-print(f"Parámetros usados: EAR < {ear_limiar}, MAR < {mar_limiar}")
+print(f"Total de detecciones de posible fatiga: {maquina.pestaneos}")
+print(f"Frames capturados: {captura.frames_capturados}, descartados: {captura.frames_descartados}")
+print(f"Buffers de frame: captura {captura.pool.resumen()}; inferencia {inferencia.pool.resumen()}")
+if grabador.habilitado:
+    print(grabador.resumen())
+if publicador.habilitado:
+    print(publicador.resumen())
+if args.intervalo_max > 1 or args.roi or args.presencia:
+    print(inferencia.resumen())
+if duracion_bucle > 0:
+    print(f"FPS efectivos: {captura.frames_entregados / duracion_bucle:.1f}")
+print(f"Bluetooth: {bt_estadisticas['enviados']} comandos enviados, "
+      f"{bt_estadisticas['colapsados']} colapsados, "
+      f"latencia de escritura media {bt_estadisticas['latencia_media_ms']:.2f} ms "
+      f"(máx {bt_estadisticas['latencia_max_ms']:.2f} ms)")
+if bt_estadisticas.get("tramas_enviadas"):
+    print(resumen_confirmaciones(bt_estadisticas))
+print(f"Parámetros usados: EAR < {round(maquina.ear_umbral, 3)}, MAR < {round(maquina.mar_umbral, 3)}")
 print("=" * 70)
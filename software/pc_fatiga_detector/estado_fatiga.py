@@ -0,0 +1,129 @@
+# estado_fatiga.py - Máquina de estados EAR+MAR de un conductor
+# Se alimenta con (t, ear, mar) frame a frame y mantiene el estado de cierre
+# ocular, el contador de pestañeos y la tasa de pestañeos por minuto. La tasa
+# usa un buffer circular de 60 segundos con suma acumulada, así que cada
+# actualización es O(1) y no reserva memoria. Un proceso puede seguir a
+# varios conductores con una instancia por cada uno, y la lógica funciona
+# igual en tiempo real que en reproducciones a máxima velocidad.
+#
+# Dos modos, con la semántica exacta de cada script:
+#   MODO_ORIGINAL (detector_original.py): el pestañeo se cuenta al cerrar los
+#     ojos y hay alerta con < 10 pestañeos/min o con un cierre >= 1.5 s.
+#   MODO_PRUEBA_RAPIDA (prueba_rapida.py): el pestañeo se cuenta al volver a
+#     abrir los ojos (no tras risa/bostezo) y solo alerta el cierre prolongado.
+
+MODO_ORIGINAL = "original"
+MODO_PRUEBA_RAPIDA = "prueba_rapida"
+
+VENTANA_PESTANEOS = 60      # Segundos de historial para la tasa de pestañeos
+PESTANEOS_INICIALES = 15    # Tasa supuesta mientras no hay un minuto de historial
+PESTANEOS_MINIMOS = 10      # Pestañeos/min por debajo de los cuales hay alerta (modo original)
+
+
+class MaquinaEstadoFatiga:
+    """Estado de fatiga de un conductor a partir de EAR y MAR"""
+
+    def __init__(self, ear_umbral=0.25, mar_umbral=0.2, tiempo_alerta=1.5, modo=MODO_ORIGINAL,
+                 ventana=VENTANA_PESTANEOS):
+        if modo not in (MODO_ORIGINAL, MODO_PRUEBA_RAPIDA):
+            raise ValueError(f"Modo desconocido: {modo}")
+        self.ear_umbral = ear_umbral
+        self.mar_umbral = mar_umbral
+        self.tiempo_alerta = tiempo_alerta
+        self.modo = modo
+
+        # Estado de cierre ocular
+        self.cerrado = False
+        self.t_inicio_cierre = None
+        self.pestaneos = 0
+
+        # Buffer circular de pestañeos por segundo con suma acumulada
+        self._ventana = [0] * ventana
+        self._pos = 0
+        self._llenos = 0
+        self._suma = 0
+        self._t_referencia = None
+        self._c_tempo = 0.0
+        self._pestaneos_previos = 0
+
+        # Resultado de la última actualización
+        self.condicion = "normal"       # "fatiga", "risa" o "normal"
+        self.tiempo_cierre = 0.0
+        self.pestaneos_por_minuto = PESTANEOS_INICIALES
+        self.fin_cierre = None          # Duración del cierre que acaba de terminar (o None)
+        self.alerta = False
+
+    def actualizar(self, t, ear, mar):
+        """Procesar un frame; devuelve True si hay alerta de fatiga"""
+        if self._t_referencia is None:
+            self._t_referencia = t
+        ojos_cerrados = ear < self.ear_umbral
+        boca_abierta = mar >= self.mar_umbral
+        self.fin_cierre = None
+
+        if ojos_cerrados and not boca_abierta:
+            self.condicion = "fatiga"
+        elif ojos_cerrados:
+            self.condicion = "risa"
+        else:
+            self.condicion = "normal"
+
+        if self.modo == MODO_ORIGINAL:
+            # Condición 1: posible fatiga (ojos cerrados + boca neutra)
+            if self.condicion == "fatiga" and not self.cerrado:
+                self.t_inicio_cierre = t
+                self.pestaneos += 1
+                self.cerrado = True
+            # Condición 2: fin de posible fatiga o risa/bostezo
+            if self.cerrado and (ear >= self.ear_umbral or (ear <= self.ear_umbral and boca_abierta)):
+                self.fin_cierre = t - self.t_inicio_cierre
+                self.cerrado = False
+        else:
+            if self.condicion == "fatiga":
+                if not self.cerrado:
+                    self.t_inicio_cierre = t
+                    self.cerrado = True
+            elif self.condicion == "risa":
+                self.cerrado = False
+            else:
+                if self.cerrado:
+                    # El operador acaba de abrir los ojos
+                    self.fin_cierre = t - self.t_inicio_cierre
+                    self.pestaneos += 1
+                self.cerrado = False
+
+        self.tiempo_cierre = (t - self.t_inicio_cierre) if self.cerrado else 0.0
+        self.actualizar_tasa(t)
+
+        self.alerta = self.tiempo_cierre >= self.tiempo_alerta
+        if self.modo == MODO_ORIGINAL:
+            self.alerta = self.alerta or self.pestaneos_por_minuto < PESTANEOS_MINIMOS
+        return self.alerta
+
+    def actualizar_tasa(self, t):
+        """Cerrar un segundo de pestañeos en el buffer circular (como mucho uno por llamada)
+
+        actualizar() la llama en cada frame; un temporizador puede llamarla
+        también para que la ventana avance aunque lleguen menos de un frame
+        con cara por segundo.
+        """
+        transcurrido = t - self._t_referencia
+        if transcurrido >= self._c_tempo + 1:
+            self._c_tempo = transcurrido
+            por_segundo = self.pestaneos - self._pestaneos_previos
+            self._pestaneos_previos = self.pestaneos
+            if self._llenos == len(self._ventana):
+                self._suma -= self._ventana[self._pos]
+            else:
+                self._llenos += 1
+            self._ventana[self._pos] = por_segundo
+            self._suma += por_segundo
+            self._pos = (self._pos + 1) % len(self._ventana)
+        self.pestaneos_por_minuto = PESTANEOS_INICIALES if transcurrido <= 60 else self._suma
+
+    def reiniciar(self):
+        """Poner a cero el cierre y el contador de pestañeos (tecla 'r')"""
+        self.cerrado = False
+        self.t_inicio_cierre = None
+        self.pestaneos = 0
+        self._pestaneos_previos = 0
@@ -0,0 +1,185 @@
+# fuentes.py - Fuentes de frames intercambiables y relojes
+# Permite ejecutar el detector con la webcam, un archivo de video, un
+# directorio de imágenes o un registro de landmarks grabado (.npz o el .reg
+# binario de registro.py). Los relojes
+# hacen que la reproducción pueda ir a máxima velocidad (los tiempos de
+# los frames controlan la lógica de TIEMPO_ALERTA) o en tiempo real.
+
+import os
+import time
+
+import cv2
+import numpy as np
+
+from registro import leer_registro, puntos_registro
+
+EXTENSIONES_IMAGEN = (".png", ".jpg", ".jpeg", ".bmp")
+FPS_POR_DEFECTO = 30.0
+
+
+class RelojReal:
+    """Reloj de pared: los frames se entregan a su ritmo real"""
+
+    def __init__(self):
+        self.t0 = time.time()
+
+    def ahora(self):
+        return time.time()
+
+    def esperar_hasta(self, t_relativo):
+        """Dormir hasta t0 + t_relativo; devuelve el instante actual"""
+        espera = self.t0 + t_relativo - time.time()
+        if espera > 0:
+            time.sleep(espera)
+        return self.ahora()
+
+
+class RelojSimulado:
+    """Reloj determinista: avanza solo con los tiempos de los frames"""
+
+    def __init__(self, t_inicial=0.0):
+        self.t = t_inicial
+
+    def ahora(self):
+        return self.t
+
+    def esperar_hasta(self, t_relativo):
+        """Saltar directamente al instante del frame (sin dormir)"""
+        self.t = max(self.t, t_relativo)
+        return self.t
+
+
+class FuenteCamara:
+    """Webcam en vivo (equivalente a cv2.VideoCapture(indice))"""
+
+    es_en_vivo = True
+
+    def __init__(self, indice=0, reloj=None):
+        self.cap = cv2.VideoCapture(indice)
+        self.reloj = reloj or RelojReal()
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def leer(self, destino=None):
+        """Devolver (exito, imagen, t_captura, puntos); la imagen se escribe en `destino` si se da"""
+        exito, imagen = self.cap.read(destino)
+        return exito, imagen, self.reloj.ahora(), None
+
+    def release(self):
+        self.cap.release()
+
+
+class FuenteVideo:
+    """Archivo de video; el tiempo de cada frame sale de su posición y los FPS"""
+
+    es_en_vivo = False
+
+    def __init__(self, ruta, reloj=None):
+        self.cap = cv2.VideoCapture(ruta)
+        self.reloj = reloj or RelojSimulado()
+        fps = self.cap.get(cv2.CAP_PROP_FPS)
+        self.fps = fps if fps and fps > 0 else FPS_POR_DEFECTO
+        self.indice = 0
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def leer(self, destino=None):
+        exito, imagen = self.cap.read(destino)
+        if not exito:
+            self.cap.release()
+            return False, None, self.reloj.ahora(), None
+        t = self.reloj.esperar_hasta(self.indice / self.fps)
+        self.indice += 1
+        return True, imagen, t, None
+
+    def release(self):
+        self.cap.release()
+
+
+class FuenteImagenes:
+    """Directorio de imágenes en orden alfabético, a `fps` imágenes por segundo"""
+
+    es_en_vivo = False
+
+    def __init__(self, directorio, fps=FPS_POR_DEFECTO, reloj=None):
+        self.rutas = sorted(
+            os.path.join(directorio, nombre) for nombre in os.listdir(directorio)
+            if nombre.lower().endswith(EXTENSIONES_IMAGEN)
+        )
+        self.fps = fps
+        self.reloj = reloj or RelojSimulado()
+        self.indice = 0
+
+    def isOpened(self):
+        return self.indice < len(self.rutas)
+
+    def leer(self, destino=None):
+        if not self.isOpened():
+            return False, None, self.reloj.ahora(), None
+        # cv2.imread siempre reserva una imagen nueva (`destino` no se usa)
+        imagen = cv2.imread(self.rutas[self.indice])
+        t = self.reloj.esperar_hasta(self.indice / self.fps)
+        self.indice += 1
+        return imagen is not None, imagen, t, None
+
+    def release(self):
+        self.indice = len(self.rutas)
+
+
+class FuenteLandmarks:
+    """Registro de landmarks grabado (.npz con arrays `t` y `puntos`, o .reg de registro.py)
+
+    `puntos` tiene forma (frames, 20, 2) en el orden de metricas.INDICES y
+    `t` los segundos de cada frame. No hay imagen: FaceMesh no se ejecuta.
+    De un .reg solo se reproducen los frames en los que había cara.
+    """
+
+    es_en_vivo = False
+
+    def __init__(self, ruta, reloj=None):
+        if ruta.lower().endswith(".reg"):
+            registros, _ = leer_registro(ruta)
+            registros = registros[registros["caras"] > 0]
+            self.t = registros["t"]
+            self.puntos = puntos_registro(registros)
+        else:
+            datos = np.load(ruta)
+            self.t = datos["t"]
+            self.puntos = datos["puntos"]
+        self.t0 = float(self.t[0]) if len(self.t) else 0.0
+        self.reloj = reloj or RelojSimulado()
+        self.indice = 0
+
+    def isOpened(self):
+        return self.indice < len(self.t)
+
+    def leer(self, destino=None):
+        if not self.isOpened():
+            return False, None, self.reloj.ahora(), None
+        i = self.indice
+        t = self.reloj.esperar_hasta(float(self.t[i]) - self.t0)
+        self.indice += 1
+        return True, None, t, self.puntos[i]
+
+    def release(self):
+        self.indice = len(self.t)
+
+
+def abrir_fuente(spec, tiempo_real=False, fps=FPS_POR_DEFECTO):
+    """Crear la fuente adecuada a partir de un índice de cámara o una ruta
+
+    Las fuentes grabadas usan un RelojSimulado (máxima velocidad) salvo que
+    `tiempo_real` sea True.
+    """
+    spec = str(spec)
+    if spec.isdigit():
+        return FuenteCamara(int(spec))
+
+    reloj = RelojReal() if tiempo_real else RelojSimulado()
+    if os.path.isdir(spec):
+        return FuenteImagenes(spec, fps=fps, reloj=reloj)
+    if spec.lower().endswith((".npz", ".reg")):
+        return FuenteLandmarks(spec, reloj=reloj)
+    return FuenteVideo(spec, reloj=reloj)
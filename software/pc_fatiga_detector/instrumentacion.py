@@ -0,0 +1,219 @@
+# instrumentacion.py - Tiempos por etapa del bucle y exportación de métricas
+# Registra histogramas de latencia por etapa (captura, conversión de color,
+# FaceMesh, EAR/MAR, renderizado, Bluetooth), FPS efectivos, frames
+# descartados y la latencia de extremo a extremo (cierre de ojos → comando
+# enviado). Se exporta periódicamente como líneas JSON (.jsonl) o como un
+# fichero de texto estilo Prometheus (.prom) que se reescribe entero.
+#
+# valor() también se llama desde los hilos de Bluetooth: la creación de
+# etapas y la exportación comparten un cerrojo.
+#
+# Desactivada, crear_instrumentacion() devuelve un objeto nulo cuyos métodos
+# no hacen nada, así que puede quedarse siempre en el código de producción.
+
+import bisect
+import json
+import os
+import threading
+import time
+
+# Límites superiores de los buckets de los histogramas, en milisegundos
+BUCKETS_MS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, float("inf"))
+
+
+class Histograma:
+    """Histograma de latencias con buckets fijos (actualización O(1) sin memoria extra)"""
+
+    def __init__(self):
+        self.cuentas = [0] * len(BUCKETS_MS)
+        self.total = 0
+        self.suma_ms = 0.0
+        self.max_ms = 0.0
+
+    def agregar(self, ms):
+        self.cuentas[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+        self.total += 1
+        self.suma_ms += ms
+        if ms > self.max_ms:
+            self.max_ms = ms
+
+    def percentil(self, p):
+        """Estimar el percentil `p` (0-100) interpolando dentro del bucket que lo contiene"""
+        if not self.total:
+            return 0.0
+        objetivo = p / 100.0 * self.total
+        acumulado = 0
+        inferior = 0.0
+        for limite, cuenta in zip(BUCKETS_MS, self.cuentas):
+            if cuenta and acumulado + cuenta >= objetivo:
+                superior = min(limite, self.max_ms)
+                return inferior + (superior - inferior) * (objetivo - acumulado) / cuenta
+            acumulado += cuenta
+            inferior = limite
+        return self.max_ms
+
+    def resumen(self):
+        return {
+            "n": self.total,
+            "media_ms": self.suma_ms / self.total if self.total else 0.0,
+            "p50_ms": self.percentil(50),
+            "p95_ms": self.percentil(95),
+            "p99_ms": self.percentil(99),
+            "max_ms": self.max_ms,
+        }
+
+
+class Instrumentacion:
+    """Medición por etapa del bucle de detección"""
+
+    habilitada = True
+
+    def __init__(self, ruta, periodo=5.0):
+        self.ruta = ruta
+        self.periodo = periodo
+        self.prometheus = ruta.endswith(".prom")
+        self.etapas = {}
+        self._cerrojo = threading.Lock()
+        self.frames = 0
+        self.frames_descartados = 0
+        self._frames_periodo = 0
+        self._t_inicio = time.perf_counter()
+        self._t_export = self._t_inicio
+        self._t_ultimo_frame = None
+        self.fps = 0.0
+        self.contadores = {}
+        self.tasas = {}
+        self._contadores_previos = {}
+        if not self.prometheus:
+            # Las líneas JSON se añaden a un fichero nuevo en cada ejecución
+            open(ruta, "w").close()
+
+    def t(self):
+        """Instante actual (perf_counter) para empezar a medir una etapa"""
+        return time.perf_counter()
+
+    def registrar(self, etapa, t0):
+        """Anotar la duración de `etapa` desde t0; devuelve el instante actual para encadenar"""
+        ahora = time.perf_counter()
+        self.valor(etapa, ahora - t0)
+        return ahora
+
+    def valor(self, nombre, segundos):
+        """Anotar una latencia medida por otra vía (p. ej. cierre de ojos → comando)"""
+        with self._cerrojo:
+            histograma = self.etapas.get(nombre)
+            if histograma is None:
+                histograma = self.etapas[nombre] = Histograma()
+            histograma.agregar(segundos * 1000.0)
+
+    def contador(self, nombre, valor):
+        """Actualizar un contador acumulado (p. ej. reservas de buffers); se exporta con su tasa"""
+        self.contadores[nombre] = valor
+
+    def _actualizar_tasas(self, segundos):
+        for nombre, valor in self.contadores.items():
+            self.tasas[nombre] = (valor - self._contadores_previos.get(nombre, 0)) / segundos
+        self._contadores_previos = dict(self.contadores)
+
+    def fin_frame(self, frames_descartados=0):
+        """Cerrar un frame: periodo del bucle, contadores, FPS y exportación periódica"""
+        self.frames += 1
+        self._frames_periodo += 1
+        self.frames_descartados = frames_descartados
+        ahora = time.perf_counter()
+        if self._t_ultimo_frame is not None:
+            self.valor("frame", ahora - self._t_ultimo_frame)
+        self._t_ultimo_frame = ahora
+        if ahora - self._t_export >= self.periodo:
+            self.fps = self._frames_periodo / (ahora - self._t_export)
+            self._actualizar_tasas(ahora - self._t_export)
+            self._frames_periodo = 0
+            self._t_export = ahora
+            self.exportar()
+
+    def resumen(self):
+        with self._cerrojo:
+            etapas = {nombre: h.resumen() for nombre, h in self.etapas.items()}
+        return {
+            "t": time.time(),
+            "frames": self.frames,
+            "frames_descartados": self.frames_descartados,
+            "fps": self.fps,
+            "contadores": self.contadores,
+            "tasas_por_s": self.tasas,
+            "etapas": etapas,
+        }
+
+    def _texto_prometheus(self):
+        lineas = [
+            "# TYPE fatiga_frames_total counter",
+            f"fatiga_frames_total {self.frames}",
+            "# TYPE fatiga_frames_descartados_total counter",
+            f"fatiga_frames_descartados_total {self.frames_descartados}",
+            "# TYPE fatiga_fps gauge",
+            f"fatiga_fps {self.fps:.3f}",
+        ]
+        for nombre, valor in self.contadores.items():
+            lineas += [f"# TYPE fatiga_{nombre}_total counter", f"fatiga_{nombre}_total {valor}"]
+        lineas.append("# TYPE fatiga_etapa_ms histogram")
+        with self._cerrojo:
+            etapas = [(nombre, list(h.cuentas), h.suma_ms, h.total) for nombre, h in self.etapas.items()]
+        for nombre, cuentas, suma_ms, total in etapas:
+            acumulado = 0
+            for limite, cuenta in zip(BUCKETS_MS, cuentas):
+                acumulado += cuenta
+                le = "+Inf" if limite == float("inf") else f"{limite:g}"
+                lineas.append(f'fatiga_etapa_ms_bucket{{etapa="{nombre}",le="{le}"}} {acumulado}')
+            lineas.append(f'fatiga_etapa_ms_sum{{etapa="{nombre}"}} {suma_ms:.6f}')
+            lineas.append(f'fatiga_etapa_ms_count{{etapa="{nombre}"}} {total}')
+        return "\n".join(lineas) + "\n"
+
+    def exportar(self):
+        """Escribir el estado actual (línea JSON añadida o fichero .prom reescrito)"""
+        if self.prometheus:
+            temporal = self.ruta + ".tmp"
+            with open(temporal, "w") as f:
+                f.write(self._texto_prometheus())
+            os.replace(temporal, self.ruta)
+        else:
+            with open(self.ruta, "a") as f:
+                f.write(json.dumps(self.resumen()) + "\n")
+
+    def cerrar(self):
+        """Exportación final al terminar el programa"""
+        ahora = time.perf_counter()
+        if ahora > self._t_export and self._frames_periodo:
+            self.fps = self._frames_periodo / (ahora - self._t_export)
+            self._actualizar_tasas(ahora - self._t_export)
+        self.exportar()
+
+
+class InstrumentacionNula:
+    """Instrumentación desactivada: todos los métodos son no-ops"""
+
+    habilitada = False
+
+    def t(self):
+        return 0.0
+
+    def registrar(self, etapa, t0):
+        return 0.0
+
+    def valor(self, nombre, segundos):
+        pass
+
+    def contador(self, nombre, valor):
+        pass
+
+    def fin_frame(self, frames_descartados=0):
+        pass
+
+    def cerrar(self):
+        pass
+
+
+def crear_instrumentacion(ruta=None, periodo=5.0):
+    """Instrumentación real si se da una ruta de exportación, si no el objeto nulo"""
+    if ruta:
+        return Instrumentacion(ruta, periodo)
+    return InstrumentacionNula()
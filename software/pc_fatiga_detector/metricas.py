@@ -0,0 +1,95 @@
+# metricas.py - Motor vectorizado de métricas EAR/MAR
+# Extrae solo los 20 puntos de ojos y boca una vez por frame y calcula
+# EAR (por ojo y promedio) y MAR en una única pasada de NumPy.
+
+import numpy as np
+
+# Puntos faciales para EAR (Eye Aspect Ratio)
+P_OJO_IZQUIERDO = [385, 380, 387, 373, 362, 263]
+P_OJO_DERECHO = [160, 144, 158, 153, 33, 133]
+P_OJOS = P_OJO_IZQUIERDO + P_OJO_DERECHO
+
+# Puntos faciales para MAR (Mouth Aspect Ratio)
+P_BOCA = [82, 87, 13, 14, 312, 317, 78, 308]
+
+# Orden de los 20 puntos en el buffer: ojo izquierdo, ojo derecho, boca
+INDICES = P_OJOS + P_BOCA
+N_PUNTOS = len(INDICES)
+
+# Pares de puntos (posiciones dentro del buffer) cuyas distancias se usan:
+# ojo izq (vert, vert, horiz), ojo der (vert, vert, horiz),
+# boca (vert, vert, vert, horiz)
+_PARES_A = np.array([0, 2, 4, 6, 8, 10, 12, 14, 16, 18])
+_PARES_B = np.array([1, 3, 5, 7, 9, 11, 13, 15, 17, 19])
+
+# Columnas del resultado de MotorMetricas.calcular()
+COL_EAR_IZQ = 0
+COL_EAR_DER = 1
+COL_EAR = 2
+COL_MAR = 3
+
+
+class MotorMetricas:
+    """Calcular EAR y MAR de una o varias caras con buffers preasignados"""
+
+    def __init__(self, max_caras=1):
+        self.max_caras = max_caras
+        self.puntos = np.zeros((max_caras, N_PUNTOS, 2), dtype=np.float64)
+        self._diff = np.zeros((max_caras, len(_PARES_A), 2), dtype=np.float64)
+        self._dist = np.zeros((max_caras, len(_PARES_A)), dtype=np.float64)
+        self._resultado = np.zeros((max_caras, 4), dtype=np.float64)
+
+    def extraer(self, landmarks, cara=0):
+        """Copiar los 20 puntos de interés de los landmarks de MediaPipe al buffer"""
+        buf = self.puntos[cara]
+        for j, i in enumerate(INDICES):
+            punto = landmarks[i]
+            buf[j, 0] = punto.x
+            buf[j, 1] = punto.y
+        return buf
+
+    def extraer_caras(self, lista_caras):
+        """Copiar los puntos de varias caras (multi_face_landmarks); devuelve cuántas"""
+        n = min(len(lista_caras), self.max_caras)
+        for cara in range(n):
+            self.extraer(lista_caras[cara].landmark, cara)
+        return n
+
+    def calcular(self, puntos=None, n_caras=None):
+        """Calcular EAR izq/der/promedio y MAR para un lote (caras, 20, 2)
+
+        Sin argumentos usa el buffer interno. Devuelve un array
+        (caras, 4) con columnas COL_EAR_IZQ, COL_EAR_DER, COL_EAR, COL_MAR.
+        """
+        if puntos is None:
+            n = self.max_caras if n_caras is None else n_caras
+            puntos = self.puntos[:n]
+        else:
+            puntos = np.asarray(puntos, dtype=np.float64)
+            if puntos.ndim == 2:
+                puntos = puntos[np.newaxis]
+
+        n = puntos.shape[0]
+        if n <= self.max_caras:
+            diff = self._diff[:n]
+            dist = self._dist[:n]
+            res = self._resultado[:n]
+        else:
+            # Lotes grandes (p. ej. replays offline): arrays propios
+            diff = np.empty((n, len(_PARES_A), 2))
+            dist = np.empty((n, len(_PARES_A)))
+            res = np.empty((n, 4))
+
+        # Distancias euclídeas de los 10 pares en una sola pasada
+        np.subtract(puntos[:, _PARES_A], puntos[:, _PARES_B], out=diff)
+        np.hypot(diff[..., 0], diff[..., 1], out=dist)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            res[:, COL_EAR_IZQ] = (dist[:, 0] + dist[:, 1]) / (2.0 * dist[:, 2])
+            res[:, COL_EAR_DER] = (dist[:, 3] + dist[:, 4]) / (2.0 * dist[:, 5])
+            res[:, COL_MAR] = (dist[:, 6] + dist[:, 7] + dist[:, 8]) / (2.0 * dist[:, 9])
+
+        # En caso de puntos degenerados, valores por defecto (como antes: 0.0)
+        res[~np.isfinite(res)] = 0.0
+        res[:, COL_EAR] = (res[:, COL_EAR_IZQ] + res[:, COL_EAR_DER]) / 2.0
+        return res
@@ -0,0 +1,144 @@
+# presencia.py - Puerta barata de presencia de cara delante de FaceMesh
+# Con el asiento vacío o el conductor girado, ejecutar FaceMesh en cada frame
+# solo confirma que no hay nadie. Tras `tiempo_ausencia` segundos sin cara el
+# sistema pasa a modo espera y, en lugar de FaceMesh por frame, sondea a baja
+# frecuencia (`periodo_sondeo`) con etapas de coste creciente:
+#   1. Miniatura en gris (~160 px) comparada con la de la última evaluación:
+#      si la escena no ha cambiado (asiento vacío quieto) no se hace nada más.
+#   2. Clasificador Haar de caras frontales sobre la miniatura.
+#   3. FaceMesh solo si el clasificador ve una cara o, como red de seguridad
+#      para caras que Haar no detecta, cada `periodo_facemesh` segundos.
+# Cuando FaceMesh vuelve a encontrar la cara se sale del modo espera. Si la
+# instalación de OpenCV no incluye los clasificadores Haar, el cambio de la
+# escena pasa directamente a FaceMesh.
+
+import os
+
+import cv2
+import numpy as np
+
+from buffers import PoolBuffers
+from instrumentacion import InstrumentacionNula
+
+CLASIFICADOR_CARAS = "haarcascade_frontalface_default.xml"
+
+
+def cargar_clasificador():
+    """Clasificador Haar de caras frontales de OpenCV, o None si no está instalado"""
+    datos = getattr(cv2, "data", None)
+    ruta = os.path.join(datos.haarcascades, CLASIFICADOR_CARAS) if datos is not None else ""
+    if not os.path.isfile(ruta):
+        return None
+    clasificador = cv2.CascadeClassifier(ruta)
+    return None if clasificador.empty() else clasificador
+
+
+class DetectorPresencia:
+    """Decide frame a frame si se ejecuta FaceMesh; sondea a baja frecuencia sin conductor"""
+
+    def __init__(self, periodo_sondeo=0.5, periodo_facemesh=2.0, tiempo_ausencia=1.0,
+                 umbral_cambio=3.0, ancho=160, instrumentacion=None):
+        self.periodo_sondeo = periodo_sondeo        # Segundos entre sondeos en modo espera
+        self.periodo_facemesh = periodo_facemesh    # FaceMesh como mínimo cada tantos segundos
+        self.tiempo_ausencia = tiempo_ausencia      # Segundos sin cara antes de pasar a espera
+        self.umbral_cambio = umbral_cambio          # Diferencia media (niveles de gris) de la miniatura
+        self.ancho = ancho
+        self.instr = instrumentacion or InstrumentacionNula()
+        self.clasificador = cargar_clasificador()
+        if self.clasificador is None:
+            print("[ADVERTENCIA] Clasificador Haar no disponible: la espera sin conductor "
+                  "solo vigila cambios en la imagen")
+        self.pool = PoolBuffers()
+
+        # Estado
+        self.ausente = False
+        self.cambio = False                 # True en el frame en que se entra o sale de la espera
+        self.duracion_ausencia = 0.0        # Duración de la última espera (al salir de ella)
+        self._t_sin_cara = None             # Primer FaceMesh sin cara de la racha actual
+        self._t_ausente = None
+        self._t_sondeo = None
+        self._t_facemesh = None
+        self._hay_referencia = False        # Miniatura de la última evaluación (etapas 2 o 3)
+
+        self.ausencias = 0
+        self.frames_en_espera = 0
+        self.sondeos = 0
+        self.clasificaciones = 0
+        self.detecciones = 0
+        self.facemesh_en_espera = 0
+
+    def decidir(self, frame, t):
+        """True si hay que ejecutar FaceMesh en este frame (siempre, salvo en modo espera)"""
+        self.cambio = False
+        if not self.ausente:
+            return True
+        if t - self._t_sondeo < self.periodo_sondeo:
+            self.frames_en_espera += 1
+            return False
+        self._t_sondeo = t
+        self.sondeos += 1
+
+        t0 = self.instr.t()
+        alto, ancho = frame.shape[:2]
+        reducida = self.pool.redimensionar("reducida", frame, self.ancho,
+                                           max(round(alto * self.ancho / ancho), 1))
+        gris = self.pool.convertir("gris", reducida, cv2.COLOR_BGR2GRAY, canales=1)
+        referencia = self.pool.buffer("referencia", gris.shape)
+        diferencia = self.pool.buffer("diferencia", gris.shape)
+        cambiada = (not self._hay_referencia
+                    or cv2.mean(cv2.absdiff(gris, referencia, dst=diferencia))[0] >= self.umbral_cambio)
+
+        ejecutar = t - self._t_facemesh >= self.periodo_facemesh
+        if cambiada:
+            np.copyto(referencia, gris)
+            self._hay_referencia = True
+            if self.clasificador is None:
+                ejecutar = True
+            else:
+                self.clasificaciones += 1
+                ecualizada = cv2.equalizeHist(gris, dst=self.pool.buffer("ecualizada", gris.shape))
+                if len(self.clasificador.detectMultiScale(ecualizada, 1.2, 3, minSize=(20, 20))):
+                    self.detecciones += 1
+                    ejecutar = True
+        self.instr.registrar("presencia", t0)
+
+        if ejecutar:
+            self.facemesh_en_espera += 1
+        else:
+            self.frames_en_espera += 1
+        return ejecutar
+
+    def resultado(self, hay_cara, t):
+        """Comunicar si FaceMesh encontró la cara; entra o sale del modo espera"""
+        self._t_facemesh = t
+        if hay_cara:
+            if self.ausente:
+                self.ausente = False
+                self.cambio = True
+                self.duracion_ausencia = t - self._t_ausente
+            self._t_sin_cara = None
+            return
+        if self._t_sin_cara is None:
+            self._t_sin_cara = t
+        if not self.ausente and t - self._t_sin_cara >= self.tiempo_ausencia:
+            self.ausente = True
+            self.cambio = True
+            self.ausencias += 1
+            self._t_ausente = self._t_sin_cara
+            self._t_sondeo = t
+            self._hay_referencia = False
+
+    def espera(self, t):
+        """Segundos hasta el próximo sondeo (0 fuera del modo espera), para dormir con cámara real"""
+        if not self.ausente:
+            return 0.0
+        return max(self._t_sondeo + self.periodo_sondeo - t, 0.0)
+
+    def resumen(self):
+        """Texto con los periodos sin conductor y el trabajo ahorrado"""
+        texto = (f"Presencia: {self.ausencias} periodos sin conductor, "
+                 f"{self.frames_en_espera} frames sin FaceMesh en espera, {self.sondeos} sondeos, "
+                 f"{self.facemesh_en_espera} FaceMesh durante la espera")
+        if self.clasificador is not None:
+            texto += f", cara vista por Haar en {self.detecciones}/{self.clasificaciones} clasificaciones"
+        return texto
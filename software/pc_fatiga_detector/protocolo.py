@@ -0,0 +1,201 @@
+# protocolo.py - Tramas binarias detector ↔ vehículo con confirmación (ACK)
+# Sustituye los caracteres ASCII sueltos ('p') por tramas de 10 bytes:
+#
+#   0     1        2     3-4        5-8            9
+#   0xA5  comando  dato  seq (u16)  t_us (u32)     CRC-8 (bytes 1..8)
+#
+# Enteros en little-endian. `comando`: 'p' parar, 'c' continuar y, del
+# vehículo al PC, 'a' confirmación. `t_us` es la marca de tiempo del emisor
+# en microsegundos (módulo 2^32). La confirmación devuelve el seq y la t_us
+# de la trama recibida (eco) y en `dato` el estado del vehículo (bit 0:
+# parado por Bluetooth, bit 1: obstáculo a menos de 20 cm), de modo que el
+# PC mide la ida y vuelta sin sincronizar relojes. El firmware
+# (pico_vehicle_control/src/main.c) envía la confirmación después de actuar
+# sobre los motores. Una trama con CRC incorrecto se descarta y se vuelve a
+# buscar un 0xA5 a partir de su segundo byte (por si se perdió un byte y la
+# siguiente trama empieza dentro de ella); fuera de una trama, el firmware
+# sigue aceptando el 'p' ASCII del protocolo anterior.
+
+import struct
+import threading
+import time
+from collections import deque, namedtuple
+
+import numpy as np
+
+INICIO = 0xA5
+TAMANO_TRAMA = 10
+FORMATO_TRAMA = "<BBBHI"        # inicio, comando, dato, seq, t_us (sin el CRC)
+
+PARAR = ord("p")
+CONTINUAR = ord("c")
+CONFIRMACION = ord("a")
+
+ESTADO_PARADO = 0x01
+ESTADO_OBSTACULO = 0x02
+
+# Estados de los motores del vehículo (vMotorControlTask en main.c)
+FRENTE = "frente"
+RE = "re"
+GIRO_DERECHA = "giro_derecha"
+PARADO = "parado"
+
+PROTOCOLO_TRAMAS = "tramas"
+PROTOCOLO_ASCII = "ascii"
+
+Trama = namedtuple("Trama", ["comando", "dato", "seq", "t_us"])
+
+
+def _tabla_crc8(polinomio=0x07):
+    tabla = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = ((crc << 1) ^ polinomio) & 0xFF if crc & 0x80 else (crc << 1) & 0xFF
+        tabla.append(crc)
+    return bytes(tabla)
+
+
+_TABLA_CRC8 = _tabla_crc8()
+
+
+def crc8(datos):
+    """CRC-8 (polinomio 0x07, valor inicial 0), el mismo que calcula el firmware"""
+    crc = 0
+    for byte in datos:
+        crc = _TABLA_CRC8[crc ^ byte]
+    return crc
+
+
+def reloj_us():
+    """Marca de tiempo local en µs para el campo t_us (módulo 2^32)"""
+    return time.perf_counter_ns() // 1000 & 0xFFFFFFFF
+
+
+def codificar(comando, seq, t_us, dato=0):
+    """Trama de 10 bytes; `comando` es el byte (PARAR, CONTINUAR, CONFIRMACION) o su carácter"""
+    if isinstance(comando, str):
+        comando = ord(comando)
+    cuerpo = struct.pack(FORMATO_TRAMA, INICIO, comando, dato, seq & 0xFFFF, t_us & 0xFFFFFFFF)
+    return cuerpo + bytes((crc8(cuerpo[1:]),))
+
+
+class DecodificadorTramas:
+    """Reconstruye tramas a partir de bytes sueltos (mismo autómata que el firmware)
+
+    Con `legado`, un 'p' fuera de una trama se entrega como Trama(PARAR, 0,
+    None, None), como hace el firmware con el protocolo ASCII anterior.
+    """
+
+    def __init__(self, legado=False):
+        self.legado = legado
+        self._trama = bytearray()
+        self.tramas = 0
+        self.errores_crc = 0
+        self.ignorados = 0          # Bytes fuera de trama que no son '\n', '\r' ni un 'p' aceptado
+
+    def alimentar(self, datos):
+        """Procesar bytes recibidos; devuelve la lista de tramas completas y válidas"""
+        tramas = []
+        for byte in datos:
+            if not self._trama:
+                if byte == INICIO:
+                    self._trama.append(byte)
+                elif self.legado and byte == PARAR:
+                    tramas.append(Trama(PARAR, 0, None, None))
+                elif byte not in b"\r\n":
+                    self.ignorados += 1
+                continue
+            self._trama.append(byte)
+            if len(self._trama) < TAMANO_TRAMA:
+                continue
+            trama = bytes(self._trama)
+            self._trama.clear()
+            if crc8(trama[1:-1]) != trama[-1]:
+                self.errores_crc += 1
+                # Si se perdió un byte, la trama siguiente empieza dentro de esta
+                inicio = trama.find(INICIO, 1)
+                if inicio > 0:
+                    tramas.extend(self.alimentar(trama[inicio:]))
+                continue
+            _, comando, dato, seq, t_us = struct.unpack_from(FORMATO_TRAMA, trama)
+            self.tramas += 1
+            tramas.append(Trama(comando, dato, seq, t_us))
+        return tramas
+
+
+class SeguimientoConfirmaciones:
+    """Números de secuencia, tiempo de ida y vuelta y pérdidas de las tramas enviadas
+
+    Lo usan a la vez el hilo (o tarea) que escribe y el que lee las
+    confirmaciones, así que todo pasa por un cerrojo.
+    """
+
+    def __init__(self, timeout=1.0, muestras=1024):
+        self.timeout = timeout
+        self._cerrojo = threading.Lock()
+        self._seq = 0
+        self._pendientes = {}           # seq → instante de envío (time.monotonic)
+        self._ida_vuelta = deque(maxlen=muestras)
+        self.enviadas = 0
+        self.confirmadas = 0
+        self.perdidas = 0               # Sin confirmación tras `timeout` segundos
+        self.duplicadas = 0             # Confirmaciones de tramas ya confirmadas o vencidas
+        self.estado_vehiculo = None     # `dato` de la última confirmación
+
+    def siguiente(self):
+        """Número de secuencia para la próxima trama"""
+        with self._cerrojo:
+            self._seq = (self._seq + 1) & 0xFFFF
+            return self._seq
+
+    def enviada(self, seq):
+        with self._cerrojo:
+            self._pendientes[seq] = time.monotonic()
+            self.enviadas += 1
+
+    def confirmada(self, trama):
+        """Registrar una confirmación; devuelve la ida y vuelta (s) o None si no estaba pendiente"""
+        ida_vuelta = ((reloj_us() - trama.t_us) & 0xFFFFFFFF) / 1e6
+        with self._cerrojo:
+            self.estado_vehiculo = trama.dato
+            if self._pendientes.pop(trama.seq, None) is None:
+                self.duplicadas += 1
+                return None
+            self.confirmadas += 1
+            self._ida_vuelta.append(ida_vuelta)
+            return ida_vuelta
+
+    def vencer(self):
+        """Dar por perdidas las tramas sin confirmación tras `timeout` segundos"""
+        limite = time.monotonic() - self.timeout
+        with self._cerrojo:
+            vencidas = [seq for seq, t in self._pendientes.items() if t < limite]
+            for seq in vencidas:
+                del self._pendientes[seq]
+            self.perdidas += len(vencidas)
+            return len(vencidas)
+
+    def estadisticas(self):
+        """Tramas enviadas, confirmadas y perdidas, e ida y vuelta media, p95 y máxima (ms)"""
+        self.vencer()
+        with self._cerrojo:
+            muestras = np.array(self._ida_vuelta) * 1000.0
+            return {
+                "tramas_enviadas": self.enviadas,
+                "tramas_confirmadas": self.confirmadas,
+                "tramas_perdidas": self.perdidas,
+                "tramas_pendientes": len(self._pendientes),
+                "ida_vuelta_media_ms": float(muestras.mean()) if len(muestras) else 0.0,
+                "ida_vuelta_p95_ms": float(np.percentile(muestras, 95)) if len(muestras) else 0.0,
+                "ida_vuelta_max_ms": float(muestras.max()) if len(muestras) else 0.0,
+                "estado_vehiculo": self.estado_vehiculo,
+            }
+
+
+def resumen_confirmaciones(estadisticas):
+    """Línea de resumen a partir de las estadísticas de un despachador con tramas"""
+    return (f"Confirmaciones: {estadisticas['tramas_confirmadas']}/{estadisticas['tramas_enviadas']} tramas, "
+            f"{estadisticas['tramas_perdidas']} perdidas, ida y vuelta media "
+            f"{estadisticas['ida_vuelta_media_ms']:.1f} ms (p95 {estadisticas['ida_vuelta_p95_ms']:.1f} ms, "
+            f"máx {estadisticas['ida_vuelta_max_ms']:.1f} ms)")
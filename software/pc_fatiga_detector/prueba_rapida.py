@@ -1,9 +1,21 @@
 # detector_fatiga_ear_mar.py - Versión para prueba del profesor
-import cv2
+import argparse
 import mediapipe as mp
-import numpy as np
 import time
 
+from adaptacion import crear_adaptacion
+from calibracion import cargar_config
+from captura import crear_captura
+from control import CanalControl
+from estado_fatiga import MaquinaEstadoFatiga, MODO_PRUEBA_RAPIDA
+from fuentes import abrir_fuente, RelojReal
+from instrumentacion import crear_instrumentacion
+from metricas import MotorMetricas, COL_EAR, COL_MAR
+from presencia import DetectorPresencia
+from publicacion import crear_publicador
+from registro import crear_grabador
+from seguimiento import InferenciaEspaciada
+
 print("=" * 70)
 print("DETECTOR DE FATIGA - ALGORITMO EAR + MAR")
 print("=" * 70)
@@ -13,84 +25,78 @@ print("✓ Ignora falsos positivos: risas, bostezos (boca abierta)")
 print("✓ Protocolo de seguridad con timeout")
 print("=" * 70)
 
-# Inicializar MediaPipe
-mp_drawing = mp.solutions.drawing_utils
+# Inicializar MediaPipe (el dibujo vive en visualizacion.py)
 mp_face_mesh = mp.solutions.face_mesh
 
-# Puntos para EAR (Eye Aspect Ratio) - alrededor de los ojos
-PUNTOS_OJO_IZQUIERDO = [385, 380, 387, 373, 362, 263]
-PUNTOS_OJO_DERECHO = [160, 144, 158, 153, 33, 133]
-PUNTOS_OJOS = PUNTOS_OJO_IZQUIERDO + PUNTOS_OJO_DERECHO
-
-# Puntos para MAR (Mouth Aspect Ratio) - alrededor de la boca
-PUNTOS_BOCA = [82, 87, 13, 14, 312, 317, 78, 308]
-
-def calcular_ear(landmarks_face, puntos_ojo_der, puntos_ojo_izq):
-    """Calcular Eye Aspect Ratio (EAR) - Relación de Aspecto del Ojo"""
-    try:
-        # Convertir landmarks a coordenadas 2D
-        face_array = np.array([[coord.x, coord.y] for coord in landmarks_face])
-        
-        # Coordenadas ojo izquierdo
-        ojo_izq = face_array[puntos_ojo_izq, :]
-        ear_izq = (np.linalg.norm(ojo_izq[0] - ojo_izq[1]) + 
-                  np.linalg.norm(ojo_izq[2] - ojo_izq[3])) / (2.0 * np.linalg.norm(ojo_izq[4] - ojo_izq[5]))
-        
-        # Coordenadas ojo derecho
-        ojo_der = face_array[puntos_ojo_der, :]
-        ear_der = (np.linalg.norm(ojo_der[0] - ojo_der[1]) + 
-                  np.linalg.norm(ojo_der[2] - ojo_der[3])) / (2.0 * np.linalg.norm(ojo_der[4] - ojo_der[5]))
-        
-        # EAR promedio de ambos ojos
-        ear_promedio = (ear_izq + ear_der) / 2.0
-        
-    except Exception as e:
-        # En caso de error, retornar valores por defecto
-        ear_izq = 0.0
-        ear_der = 0.0
-        ear_promedio = 0.0
-    
-    return ear_promedio
-
-def calcular_mar(landmarks_face, puntos_boca):
-    """Calcular Mouth Aspect Ratio (MAR) - Relación de Aspecto de la Boca"""
-    try:
-        face_array = np.array([[coord.x, coord.y] for coord in landmarks_face])
-        boca = face_array[puntos_boca, :]
-        
-        # Cálculo MAR: (suma distancias verticales) / (2 * distancia horizontal)
-        mar = (np.linalg.norm(boca[0] - boca[1]) + 
-               np.linalg.norm(boca[2] - boca[3]) + 
-               np.linalg.norm(boca[4] - boca[5])) / (2.0 * np.linalg.norm(boca[6] - boca[7]))
-    except:
-        mar = 0.0
-    
-    return mar
-
-def main():
+def main(fuente_video="0", tiempo_real=False, headless=False, ruta_metricas=None, periodo_metricas=5.0,
+         intervalo_max=1, roi=False, presupuesto_ms=15.0, presencia=False, sondeo_ausente=0.5,
+         ruta_registro=None, ruta_config=None, conductor=None, directorio_perfiles="perfiles",
+         nombre_publicacion=None):
     print("\n[INSTRUCCIONES PARA EL PROFESOR]")
     print("1. MIRE NORMALMENTE para ver sus valores EAR/MAR base")
     print("2. CIERRE OJOS + BOCA NEUTRA > 1.5s → Alerta ROJA (fatiga)")
     print("3. CIERRE OJOS + BOCA ABIERTA (sonrisa) → NO alerta (EAR+MAR funcionando)")
     print("4. Presione 'q' para salir, 'r' para resetear contadores")
+    if headless:
+        print("   (modo headless: escriba la tecla + Enter en la consola)")
     print("-" * 60)
     
     # PARÁMETROS AJUSTABLES (el profesor puede calibrarlos)
     EAR_UMBRAL = 0.25      # Si EAR < 0.25 → ojo cerrado (ajustar según persona)
     MAR_UMBRAL = 0.2       # Si MAR > 0.2 → boca abierta (ajustar según persona)
     TIEMPO_ALERTA = 1.5    # segundos para activar alerta de fatiga
+    if ruta_config:
+        # Umbrales recomendados por calibracion.py para este despliegue
+        EAR_UMBRAL, MAR_UMBRAL, TIEMPO_ALERTA = cargar_config(ruta_config)
+        print(f"[INFO] Configuración {ruta_config}: EAR < {EAR_UMBRAL}, MAR >= {MAR_UMBRAL}, "
+              f"alerta tras {TIEMPO_ALERTA}s")
+    
+    # Estado: cierre ocular y contador de detecciones
+    maquina = MaquinaEstadoFatiga(EAR_UMBRAL, MAR_UMBRAL, TIEMPO_ALERTA, modo=MODO_PRUEBA_RAPIDA)
+    
+    # Umbrales adaptados a la línea base del conductor (fijos si no se indica)
+    adaptacion = crear_adaptacion(conductor, directorio_perfiles)
     
-    # Variables de estado
-    estado_fatiga = False          # 0 = despierto, 1 = posible fatiga
-    tiempo_inicio_fatiga = None    # Cuándo empezó el cierre ocular
-    contador_pestaneos = 0         # Contador de detecciones
+    # Motor de métricas EAR/MAR (buffers preasignados)
+    motor_metricas = MotorMetricas(max_caras=1)
     
-    # Iniciar captura de video
-    cap = cv2.VideoCapture(0)
-    if not cap.isOpened():
+    # Iniciar captura de video (webcam, video, imágenes o registro de landmarks)
+    fuente = abrir_fuente(fuente_video, tiempo_real=tiempo_real)
+    if not fuente.isOpened():
         print("[ERROR] No se puede acceder a la cámara")
         return
     
+    # Hilo de captura: el bucle siempre procesa el frame más reciente
+    # (las reproducciones a máxima velocidad se leen frame a frame)
+    captura = crear_captura(fuente, parar_si_falla=True)
+    reloj_real = isinstance(captura.reloj, RelojReal)
+    
+    # Instrumentación por etapa (objeto nulo sin coste si no se pide)
+    instr = crear_instrumentacion(ruta_metricas, periodo_metricas)
+    if instr.habilitada:
+        print(f"[INFO] Exportando métricas de rendimiento a {ruta_metricas}")
+    
+    # Grabación binaria por frame (objeto nulo sin coste si no se pide)
+    grabador = crear_grabador(ruta_registro)
+    if grabador.habilitado:
+        print(f"[INFO] Grabando registro binario en {ruta_registro}")
+    
+    # Publicación por frame para otros procesos (objeto nulo si no se pide)
+    publicador = crear_publicador(nombre_publicacion)
+    if publicador.habilitado:
+        print(f"[INFO] Publicando métricas en memoria compartida '{nombre_publicacion}'")
+    
+    # Canal de control no bloqueante; en modo headless no se importa ni se
+    # llama a ningún código de ventana o dibujo
+    canal = CanalControl()
+    if headless:
+        visualizacion = None
+        canal.escuchar_stdin()
+    else:
+        import visualizacion
+        overlay = visualizacion.RenderizadorPruebaRapida()
+    salir = False
+    
     # Configurar FaceMesh
     with mp_face_mesh.FaceMesh(
         min_detection_confidence=0.5,
@@ -98,157 +104,152 @@ def main():
         max_num_faces=1
     ) as facemesh:
         
-        while cap.isOpened():
-            exito, frame = cap.read()
-            if not exito:
-                print("[INFO] Error en la captura de video")
-                break
-            
-            alto, ancho = frame.shape[:2]
+        # FaceMesh cada N frames (adaptativo) con seguimiento óptico entre medias
+        # y, con roi, sobre un recorte de la cara de tamaño adaptativo; con
+        # presencia, sin conductor solo se sondea cada sondeo_ausente segundos
+        puerta = DetectorPresencia(sondeo_ausente, instrumentacion=instr) if presencia else None
+        inferencia = InferenciaEspaciada(facemesh, motor_metricas, intervalo_max=intervalo_max,
+                                         instrumentacion=instr, roi=roi,
+                                         presupuesto_ms=presupuesto_ms, presencia=puerta)
+        
+        t_inicio_bucle = time.perf_counter()
+        while captura.activa:
+            t_etapa = instr.t()
+            frame_capturado = captura.leer()
+            if frame_capturado is None:
+                if not captura.activa:
+                    print("[INFO] Fin de la captura de video")
+                    break
+                continue
+            t_etapa = instr.registrar("captura", t_etapa)
             
-            # Procesar frame para detección facial
-            frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            resultados = facemesh.process(frame_rgb)
-            frame = cv2.cvtColor(frame_rgb, cv2.COLOR_RGB2BGR)
+            if frame_capturado.puntos is not None:
+                # Registro de landmarks: sin imagen ni FaceMesh
+                frame = None if headless else inferencia.pool.lienzo("lienzo", (480, 640, 3))
+                puntos_cara = frame_capturado.puntos
+                metricas = motor_metricas.calcular(puntos_cara)
+                n_caras = 1
+            else:
+                frame = frame_capturado.imagen
+                
+                # Procesar frame para detección facial (FaceMesh o seguimiento
+                # óptico de los 20 puntos)
+                n_caras, _ = inferencia.procesar(frame, frame_capturado.t_captura)
+                puntos_cara = motor_metricas.puntos[0]
+                t_etapa = instr.t()
+                if puerta is not None and puerta.cambio:
+                    if puerta.ausente:
+                        print(f"[INFO] Rostro no detectado: modo espera, sondeo cada {sondeo_ausente:.1f}s")
+                    else:
+                        print(f"[INFO] Rostro detectado de nuevo tras {puerta.duracion_ausencia:.1f}s en espera")
+                
+                # EAR y MAR de todas las caras en una sola llamada
+                metricas = motor_metricas.calcular(n_caras=n_caras)
+            t_etapa = instr.registrar("metricas", t_etapa)
             
-            # Panel informativo (fondo gris)
-            cv2.rectangle(frame, (0, 0), (450, 180), (50, 50, 50), -1)
+            # LÓGICA DE DETECCIÓN (ALGORITMO EAR+MAR)
+            tiempo_actual = frame_capturado.t_captura
+            caras = []
+            for i_cara in range(n_caras):
+                ear = metricas[i_cara, COL_EAR]
+                mar = metricas[i_cara, COL_MAR]
+                
+                # Condiciones: fatiga (ojos cerrados + boca neutra/cerrada),
+                # risa o bostezo (ojos cerrados PERO boca abierta) o despierto
+                adaptacion.actualizar(tiempo_actual, ear, mar, maquina)
+                alerta = maquina.actualizar(tiempo_actual, ear, mar)
+                inferencia.registrar_ear(ear, maquina.ear_umbral)
+                tiempo_fatiga = maquina.tiempo_cierre
+                
+                # Si lleva más de 1.5 segundos con ojos cerrados: mensaje en
+                # consola (solo primera vez)
+                if alerta and tiempo_fatiga < TIEMPO_ALERTA + 0.1:
+                    print(f"[ALERTA] Fatiga detectada! EAR={ear:.3f}, MAR={mar:.3f}, Tiempo={tiempo_fatiga:.1f}s")
+                if maquina.fin_cierre is not None:
+                    # Operador acaba de abrir los ojos
+                    print(f"[INFO] Operador despierto. Fatiga duró: {maquina.fin_cierre:.1f}s")
+                
+                caras.append((ear, mar, maquina.condicion, tiempo_fatiga))
+            t_etapa = instr.registrar("estado", t_etapa)
             
-            if resultados.multi_face_landmarks:
-                for landmarks_cara in resultados.multi_face_landmarks:
-                    # Dibujar landmarks faciales (opcional, puede comentarse)
-                    # mp_drawing.draw_landmarks(
-                    #     frame, landmarks_cara, mp_face_mesh.FACEMESH_CONTOURS,
-                    #     landmark_drawing_spec=mp_drawing.DrawingSpec(color=(255, 102, 102), thickness=1),
-                    #     connection_drawing_spec=mp_drawing.DrawingSpec(color=(102, 204, 0), thickness=1)
-                    # )
-                    
-                    # Calcular EAR y MAR
-                    ear = calcular_ear(landmarks_cara.landmark, PUNTOS_OJO_DERECHO, PUNTOS_OJO_IZQUIERDO)
-                    mar = calcular_mar(landmarks_cara.landmark, PUNTOS_BOCA)
-                    
-                    # Mostrar métricas en pantalla
-                    color_ear = (0, 255, 0) if ear >= EAR_UMBRAL else (0, 0, 255)  # Verde si abierto, rojo si cerrado
-                    color_mar = (255, 165, 0) if mar >= MAR_UMBRAL else (0, 255, 0) # Naranja si abierta, verde si cerrada
-                    
-                    cv2.putText(frame, f"EAR: {ear:.3f}", (10, 30),
-                                cv2.FONT_HERSHEY_SIMPLEX, 0.8, color_ear, 2)
-                    cv2.putText(frame, f"MAR: {mar:.3f}", (10, 65),
-                                cv2.FONT_HERSHEY_SIMPLEX, 0.8, color_mar, 2)
-                    
-                    # Mostrar umbrales actuales
-                    cv2.putText(frame, f"Umbral EAR: {EAR_UMBRAL}", (10, 100),
-                                cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
-                    cv2.putText(frame, f"Umbral MAR: {MAR_UMBRAL}", (10, 125),
-                                cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
-                    
-                    # LÓGICA DE DETECCIÓN (ALGORITMO EAR+MAR)
-                    tiempo_actual = time.time()
-                    
-                    # CONDICIÓN 1: Posible fatiga (ojos cerrados + boca neutra/cerrada)
-                    if ear < EAR_UMBRAL and mar < MAR_UMBRAL:
-                        if not estado_fatiga:
-                            tiempo_inicio_fatiga = tiempo_actual
-                            estado_fatiga = True
-                        
-                        tiempo_fatiga = tiempo_actual - tiempo_inicio_fatiga
-                        
-                        # Si lleva más de 1.5 segundos con ojos cerrados
-                        if tiempo_fatiga >= TIEMPO_ALERTA:
-                            # ALERTA DE FATIGA
-                            cv2.rectangle(frame, (0, alto-80), (ancho, alto), (0, 0, 255), -1)
-                            cv2.putText(frame, "VEHICULO SE DETENDRIA AQUI - FATIGA DETECTADA", 
-                                       (ancho//6, alto-30), cv2.FONT_HERSHEY_SIMPLEX, 
-                                       0.8, (255, 255, 255), 2)
-                            
-                            # Mensaje en consola (solo primera vez)
-                            if tiempo_fatiga < TIEMPO_ALERTA + 0.1:
-                                print(f"[ALERTA] Fatiga detectada! EAR={ear:.3f}, MAR={mar:.3f}, Tiempo={tiempo_fatiga:.1f}s")
-                        
-                        # Mostrar contador de tiempo
-                        cv2.putText(frame, f"Tiempo ojos cerrados: {tiempo_fatiga:.1f}s", (10, 155),
-                                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
-                    
-                    # CONDICIÓN 2: Risa o bostezo (ojos cerrados PERO boca abierta)
-                    elif ear < EAR_UMBRAL and mar >= MAR_UMBRAL:
-                        estado_fatiga = False
-                        tiempo_inicio_fatiga = None
-                        
-                        # Mostrar que NO es fatiga
-                        cv2.putText(frame, "RISA/BOSTEZO DETECTADO", (10, 155),
-                                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 165, 0), 2)
-                        cv2.putText(frame, "NO es fatiga (algoritmo EAR+MAR funcionando)", (ancho-500, 50),
-                                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 255), 1)
-                    
-                    # CONDICIÓN 3: Operador despierto
-                    else:
-                        if estado_fatiga:
-                            # Operador acaba de abrir los ojos
-                            print(f"[INFO] Operador despierto. Fatiga duró: {tiempo_actual - tiempo_inicio_fatiga:.1f}s")
-                            contador_pestaneos += 1
-                        
-                        estado_fatiga = False
-                        tiempo_inicio_fatiga = None
-                        
-                        # Mostrar estado normal
-                        cv2.putText(frame, "Estado: NORMAL", (10, 155),
-                                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-                    
-                    # Contador de detecciones
-                    cv2.putText(frame, f"Detecciones: {contador_pestaneos}", (ancho-200, 30),
-                                cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
-                    
-                    # Indicar qué condición se está evaluando
-                    condicion_texto = ""
-                    if ear < EAR_UMBRAL and mar < MAR_UMBRAL:
-                        condicion_texto = "Evaluando: FATIGA (ojos+boca cerrados)"
-                    elif ear < EAR_UMBRAL and mar >= MAR_UMBRAL:
-                        condicion_texto = "Evaluando: RISA (ojos cerrados, boca abierta)"
-                    else:
-                        condicion_texto = "Evaluando: NORMAL"
-                    
-                    cv2.putText(frame, condicion_texto, (ancho-500, alto-10),
-                                cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 0), 1)
+            # Grabación del frame (instante, puntos, EAR/MAR y estado)
+            if grabador.habilitado:
+                if n_caras:
+                    grabador.agregar(tiempo_actual, maquina, puntos_cara, ear, mar)
+                else:
+                    grabador.agregar(tiempo_actual, maquina)
+                t_etapa = instr.registrar("registro", t_etapa)
+            if publicador.habilitado:
+                if n_caras:
+                    publicador.publicar(tiempo_actual, maquina, puntos_cara, ear, mar)
+                else:
+                    publicador.publicar(tiempo_actual, maquina)
+                t_etapa = instr.registrar("publicacion", t_etapa)
             
-            else:
-                # No se detecta rostro
-                cv2.putText(frame, "Rostro no detectado", (10, 30),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 255), 2)
+            # Visualización (solo con pantalla): panel, alerta y ventana
+            if visualizacion is not None:
+                overlay.dibujar(frame, caras, maquina.pestaneos,
+                                maquina.ear_umbral, maquina.mar_umbral, TIEMPO_ALERTA,
+                                en_espera=puerta is not None and puerta.ausente)
+                t_etapa = instr.registrar("render", t_etapa)
+                visualizacion.mostrar('Detector de Fatiga EAR+MAR - Prueba para Profesor',
+                                      frame, canal, espera_ms=1)
+                instr.registrar("ventana", t_etapa)
             
-            # Instrucciones en pantalla
-            cv2.putText(frame, "Instrucciones: Cerrar ojos 1.5s -> Alerta | Sonreir -> No alerta | 'q'=salir", 
-                       (10, alto-30), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+            if reloj_real:
+                instr.valor("captura_a_resultado", time.time() - tiempo_actual)
+            instr.contador("reservas_buffers", captura.pool.asignaciones + inferencia.pool.asignaciones)
+            instr.fin_frame(captura.frames_descartados)
             
-            # Mostrar frame
-            cv2.imshow('Detector de Fatiga EAR+MAR - Prueba para Profesor', frame)
+            # Sin conductor y con cámara real, dormir hasta el próximo sondeo
+            if reloj_real and puerta is not None and puerta.ausente:
+                time.sleep(puerta.espera(time.time()))
             
-            # Controles de teclado
-            tecla = cv2.waitKey(1) & 0xFF
-            if tecla == ord('q'):
-                print("[INFO] Saliendo del programa...")
+            # Controles (teclado de la ventana o stdin en modo headless)
+            for tecla in canal.pendientes():
+                if tecla == 'q':
+                    print("[INFO] Saliendo del programa...")
+                    salir = True
+                elif tecla == 'r':
+                    print("[INFO] Contadores reseteados")
+                    maquina.reiniciar()
+                elif tecla in ('+', '='):
+                    adaptacion.ajustar_ear(maquina, +0.01)
+                    print(f"[AJUSTE] EAR_UMBRAL aumentado a: {maquina.ear_umbral:.3f}")
+                elif tecla in ('-', '_'):
+                    adaptacion.ajustar_ear(maquina, -0.01)
+                    print(f"[AJUSTE] EAR_UMBRAL disminuido a: {maquina.ear_umbral:.3f}")
+            if salir:
                 break
-            elif tecla == ord('r'):
-                print("[INFO] Contadores reseteados")
-                estado_fatiga = False
-                tiempo_inicio_fatiga = None
-                contador_pestaneos = 0
-            elif tecla == ord('+') or tecla == ord('='):
-                EAR_UMBRAL = min(0.5, EAR_UMBRAL + 0.01)
-                print(f"[AJUSTE] EAR_UMBRAL aumentado a: {EAR_UMBRAL:.3f}")
-            elif tecla == ord('-') or tecla == ord('_'):
-                EAR_UMBRAL = max(0.1, EAR_UMBRAL - 0.01)
-                print(f"[AJUSTE] EAR_UMBRAL disminuido a: {EAR_UMBRAL:.3f}")
+    
+    duracion_bucle = time.perf_counter() - t_inicio_bucle
     
     # Liberar recursos
-    cap.release()
-    cv2.destroyAllWindows()
+    captura.detener()
+    fuente.release()
+    if visualizacion is not None:
+        visualizacion.cerrar()
+    instr.cerrar()
+    grabador.cerrar()
+    publicador.cerrar()
+    adaptacion.cerrar()
     
     # Resumen final
     print("\n" + "=" * 70)
     print("RESUMEN DE LA PRUEBA:")
-    print(f"Total de detecciones de fatiga: {contador_pestaneos}")
-    print(f"Umbral EAR final: {EAR_UMBRAL:.3f}")
-    print(f"Umbral MAR final: {MAR_UMBRAL:.3f}")
+    print(f"Total de detecciones de fatiga: {maquina.pestaneos}")
+    print(f"Frames procesados: {captura.frames_entregados}, descartados: {captura.frames_descartados}")
+    print(f"Buffers de frame: captura {captura.pool.resumen()}; inferencia {inferencia.pool.resumen()}")
+    if grabador.habilitado:
+        print(grabador.resumen())
+    if publicador.habilitado:
+        print(publicador.resumen())
+    if intervalo_max > 1 or roi or presencia:
+        print(inferencia.resumen())
+    if duracion_bucle > 0:
+        print(f"FPS efectivos: {captura.frames_entregados / duracion_bucle:.1f}")
+    print(f"Umbral EAR final: {maquina.ear_umbral:.3f}")
+    print(f"Umbral MAR final: {maquina.mar_umbral:.3f}")
     print("\nVERIFICACIÓN DEL ALGORITMO EAR+MAR:")
     print("✓ ALERTA ROJA apareció solo con: ojos cerrados + boca neutra")
     print("✓ NO apareció alerta con: ojos cerrados + boca abierta (risa)")
@@ -256,4 +257,41 @@ def main():
     print("=" * 70)
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Detector de fatiga EAR+MAR - prueba rápida")
+    parser.add_argument("--fuente", default="0",
+                        help="índice de cámara, video, directorio de imágenes o registro .npz")
+    parser.add_argument("--tiempo-real", action="store_true",
+                        help="reproducir fuentes grabadas a su ritmo real (por defecto, máxima velocidad)")
+    parser.add_argument("--headless", action="store_true",
+                        help="sin ventana ni dibujo; controles por stdin")
+    parser.add_argument("--intervalo-max", type=int, default=1,
+                        help="ejecutar FaceMesh como mínimo cada N frames, siguiendo los puntos "
+                             "con Lucas-Kanade entre medias (1 = FaceMesh en todos los frames)")
+    parser.add_argument("--roi", action="store_true",
+                        help="pasar a FaceMesh solo un recorte alrededor de la cara, "
+                             "reducido según la latencia medida; frame completo si se pierde")
+    parser.add_argument("--presupuesto-ms", type=float, default=15.0,
+                        help="latencia objetivo de cada inferencia de FaceMesh con --roi")
+    parser.add_argument("--presencia", action="store_true",
+                        help="sin rostro durante 1 s, pausar FaceMesh y sondear con un detector "
+                             "barato (cambio de imagen + Haar) a baja frecuencia")
+    parser.add_argument("--sondeo-ausente", type=float, default=0.5,
+                        help="segundos entre sondeos sin conductor con --presencia")
+    parser.add_argument("--conductor", default=None,
+                        help="adaptar los umbrales a la línea base de este conductor (perfil guardado)")
+    parser.add_argument("--perfiles", default="perfiles",
+                        help="directorio de perfiles de conductor")
+    parser.add_argument("--config", default=None,
+                        help="umbrales EAR/MAR y tiempo de alerta generados por calibracion.py")
+    parser.add_argument("--grabar", default=None,
+                        help="grabar por frame puntos, EAR/MAR y estado en este registro binario (.reg)")
+    parser.add_argument("--publicar", default=None,
+                        help="publicar cada frame en memoria compartida con este nombre (publicacion.py)")
+    parser.add_argument("--metricas", default=None,
+                        help="exportar tiempos por etapa a este fichero (.jsonl o .prom)")
+    parser.add_argument("--periodo-metricas", type=float, default=5.0,
+                        help="segundos entre exportaciones de métricas")
+    args = parser.parse_args()
+    main(args.fuente, args.tiempo_real, args.headless, args.metricas, args.periodo_metricas,
+         args.intervalo_max, args.roi, args.presupuesto_ms, args.presencia, args.sondeo_ausente,
+         args.grabar, args.config, args.conductor, args.perfiles, args.publicar)
@@ -0,0 +1,278 @@
+# publicacion.py - Métricas por frame publicadas en memoria compartida
+# El detector escribe cada frame (instante, puntos, EAR/MAR y estado de la
+# máquina de fatiga, el mismo registro que registro.py) en un anillo de
+# `capacidad` ranuras en multiprocessing.shared_memory. Un solo escritor y
+# cualquier número de lectores en otros procesos (registro, panel, una
+# segunda regla de seguridad) sin locks, sin serializar y sin que un lector
+# lento frene el bucle de visión: el escritor nunca espera.
+#
+# Protocolo (secuencia por ranura, al estilo seqlock):
+#   - El frame n (n >= 1) va a la ranura n % capacidad. El escritor pone la
+#     secuencia de la ranura a 0, escribe los campos, pone la secuencia a n y
+#     por último publica n en la cabecera ("escrito").
+#   - El lector copia las ranuras de los frames que aún no ha leído y después
+#     vuelve a leer sus secuencias: una ranura es válida si la secuencia es n
+#     antes y después de la copia. Si el escritor le ha dado la vuelta al
+#     anillo, los frames sobrescritos se cuentan como perdidos.
+# Se asume que las escrituras se ven en orden desde otro proceso, como en
+# x86; en ARM la doble comprobación detecta la mayoría de copias a medias.
+# Cada registro ocupa un múltiplo de 8 bytes (relleno al final), así que la
+# secuencia de todas las ranuras queda alineada a 8 bytes y nunca cruza una
+# línea de caché: su escritura es atómica.
+#
+# Uso:
+#   python detector_original.py --publicar fatiga
+#   python publicacion.py fatiga            (lector de ejemplo: una línea por segundo)
+
+import argparse
+import struct
+import threading
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+from registro import DTYPE_REGISTRO, CONDICIONES, BANDERA_ALERTA, rellenar_registro
+
+MAGIA = b"FATIGPUB"
+VERSION = 2                     # 2: registros rellenados a múltiplo de 8 bytes
+# Cabecera: magia, versión, capacidad, tamaño de registro, t de inicio (epoch)
+FORMATO_CABECERA = "<8sHIId"
+DESPLAZAMIENTO_ESCRITO = 32     # u8: último frame publicado (0 = ninguno)
+DESPLAZAMIENTO_ACTIVO = 40      # u1: 1 mientras el publicador está en marcha
+TAMANO_CABECERA = 64
+
+_RELLENO = -(8 + DTYPE_REGISTRO.itemsize) % 8
+DTYPE_PUBLICACION = np.dtype([("seq", "<u8")] + DTYPE_REGISTRO.descr
+                             + ([("relleno", f"V{_RELLENO}")] if _RELLENO else []))
+
+# Crear y adjuntar segmentos en este módulo pasa por este cerrojo: al adjuntar
+# con Python < 3.13 se sustituye resource_tracker.register para todo el
+# proceso, y un publicador que se cree a la vez en otro hilo quedaría sin
+# registrar (y su segmento sin borrar si el proceso muere). No protege la
+# memoria compartida que se cree fuera de este módulo.
+_CERROJO_SEGMENTOS = threading.Lock()
+
+
+def _adjuntar(nombre):
+    """Abrir un segmento existente sin que el resource_tracker lo borre al salir el lector"""
+    try:
+        return shared_memory.SharedMemory(name=nombre, track=False)    # Python >= 3.13
+    except TypeError:
+        # Solo Python < 3.13: se registra también al adjuntar; no basta con quitar
+        # el registro después porque un hijo comparte el tracker con el publicador
+        with _CERROJO_SEGMENTOS:
+            registrar = resource_tracker.register
+            resource_tracker.register = lambda nombre, tipo: None
+            try:
+                return shared_memory.SharedMemory(name=nombre)
+            finally:
+                resource_tracker.register = registrar
+
+
+def _crear(nombre, tamano):
+    """Crear el segmento `nombre` (registrado en el resource_tracker, que lo borra si el proceso muere)"""
+    with _CERROJO_SEGMENTOS:
+        return shared_memory.SharedMemory(name=nombre, create=True, size=tamano)
+
+
+def _vistas(memoria, capacidad):
+    """(escrito, activo, registros) como arrays sobre el segmento, sin copiar"""
+    escrito = np.ndarray((1,), "<u8", buffer=memoria.buf, offset=DESPLAZAMIENTO_ESCRITO)
+    activo = np.ndarray((1,), "u1", buffer=memoria.buf, offset=DESPLAZAMIENTO_ACTIVO)
+    registros = np.ndarray((capacidad,), DTYPE_PUBLICACION, buffer=memoria.buf, offset=TAMANO_CABECERA)
+    return escrito, activo, registros
+
+
+class PublicadorMetricas:
+    """Escritor único del anillo en memoria compartida `nombre`"""
+
+    habilitado = True
+
+    def __init__(self, nombre="fatiga", capacidad=4096):
+        self.nombre = nombre
+        self.capacidad = capacidad
+        tamano = TAMANO_CABECERA + capacidad * DTYPE_PUBLICACION.itemsize
+        try:
+            self._memoria = _crear(nombre, tamano)
+        except FileExistsError:
+            # Segmento de una ejecución anterior que no llegó a cerrarse
+            anterior = _adjuntar(nombre)
+            anterior.close()
+            anterior.unlink()
+            self._memoria = _crear(nombre, tamano)
+        self._memoria.buf[:TAMANO_CABECERA] = struct.pack(
+            FORMATO_CABECERA, MAGIA, VERSION, capacidad, DTYPE_PUBLICACION.itemsize, time.time()
+        ).ljust(TAMANO_CABECERA, b"\0")
+        self._escrito, self._activo, self._registros = _vistas(self._memoria, capacidad)
+        self._registros["seq"] = 0
+        self._activo[0] = 1
+        self.publicados = 0
+
+    def publicar(self, t, maquina, puntos=None, ear=np.nan, mar=np.nan):
+        """Publicar el frame t con el estado de `maquina`; sin `puntos` se publica como frame sin cara"""
+        n = self.publicados + 1
+        fila = self._registros[n % self.capacidad]
+        fila["seq"] = 0
+        rellenar_registro(fila, t, maquina, puntos, ear, mar)
+        fila["seq"] = n
+        self._escrito[0] = n
+        self.publicados = n
+
+    def cerrar(self):
+        """Marcar el fin de la publicación y liberar el segmento (los lectores abiertos lo conservan)"""
+        self._activo[0] = 0
+        del self._escrito, self._activo, self._registros
+        self._memoria.close()
+        self._memoria.unlink()
+
+    def resumen(self):
+        return (f"Publicación '{self.nombre}': {self.publicados} frames en un anillo de "
+                f"{self.capacidad} ({DTYPE_PUBLICACION.itemsize} B/frame)")
+
+
+class PublicadorNulo:
+    """Publicación desactivada: todos los métodos son no-ops"""
+
+    habilitado = False
+
+    def publicar(self, t, maquina, puntos=None, ear=np.nan, mar=np.nan):
+        pass
+
+    def cerrar(self):
+        pass
+
+    def resumen(self):
+        return "Publicación: desactivada"
+
+
+def crear_publicador(nombre=None, capacidad=4096):
+    """Publicador real si se da un nombre de segmento, si no el objeto nulo"""
+    if nombre:
+        return PublicadorMetricas(nombre, capacidad)
+    return PublicadorNulo()
+
+
+class SuscriptorMetricas:
+    """Lector del anillo `nombre` desde otro proceso; detecta los frames perdidos"""
+
+    def __init__(self, nombre="fatiga", desde_inicio=False):
+        self.nombre = nombre
+        self._memoria = _adjuntar(nombre)
+        magia, version, capacidad, tamano_registro, t_inicio = struct.unpack_from(
+            FORMATO_CABECERA, self._memoria.buf)
+        if magia != MAGIA or version != VERSION or tamano_registro != DTYPE_PUBLICACION.itemsize:
+            self._memoria.close()
+            raise ValueError(f"'{nombre}' no es una publicación de fatiga compatible")
+        self.capacidad = capacidad
+        self.t_inicio = t_inicio
+        self._escrito, self._activo, self._registros = _vistas(self._memoria, capacidad)
+        escrito = int(self._escrito[0])
+        # Por defecto solo los frames nuevos; con desde_inicio, lo que quede en el anillo
+        self.siguiente = max(escrito - capacidad + 1, 1) if desde_inicio else escrito + 1
+        self.recibidos = 0
+        self.perdidos = 0
+
+    @property
+    def activo(self):
+        """True mientras el publicador siga en marcha"""
+        return bool(self._activo[0])
+
+    @property
+    def escrito(self):
+        """Último frame publicado"""
+        return int(self._escrito[0])
+
+    def leer(self, maximo=None):
+        """Copia (array DTYPE_PUBLICACION) de los frames publicados desde la última lectura"""
+        escrito = int(self._escrito[0])
+        if escrito < self.siguiente:
+            return self._registros[:0].copy()
+        inicio = max(self.siguiente, escrito - self.capacidad + 1)
+        fin = escrito if maximo is None else min(escrito, inicio + maximo - 1)
+        esperados = np.arange(inicio, fin + 1, dtype=np.uint64)
+        ranuras = esperados % self.capacidad
+        copia = self._registros[ranuras]
+        validos = (copia["seq"] == esperados) & (self._registros["seq"][ranuras] == esperados)
+        self.perdidos += (inicio - self.siguiente) + int(len(esperados) - np.count_nonzero(validos))
+        self.siguiente = fin + 1
+        if not validos.all():
+            copia = copia[validos]
+        self.recibidos += len(copia)
+        return copia
+
+    def esperar(self, timeout=None, periodo=0.002):
+        """Como leer(), pero esperando (sondeo cada `periodo` s) a que haya frames nuevos"""
+        limite = None if timeout is None else time.perf_counter() + timeout
+        while int(self._escrito[0]) < self.siguiente:
+            if not self.activo or (limite is not None and time.perf_counter() >= limite):
+                break
+            time.sleep(periodo)
+        return self.leer()
+
+    def ultimo(self):
+        """Copia del frame más reciente (sin avanzar la lectura), o None si no hay"""
+        escrito = int(self._escrito[0])
+        if not escrito:
+            return None
+        ranura = escrito % self.capacidad
+        copia = self._registros[ranura:ranura + 1].copy()
+        if copia["seq"][0] != escrito or self._registros["seq"][ranura] != escrito:
+            return None
+        return copia[0]
+
+    def cerrar(self):
+        del self._escrito, self._activo, self._registros
+        self._memoria.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lector de ejemplo de las métricas publicadas con --publicar")
+    parser.add_argument("nombre", nargs="?", default="fatiga", help="nombre del segmento de memoria compartida")
+    parser.add_argument("--desde-inicio", action="store_true",
+                        help="leer también los frames que sigan en el anillo")
+    args = parser.parse_args()
+
+    try:
+        suscriptor = SuscriptorMetricas(args.nombre, args.desde_inicio)
+    except FileNotFoundError:
+        print(f"[ERROR] No hay ninguna publicación '{args.nombre}' (¿detector sin --publicar?)")
+        return
+    print(f"[INFO] Suscrito a '{args.nombre}' (anillo de {suscriptor.capacidad} frames)")
+    alertas = 0
+    alerta_previa = False
+    t_informe = time.perf_counter()
+    recibidos_informe = 0
+    try:
+        while True:
+            registros = suscriptor.esperar(timeout=1.0)
+            if len(registros):
+                alerta = (registros["banderas"] & BANDERA_ALERTA) != 0
+                previa = np.concatenate(([alerta_previa], alerta[:-1]))
+                alertas += int(np.count_nonzero(alerta & ~previa))
+                alerta_previa = bool(alerta[-1])
+            ahora = time.perf_counter()
+            if ahora - t_informe >= 1.0:
+                nuevos = suscriptor.recibidos - recibidos_informe
+                ultimo = suscriptor.ultimo()
+                if ultimo is not None and ultimo["caras"]:
+                    estado = (f"EAR {ultimo['ear']:.3f}, MAR {ultimo['mar']:.3f}, "
+                              f"{CONDICIONES[ultimo['condicion']]}")
+                else:
+                    estado = "sin cara"
+                print(f"[INFO] {nuevos / (ahora - t_informe):.1f} frames/s, {estado}, "
+                      f"{suscriptor.perdidos} perdidos")
+                t_informe = ahora
+                recibidos_informe = suscriptor.recibidos
+            if not suscriptor.activo and suscriptor.escrito < suscriptor.siguiente:
+                print("[INFO] El publicador terminó")
+                break
+    except KeyboardInterrupt:
+        pass
+    print(f"Frames recibidos: {suscriptor.recibidos}, perdidos: {suscriptor.perdidos}, "
+          f"inicios de alerta vistos: {alertas}")
+    suscriptor.cerrar()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,346 @@
+# registro.py - Grabación binaria por frame y reproceso con memoria mapeada
+# Cada frame ocupa un registro de tamaño fijo: instante, los 20 puntos (x, y)
+# de ojos y boca, EAR, MAR y el estado de la máquina de fatiga. Los puntos
+# normalizados se guardan como enteros de 16 bits con signo (× 16384,
+# resolución 6e-5: 0,04 px a 640 px), que cubren [-2, 2) para conservar los
+# puntos de una cara que se sale del encuadre, y el tiempo de cierre en ms.
+# Un registro ocupa 112 B (relleno hasta múltiplo de 8, para que `t` quede
+# alineado en el fichero mapeado). El fichero es una cabecera de 64 bytes
+# seguida de registros añadidos al final: una hora a 30 fps ocupa unos 12 MB
+# y un corte a mitad de escritura solo pierde el último registro incompleto.
+#
+# El bucle de detección rellena bloques preasignados; un hilo aparte los
+# escribe en disco cuando se llenan o cada `periodo_vaciado` segundos, de
+# modo que la grabación nunca espera al disco. Si el disco no da abasto y no
+# quedan bloques libres, se descartan registros (y se cuentan) en lugar de
+# frenar el bucle.
+#
+# leer_registro() mapea el fichero como un array estructurado de NumPy sin
+# copiarlo, y reprocesar() recalcula EAR/MAR y la máquina de estados de una
+# sesión completa en segundos, sin volver a pasar el video.
+#
+# Uso:
+#   python detector_original.py --grabar sesion.reg
+#   python registro.py sesion.reg --ear-umbral 0.23
+
+import argparse
+import os
+import queue
+import struct
+import threading
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from estado_fatiga import MaquinaEstadoFatiga, MODO_ORIGINAL, MODO_PRUEBA_RAPIDA
+from metricas import MotorMetricas, N_PUNTOS, COL_EAR, COL_MAR
+
+MAGIA = b"FATIGREG"
+VERSION = 3                     # 3: puntos en i2, cierre en ms y registro de 112 B
+# Cabecera: magia, versión, puntos por registro, tamaño de cabecera y de registro, t de inicio (epoch)
+FORMATO_CABECERA = "<8sHHIId"
+TAMANO_CABECERA = 64
+
+CONDICIONES = ("normal", "fatiga", "risa")
+BANDERA_CERRADO = 1
+BANDERA_ALERTA = 2
+ESCALA_PUNTOS = 16384           # Coordenada normalizada → i2; cubre [-2, 2)
+LIMITES_PUNTOS = (-32768, 32767)    # Fuera de [-2, 2) se satura
+CIERRE_MAX_MS = 65535           # Los cierres más largos se guardan saturados
+TOLERANCIA_REPROCESO = 2e-3     # EAR/MAR recalculados frente a grabados (cuantización de los puntos)
+
+DTYPE_REGISTRO = np.dtype([
+    ("t", "<f8"),                       # Instante del frame (reloj de la fuente)
+    ("puntos", "<i2", (N_PUNTOS, 2)),   # Orden de metricas.INDICES, normalizados × ESCALA_PUNTOS
+    ("ear", "<f4"),                     # NaN si no hay cara
+    ("mar", "<f4"),
+    ("pestaneos", "<u4"),
+    ("cierre_ms", "<u2"),               # Tiempo de cierre de ojos
+    ("pestaneos_minuto", "<u2"),
+    ("condicion", "u1"),                # Índice en CONDICIONES
+    ("banderas", "u1"),                 # BANDERA_CERRADO | BANDERA_ALERTA
+    ("caras", "u1"),
+    ("relleno", "V5"),                  # Hasta 112 B: `t` alineado a 8 bytes en todos los registros
+])
+
+# Un episodio por alerta: primer frame del cierre de ojos que la provocó (NaN
+# si fue por tasa de pestañeos), primer y último frame en alerta
+DTYPE_EPISODIO = np.dtype([("t_cierre", "<f8"), ("t_alerta", "<f8"), ("t_fin", "<f8")])
+
+ResultadoReproceso = namedtuple("ResultadoReproceso", ["indices", "metricas", "alertas", "maquina"])
+
+
+def _cabecera(t_inicio=None):
+    cabecera = struct.pack(FORMATO_CABECERA, MAGIA, VERSION, N_PUNTOS, TAMANO_CABECERA,
+                           DTYPE_REGISTRO.itemsize, time.time() if t_inicio is None else t_inicio)
+    return cabecera.ljust(TAMANO_CABECERA, b"\0")
+
+
+def codificar_puntos(puntos):
+    """Puntos normalizados (…, 20, 2) en el formato i2 del campo puntos"""
+    return np.clip(np.rint(np.multiply(puntos, ESCALA_PUNTOS)), *LIMITES_PUNTOS).astype(np.int16)
+
+
+def puntos_registro(registros):
+    """Puntos normalizados (n, 20, 2) en float32 de unos registros grabados o publicados"""
+    return registros["puntos"] * np.float32(1.0 / ESCALA_PUNTOS)
+
+
+def codificar_cierre(segundos):
+    """Tiempo de cierre (s, escalar o array) en ms saturados para el campo cierre_ms"""
+    return np.minimum(np.rint(np.multiply(segundos, 1000.0)), CIERRE_MAX_MS).astype(np.uint16)
+
+
+def rellenar_registro(fila, t, maquina, puntos=None, ear=np.nan, mar=np.nan):
+    """Escribir en `fila` (un elemento de un array DTYPE_REGISTRO) el frame t y el estado de `maquina`"""
+    fila["t"] = t
+    if puntos is None:
+        fila["caras"] = 0
+        fila["puntos"] = 0.0
+    else:
+        fila["caras"] = 1
+        fila["puntos"] = codificar_puntos(puntos)
+    fila["ear"] = ear
+    fila["mar"] = mar
+    fila["cierre_ms"] = codificar_cierre(maquina.tiempo_cierre)
+    fila["pestaneos"] = maquina.pestaneos
+    fila["pestaneos_minuto"] = maquina.pestaneos_por_minuto
+    fila["condicion"] = CONDICIONES.index(maquina.condicion)
+    fila["banderas"] = (BANDERA_CERRADO if maquina.cerrado else 0) | (BANDERA_ALERTA if maquina.alerta else 0)
+
+
+class GrabadorRegistro:
+    """Grabación de un registro por frame en bloques que escribe un hilo aparte"""
+
+    habilitado = True
+
+    def __init__(self, ruta, registros_bloque=256, periodo_vaciado=1.0, max_bloques=16, t_inicio=None):
+        self.ruta = ruta
+        self.registros_bloque = registros_bloque
+        self.periodo_vaciado = periodo_vaciado
+        self.max_bloques = max_bloques
+        self._archivo = open(ruta, "wb")
+        self._archivo.write(_cabecera(t_inicio))
+
+        # Bloques preasignados: el bucle rellena uno mientras el hilo escribe otros
+        self._libres = queue.Queue()
+        self._pendientes = queue.Queue()
+        self._libres.put(np.zeros(registros_bloque, DTYPE_REGISTRO))
+        self._bloques_creados = 2
+        self._bloque = np.zeros(registros_bloque, DTYPE_REGISTRO)
+        self._n = 0
+        self._t_vaciado = time.perf_counter()
+
+        # Estadísticas
+        self.registros = 0
+        self.registros_perdidos = 0
+        self.bytes_escritos = TAMANO_CABECERA
+        self.errores = 0
+
+        self._hilo = threading.Thread(target=self._escribir, name="registro", daemon=True)
+        self._hilo.start()
+
+    def agregar(self, t, maquina, puntos=None, ear=np.nan, mar=np.nan):
+        """Añadir el frame t con el estado de `maquina`; sin `puntos` se graba como frame sin cara"""
+        rellenar_registro(self._bloque[self._n], t, maquina, puntos, ear, mar)
+        self._n += 1
+        self.registros += 1
+        if self._n == self.registros_bloque or time.perf_counter() - self._t_vaciado >= self.periodo_vaciado:
+            self._entregar()
+
+    def _entregar(self):
+        """Pasar el bloque actual al hilo de escritura y continuar en uno libre"""
+        self._t_vaciado = time.perf_counter()
+        if not self._n:
+            return
+        try:
+            nuevo = self._libres.get_nowait()
+        except queue.Empty:
+            if self._bloques_creados >= self.max_bloques:
+                # Disco atascado: se pierde este bloque en lugar de esperar
+                self.registros_perdidos += self._n
+                self._n = 0
+                return
+            nuevo = np.zeros(self.registros_bloque, DTYPE_REGISTRO)
+            self._bloques_creados += 1
+        self._pendientes.put((self._bloque, self._n))
+        self._bloque = nuevo
+        self._n = 0
+
+    def _escribir(self):
+        while True:
+            elemento = self._pendientes.get()
+            if elemento is None:
+                return
+            bloque, n = elemento
+            try:
+                # Vista de bytes del bloque: se escribe sin copiarlo
+                self._archivo.write(bloque[:n].view(np.uint8))
+                self._archivo.flush()
+                self.bytes_escritos += n * DTYPE_REGISTRO.itemsize
+            except OSError as e:
+                self.errores += 1
+                self.registros_perdidos += n
+                if self.errores == 1:
+                    print(f"[ERROR] No se pudo escribir el registro {self.ruta}: {e}")
+            self._libres.put(bloque)
+
+    def cerrar(self):
+        """Escribir lo pendiente y cerrar el fichero"""
+        self._entregar()
+        self._pendientes.put(None)
+        self._hilo.join()
+        self._archivo.close()
+
+    def resumen(self):
+        """Texto con los frames grabados, el tamaño y los registros perdidos"""
+        return (f"Registro {self.ruta}: {self.registros} frames, {self.bytes_escritos / 1e6:.2f} MB "
+                f"({DTYPE_REGISTRO.itemsize} B/frame), {self.registros_perdidos} perdidos")
+
+
+class GrabadorNulo:
+    """Grabación desactivada: todos los métodos son no-ops"""
+
+    habilitado = False
+
+    def agregar(self, t, maquina, puntos=None, ear=np.nan, mar=np.nan):
+        pass
+
+    def cerrar(self):
+        pass
+
+    def resumen(self):
+        return "Registro: desactivado"
+
+
+def crear_grabador(ruta=None):
+    """Grabador real si se da una ruta, si no el objeto nulo"""
+    if ruta:
+        return GrabadorRegistro(ruta)
+    return GrabadorNulo()
+
+
+def escribir_registro(ruta, registros, t_inicio=None):
+    """Escribir de una vez un array DTYPE_REGISTRO completo (p. ej. el de un análisis offline)
+
+    Se escribe en un fichero temporal que luego se renombra: un corte a
+    mitad no deja un registro a medias con el nombre definitivo.
+    """
+    temporal = ruta + ".tmp"
+    with open(temporal, "wb") as f:
+        f.write(_cabecera(t_inicio))
+        f.write(np.ascontiguousarray(registros, DTYPE_REGISTRO).view(np.uint8))
+    os.replace(temporal, ruta)
+
+
+def leer_registro(ruta):
+    """Mapear un registro como array estructurado (sin copiar); devuelve (registros, cabecera)
+
+    Se puede leer mientras otro proceso graba: solo se mapean los registros
+    completos escritos hasta ese momento.
+    """
+    with open(ruta, "rb") as f:
+        crudo = f.read(TAMANO_CABECERA)
+    if len(crudo) < TAMANO_CABECERA or not crudo.startswith(MAGIA):
+        raise ValueError(f"{ruta} no es un registro de fatiga")
+    _, version, n_puntos, tamano_cabecera, tamano_registro, t_inicio = struct.unpack_from(
+        FORMATO_CABECERA, crudo)
+    if version != VERSION or n_puntos != N_PUNTOS or tamano_registro != DTYPE_REGISTRO.itemsize:
+        raise ValueError(f"Formato de registro no soportado (versión {version}, "
+                         f"{n_puntos} puntos, {tamano_registro} B/registro)")
+    n = (os.path.getsize(ruta) - tamano_cabecera) // tamano_registro
+    cabecera = {"version": version, "t_inicio": t_inicio, "registros": n}
+    if n <= 0:
+        return np.zeros(0, DTYPE_REGISTRO), cabecera
+    return np.memmap(ruta, DTYPE_REGISTRO, mode="r", offset=tamano_cabecera, shape=(n,)), cabecera
+
+
+def episodios_alerta(registros):
+    """Episodios de alerta (array DTYPE_EPISODIO) de unos registros grabados o publicados"""
+    t = registros["t"]
+    alerta = (registros["banderas"] & BANDERA_ALERTA) != 0
+    cerrado = (registros["banderas"] & BANDERA_CERRADO) != 0
+    inicios = np.flatnonzero(alerta & ~np.concatenate(([False], alerta[:-1])))
+    finales = np.flatnonzero(alerta & ~np.concatenate((alerta[1:], [False])))
+    episodios = np.zeros(len(inicios), DTYPE_EPISODIO)
+    if not len(inicios):
+        return episodios
+    # El cierre empieza tras el último frame con los ojos abiertos anterior a la alerta
+    abiertos = np.append(-1, np.flatnonzero(~cerrado))
+    primeros = abiertos[np.searchsorted(abiertos, inicios) - 1] + 1
+    episodios["t_cierre"] = np.where(cerrado[inicios], t[primeros], np.nan)
+    episodios["t_alerta"] = t[inicios]
+    episodios["t_fin"] = t[finales]
+    return episodios
+
+
+def reprocesar(registros, modo=MODO_ORIGINAL, ear_umbral=0.25, mar_umbral=0.2, tiempo_alerta=1.5):
+    """Recalcular EAR/MAR (en lote) y la máquina de estados sobre los frames con cara
+
+    Devuelve ResultadoReproceso: índices de esos frames en el registro, sus
+    métricas (n, 4), la alerta de cada uno y la máquina al terminar.
+    """
+    indices = np.flatnonzero(registros["caras"])
+    metricas = MotorMetricas(max_caras=1).calcular(puntos_registro(registros[indices]))
+    maquina = MaquinaEstadoFatiga(ear_umbral, mar_umbral, tiempo_alerta, modo=modo)
+    alertas = np.zeros(len(indices), dtype=bool)
+    actualizar = maquina.actualizar
+    for i, (t, ear, mar) in enumerate(zip(registros["t"][indices].tolist(),
+                                          metricas[:, COL_EAR].tolist(), metricas[:, COL_MAR].tolist())):
+        alertas[i] = actualizar(t, ear, mar)
+    return ResultadoReproceso(indices, metricas, alertas, maquina)
+
+
+def diferencia_metricas(registros, resultado):
+    """Máxima diferencia (EAR, MAR) entre lo grabado y lo que recalcula reprocesar() en los frames con cara"""
+    grabados = registros[resultado.indices]
+    if not len(grabados):
+        return 0.0, 0.0
+    return (float(np.nanmax(np.abs(resultado.metricas[:, COL_EAR] - grabados["ear"]))),
+            float(np.nanmax(np.abs(resultado.metricas[:, COL_MAR] - grabados["mar"]))))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reprocesar un registro grabado con --grabar")
+    parser.add_argument("registro", help="fichero .reg grabado por el detector")
+    parser.add_argument("--modo", choices=(MODO_ORIGINAL, MODO_PRUEBA_RAPIDA), default=MODO_ORIGINAL)
+    parser.add_argument("--ear-umbral", type=float, default=0.25)
+    parser.add_argument("--mar-umbral", type=float, default=0.2)
+    parser.add_argument("--tiempo-alerta", type=float, default=1.5)
+    args = parser.parse_args()
+
+    registros, cabecera = leer_registro(args.registro)
+    if not len(registros):
+        print("[ADVERTENCIA] El registro no contiene frames")
+        return
+    t0 = time.perf_counter()
+    resultado = reprocesar(registros, args.modo, args.ear_umbral, args.mar_umbral, args.tiempo_alerta)
+    duracion_reproceso = time.perf_counter() - t0
+
+    t = registros["t"]
+    duracion = float(t[-1] - t[0])
+    dt = np.diff(t, append=t[-1])[resultado.indices]
+    grabadas = (registros["banderas"][resultado.indices] & BANDERA_ALERTA) != 0
+
+    print("=" * 70)
+    print(f"REGISTRO: {args.registro} (inicio {time.ctime(cabecera['t_inicio'])})")
+    print(f"Frames: {len(registros)} en {duracion:.1f}s, con cara: {len(resultado.indices)} "
+          f"({100.0 * len(resultado.indices) / len(registros):.0f}%)")
+    print(f"Tamaño: {os.path.getsize(args.registro) / 1e6:.2f} MB ({DTYPE_REGISTRO.itemsize} B/frame)")
+    print(f"Reproceso ({args.modo}, EAR < {args.ear_umbral}, MAR >= {args.mar_umbral}): "
+          f"{duracion_reproceso:.2f}s ({len(resultado.indices) / max(duracion_reproceso, 1e-9):.0f} frames/s)")
+    print(f"Detecciones de fatiga: {resultado.maquina.pestaneos} "
+          f"(grabadas: {int(registros['pestaneos'][resultado.indices[-1]]) if len(resultado.indices) else 0})")
+    print(f"Tiempo en alerta: {float(dt[resultado.alertas].sum()):.1f}s "
+          f"(grabado: {float(dt[grabadas].sum()):.1f}s)")
+    if len(resultado.indices):
+        ear, mar = diferencia_metricas(registros, resultado)
+        print(f"EAR/MAR recalculados frente a los grabados: diferencia máxima {ear:.1e} / {mar:.1e}"
+              + (" [ADVERTENCIA] mayor que la cuantización" if max(ear, mar) > TOLERANCIA_REPROCESO else ""))
+        print(f"Frames con la misma alerta que la grabación: {100.0 * np.mean(resultado.alertas == grabadas):.1f}%")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    main()
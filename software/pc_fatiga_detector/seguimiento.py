@@ -0,0 +1,309 @@
+# seguimiento.py - FaceMesh espaciado con seguimiento óptico de los 20 puntos
+# Solo interesan los 20 puntos de ojos y boca y se mueven poco entre frames:
+# FaceMesh se ejecuta cada N frames y, entre medias, los puntos se siguen con
+# Lucas-Kanade piramidal sobre una ROI en escala de grises. N se adapta:
+#   - vuelve a 1 (FaceMesh en cada frame) si el EAR se acerca al umbral o
+#     cambia rápido (párpados en movimiento), para no perder la forma de un
+#     pestañeo, o si hay mucho movimiento;
+#   - se reduce a la mitad con movimiento moderado;
+#   - crece de uno en uno hasta el máximo con la cara quieta y ojos abiertos.
+# Si el seguimiento pierde confianza (estado de LK o error ida-vuelta) o da
+# un EAR cerca del umbral, se ejecuta FaceMesh en ese mismo frame. Con
+# intervalo_max=1 el comportamiento es el de siempre: FaceMesh en todos los
+# frames y sin conversión a gris.
+#
+# Opcionalmente (roi=True) FaceMesh no recibe el frame completo sino un
+# recorte cuadrado alrededor de los puntos anteriores, reducido a un lado
+# objetivo que se elige solo según la latencia medida de cada inferencia.
+# Los landmarks se devuelven a coordenadas del frame completo; el escalado es
+# uniforme, así que EAR/MAR y sus umbrales no cambian. Si en el recorte no se
+# encuentra la cara, se repite la inferencia sobre el frame completo.
+#
+# Las conversiones a gris y RGB y las reducciones escriben en buffers
+# preasignados (PoolBuffers), y MediaPipe recibe una vista de solo lectura
+# que usa por referencia. El recorte es un cuadrado de lado múltiplo de 32
+# dentro del frame, así que la forma de esos buffers apenas cambia.
+#
+# Con una puerta de presencia (presencia.DetectorPresencia), sin conductor no
+# se ejecuta FaceMesh en cada frame: la puerta sondea a baja frecuencia y
+# procesar() devuelve 0 caras en los frames en espera.
+
+import time
+
+import cv2
+import numpy as np
+
+from buffers import PoolBuffers, solo_lectura
+from instrumentacion import InstrumentacionNula
+from metricas import COL_EAR
+
+# Lados (px) posibles de la imagen que recibe FaceMesh con recorte, de mayor a menor
+TAMANOS_ROI = (480, 384, 320, 256, 192)
+
+
+class SeguidorLK:
+    """Seguimiento Lucas-Kanade de puntos normalizados dentro de la ROI que los rodea"""
+
+    def __init__(self, ventana=15, niveles=2, margen=24, error_max=1.0):
+        self.ventana = (ventana, ventana)
+        self.niveles = niveles
+        # Margen de la ROI: desplazamiento máximo esperado + media ventana en el nivel más grueso
+        self.margen = margen + (ventana // 2) * (2 ** niveles)
+        self.error_max = error_max
+        self.criterio = (cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 20, 0.03)
+        self._gris = None
+        self._p = None
+        self.movimiento = 0.0       # Mediana del desplazamiento del último seguimiento (px)
+
+    def iniciar(self, gris, puntos):
+        """Tomar `gris` y los puntos normalizados (k, 2) como referencia"""
+        alto, ancho = gris.shape
+        self._gris = gris
+        self._p = (puntos * (ancho, alto)).astype(np.float32).reshape(-1, 1, 2)
+
+    def seguir(self, gris, puntos):
+        """Seguir los puntos hasta `gris`; si hay confianza, escribe `puntos` (k, 2) y devuelve True"""
+        if self._gris is None:
+            return False
+        alto, ancho = gris.shape
+        x0, y0 = np.maximum(self._p.min(axis=(0, 1)) - self.margen, 0).astype(int)
+        x1, y1 = np.minimum(self._p.max(axis=(0, 1)) + self.margen, (ancho, alto)).astype(int)
+        if x1 - x0 < self.ventana[0] or y1 - y0 < self.ventana[1]:
+            return False
+        origen = np.array([x0, y0], np.float32)
+        previo = self._gris[y0:y1, x0:x1]
+        actual = gris[y0:y1, x0:x1]
+        p0 = self._p - origen
+
+        p1, estado, _ = cv2.calcOpticalFlowPyrLK(previo, actual, p0, None, winSize=self.ventana,
+                                                 maxLevel=self.niveles, criteria=self.criterio)
+        # Comprobación ida y vuelta: un punto fiable vuelve a su posición de partida
+        p0r, estado_r, _ = cv2.calcOpticalFlowPyrLK(actual, previo, p1, None, winSize=self.ventana,
+                                                    maxLevel=self.niveles, criteria=self.criterio)
+        error = np.abs(p0 - p0r).max(axis=(1, 2))
+        if not (estado.all() and estado_r.all() and (error < self.error_max).all()):
+            return False
+
+        self.movimiento = float(np.median(np.hypot(*(p1 - p0).reshape(-1, 2).T)))
+        self._p = p1 + origen
+        self._gris = gris
+        puntos[:] = self._p.reshape(-1, 2) / (ancho, alto)
+        return True
+
+
+class InferenciaEspaciada:
+    """Ejecuta FaceMesh cada N frames (N adaptativo) y sigue los puntos entre medias"""
+
+    def __init__(self, facemesh, motor_metricas, intervalo_max=1, margen_ear=0.02,
+                 caida_ear=0.015, movimiento_medio=0.05, movimiento_alto=0.15, instrumentacion=None,
+                 roi=False, presupuesto_ms=15.0, lado_completo=640, factor_roi=2.4, presencia=None):
+        self.facemesh = facemesh
+        self.motor = motor_metricas
+        self.intervalo_max = max(int(intervalo_max), 1)
+        self.margen_ear = margen_ear              # EAR < umbral + margen → FaceMesh en cada frame
+        self.caida_ear = caida_ear                # Caída del EAR por frame que indica cierre
+        self.movimiento_medio = movimiento_medio  # En anchos de ojo por frame
+        self.movimiento_alto = movimiento_alto
+        self.instr = instrumentacion or InstrumentacionNula()
+        self.seguidor = SeguidorLK()
+        self.pool = PoolBuffers()
+        self._par_gris = 0              # Buffers de gris alternos: el seguidor guarda el anterior
+        self.presencia = presencia      # DetectorPresencia o None (FaceMesh siempre)
+
+        # Recorte de la cara y resolución adaptativa
+        self.usar_roi = roi
+        self.presupuesto_ms = presupuesto_ms      # Latencia objetivo de cada inferencia
+        self.lado_completo = lado_completo        # Lado máximo del frame completo (modo roi)
+        self.factor_roi = factor_roi              # Lado del recorte / extensión de ojos y boca
+        self.roi = None                           # (x0, y0, x1, y1) de la última inferencia o None
+        self._i_tamano = TAMANOS_ROI.index(320)
+        self._latencia = None
+        self._inferencias_tamano = 0
+
+        self.intervalo = 1
+        self.n_caras = 0
+        self._desde_inferencia = 0
+        self._previos = np.zeros_like(motor_metricas.puntos)
+        self._movimiento = 0.0
+        self._ear = None
+        self._ear_umbral = 0.25
+        self._ear_previo = None
+        self._tendencia = 0.0
+
+        self.frames_inferidos = 0
+        self.frames_seguidos = 0
+        self.fallos_seguimiento = 0
+        self.confirmaciones = 0
+        self.inferencias_roi = 0
+        self.fallos_roi = 0
+
+    def registrar_ear(self, ear, ear_umbral):
+        """Comunicar el EAR calculado en este frame (el menor si hay varias caras)"""
+        self._ear = ear if self._ear is None else min(self._ear, ear)
+        self._ear_umbral = ear_umbral
+
+    def _planificar(self):
+        """Ajustar el intervalo con el movimiento y la tendencia del EAR del frame anterior"""
+        ear, self._ear = self._ear, None
+        if ear is None:
+            self.intervalo = 1
+            return
+        if self._ear_previo is not None:
+            self._tendencia = 0.5 * self._tendencia + 0.5 * (ear - self._ear_previo)
+        self._ear_previo = ear
+
+        # Movimiento relativo al ancho del ojo izquierdo (independiente de la distancia a la cámara)
+        ancho_ojo = np.hypot(*((self.motor.puntos[0, 5] - self.motor.puntos[0, 4]) * self._escala))
+        movimiento = self._movimiento / ancho_ojo if ancho_ojo > 0 else float("inf")
+
+        if (ear < self._ear_umbral + self.margen_ear or abs(self._tendencia) > self.caida_ear
+                or movimiento > self.movimiento_alto):
+            self.intervalo = 1
+        elif movimiento > self.movimiento_medio:
+            self.intervalo = max(self.intervalo // 2, 1)
+        else:
+            self.intervalo = min(self.intervalo + 1, self.intervalo_max)
+
+    def procesar(self, frame, t=0.0):
+        """Obtener los puntos del frame BGR (instante t) en motor_metricas.puntos
+
+        Devuelve (n_caras, face_landmarks): los landmarks de MediaPipe de la
+        primera cara si se ejecutó FaceMesh, o None si los puntos vienen del
+        seguimiento óptico. Si FaceMesh recibió un recorte, esos landmarks
+        están normalizados respecto a `self.roi`; los de motor_metricas.puntos
+        siempre lo están respecto al frame completo. Con puerta de presencia
+        en modo espera, la mayoría de frames devuelven (0, None) sin FaceMesh.
+        """
+        if self.presencia is not None and not self.presencia.decidir(frame, t):
+            return 0, None
+        alto, ancho = frame.shape[:2]
+        self._escala = np.array([ancho, alto], np.float64)
+        gris = None
+        if self.intervalo_max > 1:
+            self._planificar()
+            t0 = self.instr.t()
+            gris = self.pool.convertir(f"gris{self._par_gris}", frame, cv2.COLOR_BGR2GRAY, canales=1)
+            self._par_gris ^= 1
+            t0 = self.instr.registrar("conversion", t0)
+
+            if self.n_caras and self._desde_inferencia < self.intervalo:
+                puntos = self.motor.puntos[:self.n_caras].reshape(-1, 2)
+                seguido = self.seguidor.seguir(gris, puntos)
+                self.instr.registrar("seguimiento", t0)
+                # Un EAR seguido cerca del umbral se confirma con FaceMesh en este frame
+                if seguido and (self.motor.calcular(n_caras=self.n_caras)[:, COL_EAR].min()
+                                >= self._ear_umbral + self.margen_ear):
+                    self._movimiento = self.seguidor.movimiento
+                    self._desde_inferencia += 1
+                    self.frames_seguidos += 1
+                    return self.n_caras, None
+                if seguido:
+                    self.confirmaciones += 1
+                else:
+                    self.fallos_seguimiento += 1
+
+        n_previas = self.n_caras
+        self._previos[:n_previas] = self.motor.puntos[:n_previas]
+        self.n_caras, face_landmarks = self._inferir(frame)
+        self.frames_inferidos += 1
+        self._desde_inferencia = 1
+        if self.presencia is not None:
+            self.presencia.resultado(self.n_caras > 0, t)
+        if not self.n_caras:
+            return 0, None
+
+        if gris is not None:
+            self.seguidor.iniciar(gris, self.motor.puntos[:self.n_caras].reshape(-1, 2))
+            if n_previas == self.n_caras:
+                desplazamiento = (self.motor.puntos[:self.n_caras] - self._previos[:self.n_caras]) * self._escala
+                self._movimiento = float(np.median(np.hypot(desplazamiento[..., 0], desplazamiento[..., 1])))
+            else:
+                self._movimiento = float("inf")
+        return self.n_caras, face_landmarks
+
+    def _facemesh(self, imagen, lado_max=None, nombre="completo"):
+        """Reducir (si hace falta), pasar a RGB y ejecutar FaceMesh; devuelve multi_face_landmarks"""
+        t0 = self.instr.t()
+        alto, ancho = imagen.shape[:2]
+        if lado_max and max(alto, ancho) > lado_max:
+            escala = lado_max / max(alto, ancho)
+            imagen = self.pool.redimensionar(f"reducida_{nombre}", imagen, max(round(ancho * escala), 1),
+                                             max(round(alto * escala), 1))
+        imagen_rgb = self.pool.convertir(f"rgb_{nombre}", imagen, cv2.COLOR_BGR2RGB)
+        t0 = self.instr.registrar("conversion", t0)
+        resultados = self.facemesh.process(solo_lectura(imagen_rgb))
+        self.instr.registrar("facemesh", t0)
+        return resultados.multi_face_landmarks
+
+    def _rect_roi(self):
+        """Cuadrado (lado múltiplo de 32, dentro del frame) que abarca la cara, o None"""
+        alto, ancho = int(self._escala[1]), int(self._escala[0])
+        p = self.motor.puntos[:self.n_caras].reshape(-1, 2) * self._escala
+        minimo, maximo = p.min(axis=0), p.max(axis=0)
+        cx, cy = (minimo + maximo) / 2.0
+        lado = int(min(np.ceil((maximo - minimo).max() * self.factor_roi / 32.0) * 32, ancho, alto))
+        if lado < 32:
+            return None
+        x0 = int(min(max(cx - lado / 2, 0), ancho - lado))
+        y0 = int(min(max(cy - lado / 2, 0), alto - lado))
+        return x0, y0, x0 + lado, y0 + lado
+
+    def _adaptar_tamano(self, segundos):
+        """Bajar o subir el lado del recorte según la latencia media de las inferencias"""
+        ms = segundos * 1000.0
+        self._latencia = ms if self._latencia is None else 0.8 * self._latencia + 0.2 * ms
+        self._inferencias_tamano += 1
+        if self._inferencias_tamano < 10:
+            return
+        if self._latencia > self.presupuesto_ms and self._i_tamano < len(TAMANOS_ROI) - 1:
+            self._i_tamano += 1
+        elif self._latencia < 0.5 * self.presupuesto_ms and self._i_tamano > 0:
+            self._i_tamano -= 1
+        else:
+            return
+        self._latencia = None
+        self._inferencias_tamano = 0
+
+    def _inferir(self, frame):
+        """FaceMesh en el recorte de la cara si es posible y, si no, en el frame completo"""
+        if self.usar_roi and self.n_caras:
+            rect = self._rect_roi()
+            if rect is not None:
+                x0, y0, x1, y1 = rect
+                t0 = time.perf_counter()
+                caras = self._facemesh(frame[y0:y1, x0:x1], TAMANOS_ROI[self._i_tamano], "roi")
+                self._adaptar_tamano(time.perf_counter() - t0)
+                self.inferencias_roi += 1
+                if caras:
+                    n = self.motor.extraer_caras(caras)
+                    # Coordenadas normalizadas del recorte → del frame completo
+                    puntos = self.motor.puntos[:n]
+                    puntos *= (x1 - x0, y1 - y0)
+                    puntos += (x0, y0)
+                    puntos /= self._escala
+                    self.roi = rect
+                    return n, caras[0]
+                self.fallos_roi += 1
+
+        self.roi = None
+        caras = self._facemesh(frame, self.lado_completo if self.usar_roi else None)
+        if not caras:
+            return 0, None
+        return self.motor.extraer_caras(caras), caras[0]
+
+    def resumen(self):
+        """Texto con la proporción de frames que ejecutaron FaceMesh"""
+        total = self.frames_inferidos + self.frames_seguidos
+        if not total:
+            return "FaceMesh: sin frames"
+        texto = (f"FaceMesh en {self.frames_inferidos}/{total} frames "
+                 f"({100.0 * self.frames_inferidos / total:.0f}%), "
+                 f"{self.fallos_seguimiento} fallos de seguimiento, "
+                 f"{self.confirmaciones} EAR confirmados con FaceMesh")
+        if self.usar_roi:
+            texto += (f"; recorte de cara en {self.inferencias_roi - self.fallos_roi} inferencias "
+                      f"({self.fallos_roi} vueltas al frame completo), "
+                      f"lado actual {TAMANOS_ROI[self._i_tamano]} px")
+        if self.presencia is not None:
+            texto += "\n" + self.presencia.resumen()
+        return texto
@@ -0,0 +1,448 @@
+# simulador_vehiculo.py - Vehículo simulado (software-in-the-loop) detrás de un pty
+# Reproduce en Python el temporizado y el estado de las tres tareas FreeRTOS
+# de pico_vehicle_control/src/main.c, para probar el camino de parada sin
+# hardware:
+#   - vBluetoothTask: la interrupción de recepción deja los bytes en un
+#     buffer circular de 64 B y despierta a la tarea, que decodifica las
+#     tramas (protocolo.py), actúa sobre los motores y devuelve la
+#     confirmación; fuera de una trama acepta el 'p' ASCII. Si pasan más de
+#     2 s sin otro 'p', vuelve a avanzar.
+#   - vMotorControlTask: cada 100 ms, parado si lo pidió el Bluetooth; si
+#     no, avanza con >= 20 cm libres y, con un obstáculo más cerca, hace la
+#     secuencia parar 200 ms, marcha atrás 400 ms, giro a la derecha 500 ms,
+#     parar 200 ms (sin mirar el Bluetooth mientras tanto, como el firmware).
+#   - vUltrasonicTask: una lectura de distancia (cm enteros) cada 100 ms.
+# La UART se modela a 9600 baudios 8N1 (~1 ms por byte) en los dos sentidos.
+# Con --firmware-sondeo se simula el firmware anterior: la tarea lee como
+# mucho un carácter cada 100 ms (salvo tras '\n' o '\r') con la FIFO
+# desactivada, un solo carácter de retención, de modo que lo que llega
+# mientras duerme se pierde (overrun); --fifo le da la FIFO de 32 bytes.
+#
+# El PC abre la ruta del pty como si fuera /dev/rfcomm0. Si se lanza el
+# detector desde aquí (tras '--'), se suscribe a su publicación en memoria
+# compartida y mide, por cada alerta, la latencia real desde el primer frame
+# con los ojos cerrados hasta la parada de los motores, además de los huecos
+# del latido y las reanudaciones indebidas durante una alerta.
+#
+# Uso:
+#   python simulador_vehiculo.py --obstaculo 10:15 --obstaculo 12:80
+#   python simulador_vehiculo.py -- python detector_original.py --fuente sesion.npz --tiempo-real --headless
+#   python simulador_vehiculo.py --firmware-sondeo -- python detector_original.py --fuente sesion.npz \
+#       --tiempo-real --headless --protocolo ascii
+
+import argparse
+import os
+import select
+import subprocess
+import sys
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from bluetooth import crear_pty, TIMEOUT_VEHICULO
+from protocolo import (codificar, DecodificadorTramas, PARAR, CONTINUAR, CONFIRMACION,
+                       ESTADO_PARADO, ESTADO_OBSTACULO, FRENTE, RE, GIRO_DERECHA, PARADO)
+from publicacion import SuscriptorMetricas
+from registro import episodios_alerta
+
+PERIODO_TAREA = 0.1             # vTaskDelay(pdMS_TO_TICKS(100)) de las tres tareas
+DISTANCIA_MINIMA = 20.0         # cm: por debajo, secuencia de desvío
+PROFUNDIDAD_FIFO = 32           # FIFO de recepción del RP2040 (desactivada en el firmware anterior)
+TAMANO_RX = 64                  # Buffer circular que llena la interrupción de recepción
+
+
+class VehiculoSimulado:
+    """Las tres tareas del firmware como hilos, conectadas al extremo maestro de un pty"""
+
+    def __init__(self, maestro, obstaculos=(), distancia_libre=100.0, fifo=False, baudios=9600, log=None,
+                 sondeo=False):
+        self.maestro = maestro
+        self.obstaculos = sorted(obstaculos)        # [(t relativo, cm)]
+        self.distancia_libre = distancia_libre
+        self.sondeo = sondeo
+        if sondeo:
+            self.profundidad = PROFUNDIDAD_FIFO if fifo else 1
+        else:
+            self.profundidad = TAMANO_RX
+        self.periodo_byte = 10.0 / baudios          # 8N1: 10 bits por carácter
+        self.log = log
+
+        self._parar = threading.Event()
+        self._hilos = []
+        self._rx = deque()
+        self._notificacion = threading.Event()      # vTaskNotifyGiveFromISR → ulTaskNotifyTake
+        self._tx = deque()
+        self._tx_pendiente = threading.Event()
+        self._decodificador = DecodificadorTramas(legado=True)
+        self._cerrojo_distancia = threading.Lock()  # xDistanceMutex
+        self._cerrojo_motores = threading.Lock()
+        self.t0 = None
+
+        # Estado del firmware
+        self.distancia = 0.0
+        self.parado_por_bluetooth = False
+        self.ultimo_parar = 0.0
+        self.motores = PARADO
+
+        # Eventos (time.time) y estadísticas
+        self.eventos = []               # (t, estado de los motores, causa) en cada cambio
+        self.paradas_bluetooth = []     # 'p' que paran un vehículo que no estaba parado por Bluetooth
+        self.comandos_p = []            # Instante de cada 'p' leído por la tarea
+        self.reanudaciones = []         # Timeouts de 2 s que vuelven a avanzar
+        self.bytes_recibidos = 0
+        self.overruns = 0
+        self.ignorados = 0
+        self.continuar = 0              # Tramas 'c' recibidas
+        self.confirmaciones = 0
+
+    def iniciar(self):
+        self.t0 = time.time()
+        bluetooth = self._tarea_bluetooth_sondeo if self.sondeo else self._tarea_bluetooth
+        for nombre, tarea in (("uart", self._linea_uart), ("uart_tx", self._linea_uart_tx),
+                              ("ultrasonido", self._tarea_ultrasonido),
+                              ("motor", self._tarea_motor), ("bluetooth", bluetooth)):
+            hilo = threading.Thread(target=tarea, name=nombre, daemon=True)
+            hilo.start()
+            self._hilos.append(hilo)
+        return self
+
+    def detener(self):
+        self._parar.set()
+        for hilo in self._hilos:
+            hilo.join(timeout=2.0)
+
+    def _printf(self, texto):
+        if self.log is not None:
+            self.log.write(texto + "\n")
+            self.log.flush()
+
+    def _retardo(self, segundos):
+        """vTaskDelay; devuelve True si hay que terminar"""
+        return self._parar.wait(segundos)
+
+    def _poner_motores(self, estado, causa):
+        with self._cerrojo_motores:
+            if estado != self.motores:
+                self.motores = estado
+                self.eventos.append((time.time(), estado, causa))
+
+    def distancia_en(self, t):
+        """Distancia al obstáculo del escenario en t (segundos desde el arranque)"""
+        distancia = self.distancia_libre
+        for t_obstaculo, cm in self.obstaculos:
+            if t_obstaculo > t:
+                break
+            distancia = cm
+        return distancia
+
+    def _linea_uart(self):
+        """Bytes del pty a 9600 baudios hacia el registro de recepción (overrun si está lleno)"""
+        t_linea = 0.0
+        while not self._parar.is_set():
+            if not select.select([self.maestro], [], [], PERIODO_TAREA)[0]:
+                continue
+            try:
+                datos = os.read(self.maestro, 256)
+            except OSError:
+                # Nadie tiene abierto el esclavo todavía
+                self._retardo(PERIODO_TAREA)
+                continue
+            for byte in datos:
+                t_linea = max(t_linea, time.monotonic()) + self.periodo_byte
+                espera = t_linea - time.monotonic()
+                if espera > 0:
+                    time.sleep(espera)
+                self.bytes_recibidos += 1
+                if len(self._rx) < self.profundidad:
+                    self._rx.append(byte)
+                else:
+                    self.overruns += 1
+                self._notificacion.set()
+
+    def _linea_uart_tx(self):
+        """Bytes de la UART hacia el pty a 9600 baudios (uart_write_blocking con FIFO)"""
+        t_linea = 0.0
+        while not self._parar.is_set():
+            if not self._tx:
+                self._tx_pendiente.wait(PERIODO_TAREA)
+                self._tx_pendiente.clear()
+                continue
+            byte = self._tx.popleft()
+            t_linea = max(t_linea, time.monotonic()) + self.periodo_byte
+            espera = t_linea - time.monotonic()
+            if espera > 0:
+                time.sleep(espera)
+            try:
+                os.write(self.maestro, bytes((byte,)))
+            except OSError:
+                pass
+
+    def _tarea_ultrasonido(self):
+        while not self._parar.is_set():
+            nueva = float(int(self.distancia_en(time.time() - self.t0)))   # getCm devuelve cm enteros
+            with self._cerrojo_distancia:
+                self.distancia = nueva
+            self._printf(f"[Ultrasonic] Leitura: {nueva:.2f} cm")
+            if self._retardo(PERIODO_TAREA):
+                return
+
+    def _tarea_motor(self):
+        while not self._parar.is_set():
+            if self.parado_por_bluetooth:
+                self._printf("[Motor] Desativado pelo Bluetooth")
+                self._poner_motores(PARADO, "bluetooth")
+                self._retardo(PERIODO_TAREA)
+                continue
+
+            with self._cerrojo_distancia:
+                distancia = self.distancia
+            if distancia >= DISTANCIA_MINIMA:
+                self._printf("[Motor] Livre - andando para frente")
+                self._poner_motores(FRENTE, "libre")
+            elif distancia > 0:
+                self._printf("[Motor] Obstáculo detectado - desviando")
+                self._poner_motores(PARADO, "obstaculo")
+                self._retardo(0.2)
+                self._printf("[Motor] Ré")
+                self._poner_motores(RE, "obstaculo")
+                self._retardo(0.4)
+                self._printf("[Motor] Gira para a direita")
+                self._poner_motores(GIRO_DERECHA, "obstaculo")
+                self._retardo(0.5)
+                self._printf("[Motor] Parando após desvio")
+                self._poner_motores(PARADO, "obstaculo")
+                self._retardo(0.2)
+            else:
+                self._printf("[Motor] Sem leitura de distância válida")
+                self._poner_motores(PARADO, "sin_lectura")
+            self._retardo(PERIODO_TAREA)
+
+    def _parar_por_bluetooth(self):
+        ahora = time.time()
+        if not self.parado_por_bluetooth:
+            self.paradas_bluetooth.append(ahora)
+        self.parado_por_bluetooth = True
+        self._poner_motores(PARADO, "bluetooth")
+        self.ultimo_parar = ahora
+        self.comandos_p.append(ahora)
+
+    def _comprobar_timeout(self):
+        if self.parado_por_bluetooth and time.time() - self.ultimo_parar > TIMEOUT_VEHICULO:
+            self._poner_motores(FRENTE, "timeout")
+            self.parado_por_bluetooth = False
+            self.reanudaciones.append(time.time())
+            self._printf("[Bluetooth] Timeout → CONTINUAR")
+
+    def estado(self):
+        """Campo `dato` de las confirmaciones (estado_veiculo() del firmware)"""
+        with self._cerrojo_distancia:
+            distancia = self.distancia
+        obstaculo = 0 < distancia < DISTANCIA_MINIMA
+        return (ESTADO_PARADO if self.parado_por_bluetooth else 0) | (ESTADO_OBSTACULO if obstaculo else 0)
+
+    def _procesar_trama(self, trama):
+        if trama.seq is None:
+            # 'p' ASCII fuera de una trama (protocolo anterior): sin confirmación
+            self._parar_por_bluetooth()
+            self._printf("[Bluetooth] PARAR recebido")
+            return
+        if trama.comando == PARAR:
+            self._parar_por_bluetooth()
+            self._printf(f"[Bluetooth] PARAR recebido (seq {trama.seq})")
+        elif trama.comando == CONTINUAR:
+            self.parado_por_bluetooth = False
+            self.continuar += 1
+            self._printf(f"[Bluetooth] CONTINUAR recebido (seq {trama.seq})")
+        else:
+            self.ignorados += 1
+            self._printf(f"[Bluetooth] Comando desconhecido: {chr(trama.comando)}")
+            return
+        # Confirmación después de actuar, con el seq y la marca de tiempo recibidos
+        self._tx.extend(codificar(CONFIRMACION, trama.seq, trama.t_us, self.estado()))
+        self._tx_pendiente.set()
+        self.confirmaciones += 1
+
+    def _tarea_bluetooth(self):
+        while not self._parar.is_set():
+            # ulTaskNotifyTake(pdTRUE, 100 ms): despierta con la interrupción o para el timeout
+            self._notificacion.wait(PERIODO_TAREA)
+            self._notificacion.clear()
+            while self._rx:
+                byte = self._rx.popleft()
+                ignorados, errores = self._decodificador.ignorados, self._decodificador.errores_crc
+                for trama in self._decodificador.alimentar((byte,)):
+                    self._procesar_trama(trama)
+                if self._decodificador.ignorados > ignorados:
+                    self.ignorados += 1
+                    self._printf(f"[Bluetooth] Ignorado: {chr(byte)}")
+                elif self._decodificador.errores_crc > errores:
+                    self._printf("[Bluetooth] Trama com CRC inválido descartada")
+            self._comprobar_timeout()
+
+    def _tarea_bluetooth_sondeo(self):
+        """vBluetoothTask del firmware anterior: un carácter cada 100 ms"""
+        while not self._parar.is_set():
+            if self._rx:
+                c = chr(self._rx.popleft())
+                if c in "\n\r":
+                    continue
+                if c == "p":
+                    self._parar_por_bluetooth()
+                    self._printf("[Bluetooth] PARAR recebido")
+                else:
+                    self.ignorados += 1
+                    self._printf(f"[Bluetooth] Ignorado: {c}")
+
+            self._comprobar_timeout()
+            self._retardo(PERIODO_TAREA)
+
+    def resumen(self):
+        """Líneas con los comandos recibidos, pérdidas en la UART y cambios de los motores"""
+        lineas = [
+            f"UART: {self.bytes_recibidos} bytes, {self.overruns} perdidos por overrun "
+            f"(recepción de {self.profundidad} B), {self.ignorados} caracteres ignorados",
+            f"Bluetooth: {len(self.comandos_p)} 'p' leídos, {len(self.paradas_bluetooth)} paradas, "
+            f"{len(self.reanudaciones)} reanudaciones por timeout",
+        ]
+        if not self.sondeo:
+            lineas.append(f"Tramas: {self._decodificador.tramas} válidas, {self._decodificador.errores_crc} "
+                          f"con CRC incorrecto, {self.continuar} 'c', {self.confirmaciones} confirmaciones enviadas")
+        if len(self.comandos_p) > 1:
+            huecos = np.diff(self.comandos_p)
+            lineas.append(f"Intervalo entre 'p': mediana {np.median(huecos):.2f}s, máximo {huecos.max():.2f}s")
+        cambios = {}
+        for _, estado, causa in self.eventos:
+            cambios[(estado, causa)] = cambios.get((estado, causa), 0) + 1
+        lineas.append("Motores: " + ", ".join(f"{estado} ({causa}) x{n}" for (estado, causa), n in cambios.items()))
+        return lineas
+
+
+def medir_latencias(registros, vehiculo):
+    """Por cada alerta publicada: cierre de ojos → parada, alerta → parada y reanudaciones indebidas
+
+    `registros` son los frames publicados por el detector (array
+    DTYPE_PUBLICACION) con reloj real, comparable con los eventos del vehículo.
+    """
+    paradas = np.asarray(vehiculo.paradas_bluetooth)
+    reanudaciones = np.asarray(vehiculo.reanudaciones)
+
+    episodios = []
+    for t_cierre, t_alerta, t_fin in episodios_alerta(registros).tolist():
+        siguientes = paradas[paradas >= t_alerta] if len(paradas) else paradas
+        t_parada = float(siguientes[0]) if len(siguientes) else None
+        indebidas = int(np.count_nonzero((reanudaciones > t_alerta) & (reanudaciones <= t_fin)))
+        episodios.append({
+            "t_alerta": t_alerta,
+            "duracion_alerta": t_fin - t_alerta,
+            "cierre_a_parada": None if np.isnan(t_cierre) or t_parada is None else t_parada - t_cierre,
+            "alerta_a_parada": None if t_parada is None else t_parada - t_alerta,
+            "reanudaciones_indebidas": indebidas,
+        })
+    return episodios
+
+
+def analizar_obstaculo(texto):
+    """T:CM → (segundos, cm)"""
+    try:
+        t, cm = texto.split(":")
+        return float(t), float(cm)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Obstáculo inválido '{texto}' (T:CM, p. ej. 10:15)")
+
+
+def ejecutar_detector(comando, ruta, vehiculo):
+    """Lanzar el detector contra el pty y recoger sus frames publicados hasta que termine"""
+    nombre = f"fatiga_sil_{os.getpid()}"
+    proceso = subprocess.Popen(comando + ["--puerto-bt", ruta, "--publicar", nombre], stdin=subprocess.DEVNULL)
+    suscriptor = None
+    lotes = []
+    while True:
+        terminado = proceso.poll() is not None
+        if suscriptor is None:
+            try:
+                suscriptor = SuscriptorMetricas(nombre, desde_inicio=True)
+            except (FileNotFoundError, ValueError):
+                # El detector aún no ha creado (o inicializado) la publicación
+                if terminado:
+                    break
+                time.sleep(0.05)
+                continue
+        lotes.append(suscriptor.esperar(timeout=0.2))
+        if terminado and not suscriptor.activo and suscriptor.escrito < suscriptor.siguiente:
+            break
+    if suscriptor is None:
+        print("[ADVERTENCIA] El detector no publicó ningún frame (¿admite --publicar?)")
+        return None
+    print(f"[INFO] Frames del detector: {suscriptor.recibidos} (perdidos {suscriptor.perdidos})")
+    suscriptor.cerrar()
+    return np.concatenate(lotes) if lotes else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vehículo simulado (firmware de la Pico) sobre un pty")
+    parser.add_argument("--obstaculo", type=analizar_obstaculo, action="append", default=[],
+                        help="T:CM, distancia al obstáculo desde T segundos (se puede repetir)")
+    parser.add_argument("--distancia-libre", type=float, default=100.0,
+                        help="distancia medida sin obstáculos (cm)")
+    parser.add_argument("--firmware-sondeo", action="store_true",
+                        help="simular el firmware anterior (un carácter cada 100 ms, sin tramas)")
+    parser.add_argument("--fifo", action="store_true",
+                        help="con --firmware-sondeo, simular la FIFO de recepción de 32 bytes")
+    parser.add_argument("--log", default=None,
+                        help="escribir aquí los printf del firmware ('-' = consola)")
+    parser.add_argument("--duracion", type=float, default=None,
+                        help="segundos de simulación sin detector (por defecto, hasta Ctrl+C)")
+    parser.add_argument("comando", nargs=argparse.REMAINDER,
+                        help="tras '--', detector a lanzar contra el pty (se añaden --puerto-bt y --publicar)")
+    args = parser.parse_args()
+    comando = args.comando[1:] if args.comando[:1] == ["--"] else args.comando
+
+    maestro, ruta = crear_pty()
+    log = None
+    if args.log == "-":
+        log = sys.stdout
+    elif args.log:
+        log = open(args.log, "w")
+    vehiculo = VehiculoSimulado(maestro, args.obstaculo, args.distancia_libre, args.fifo, log=log,
+                                sondeo=args.firmware_sondeo).iniciar()
+    print(f"[INFO] Vehículo simulado en {ruta} (usar como --puerto-bt)")
+
+    registros = None
+    try:
+        if comando:
+            registros = ejecutar_detector(comando, ruta, vehiculo)
+            time.sleep(TIMEOUT_VEHICULO + 2 * PERIODO_TAREA)   # Dejar que venza el último timeout
+        elif args.duracion is not None:
+            time.sleep(args.duracion)
+        else:
+            while True:
+                time.sleep(1.0)
+    except KeyboardInterrupt:
+        pass
+    vehiculo.detener()
+    if log is not None and log is not sys.stdout:
+        log.close()
+
+    print("\n" + "=" * 70)
+    print("RESUMEN DEL VEHÍCULO SIMULADO:")
+    for linea in vehiculo.resumen():
+        print(linea)
+    if registros is not None and len(registros):
+        episodios = medir_latencias(registros, vehiculo)
+        print(f"Alertas del detector: {len(episodios)}")
+        for i, e in enumerate(episodios):
+            cierre = "-" if e["cierre_a_parada"] is None else f"{1000 * e['cierre_a_parada']:.0f} ms"
+            alerta = "sin parada" if e["alerta_a_parada"] is None else f"{1000 * e['alerta_a_parada']:.0f} ms"
+            print(f"  {i + 1}: cierre→parada {cierre}, alerta→parada {alerta}, "
+                  f"alerta de {e['duracion_alerta']:.1f}s, {e['reanudaciones_indebidas']} reanudaciones indebidas")
+        latencias = [e["cierre_a_parada"] for e in episodios if e["cierre_a_parada"] is not None]
+        if latencias:
+            print(f"Cierre de ojos → parada: media {1000 * np.mean(latencias):.0f} ms, "
+                  f"máx {1000 * np.max(latencias):.0f} ms")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,318 @@
+# supervisor.py - Varias cabinas (cámara + conductor + vehículo) en un solo PC
+# Un proceso trabajador por cámara, cada uno con su FaceMesh, su máquina de
+# estados y su núcleo de CPU (afinidad fija, OpenCV/MediaPipe a un hilo), de
+# modo que el throughput escala con los núcleos sin que los trabajadores
+# compitan entre sí. Los trabajadores no envían nada por frame: solo los
+# cambios de alerta (al instante) y un estado resumido cada segundo, por una
+# multiprocessing.Queue. El supervisor reparte los comandos de parada al
+# enlace Bluetooth de cada vehículo (un DespachadorBluetooth por cabina) y
+# relanza con espera exponencial los trabajadores que terminan con error.
+#
+# Uso:
+#   python supervisor.py --cabina 0,/dev/rfcomm0 --cabina 2,/dev/rfcomm1,ana
+#   (FUENTE,PUERTO[,CONDUCTOR]; la fuente admite lo mismo que --fuente)
+
+import argparse
+import os
+import queue
+import signal
+import time
+from collections import namedtuple
+import multiprocessing
+
+import cv2
+
+from adaptacion import crear_adaptacion
+from bluetooth import DespachadorBluetooth
+from calibracion import cargar_config
+from captura import crear_captura
+from estado_fatiga import MaquinaEstadoFatiga, MODO_ORIGINAL
+from fuentes import abrir_fuente, RelojReal
+from metricas import MotorMetricas, COL_EAR, COL_MAR
+from presencia import DetectorPresencia
+from seguimiento import InferenciaEspaciada
+
+Cabina = namedtuple("Cabina", ["fuente", "puerto", "conductor"])
+
+# Mensajes trabajador → supervisor: (tipo, índice de cabina, datos...)
+MENSAJE_ALERTA = "alerta"       # (tipo, i, alerta, t_inicio_cierre o None)
+MENSAJE_ESTADO = "estado"       # (tipo, i, dict con frames, fps, ear, mar, cara, pestaneos)
+MENSAJE_FIN = "fin"             # (tipo, i, dict de resumen); fin normal de una fuente grabada
+
+CODIGO_FALLO_CAMARA = 3         # La cámara en vivo dejó de dar frames: se relanza
+PERIODO_ESTADO = 1.0
+
+
+def trabajador(indice, cabina, opciones, cola, parar):
+    """Proceso de una cabina: captura, FaceMesh y máquina de estados; informa por `cola`"""
+    # El supervisor detiene a los trabajadores con `parar`, no con Ctrl+C
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    nucleo = opciones["nucleos"][indice % len(opciones["nucleos"])] if opciones["nucleos"] else None
+    if nucleo is not None and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, {nucleo})
+    os.environ["OMP_NUM_THREADS"] = "1"
+    cv2.setNumThreads(1)
+    import mediapipe as mp  # Cada trabajador carga su propio MediaPipe
+
+    fuente = abrir_fuente(cabina.fuente, tiempo_real=opciones["tiempo_real"])
+    if not fuente.isOpened():
+        print(f"[ERROR] Cabina {indice}: no se puede abrir la fuente {cabina.fuente}")
+        raise SystemExit(CODIGO_FALLO_CAMARA)
+    captura = crear_captura(fuente, parar_si_falla=True)
+    reloj_real = isinstance(captura.reloj, RelojReal)
+
+    ear_umbral, mar_umbral, tiempo_alerta = 0.25, 0.2, 1.5
+    if opciones["config"]:
+        ear_umbral, mar_umbral, tiempo_alerta = cargar_config(opciones["config"])
+    maquina = MaquinaEstadoFatiga(ear_umbral, mar_umbral, tiempo_alerta, modo=MODO_ORIGINAL)
+    adaptacion = crear_adaptacion(cabina.conductor, opciones["perfiles"])
+    motor = MotorMetricas(max_caras=1)
+
+    with mp.solutions.face_mesh.FaceMesh(min_detection_confidence=0.5,
+                                         min_tracking_confidence=0.5) as facemesh:
+        puerta = DetectorPresencia() if opciones["presencia"] else None
+        inferencia = InferenciaEspaciada(facemesh, motor, intervalo_max=opciones["intervalo_max"],
+                                         roi=opciones["roi"], presencia=puerta)
+        alerta_previa = False
+        alertas = 0
+        frames = 0
+        frames_periodo = 0
+        ear = mar = 0.0
+        n_caras = 0
+        t_inicio = t_estado = time.perf_counter()
+        while captura.activa and not parar.is_set():
+            frame_capturado = captura.leer()
+            if frame_capturado is None:
+                continue
+            t_frame = frame_capturado.t_captura
+            if frame_capturado.puntos is not None:
+                motor.puntos[0] = frame_capturado.puntos
+                n_caras = 1
+            else:
+                n_caras, _ = inferencia.procesar(frame_capturado.imagen, t_frame)
+
+            alerta = False
+            if n_caras:
+                metricas = motor.calcular(n_caras=1)
+                ear, mar = float(metricas[0, COL_EAR]), float(metricas[0, COL_MAR])
+                inferencia.registrar_ear(ear, maquina.ear_umbral)
+                adaptacion.actualizar(t_frame, ear, mar, maquina)
+                alerta = maquina.actualizar(t_frame, ear, mar)
+            if alerta != alerta_previa:
+                t_cierre = maquina.t_inicio_cierre if alerta and reloj_real and maquina.cerrado else None
+                cola.put((MENSAJE_ALERTA, indice, alerta, t_cierre))
+                alertas += alerta
+                alerta_previa = alerta
+
+            frames += 1
+            frames_periodo += 1
+            ahora = time.perf_counter()
+            if ahora - t_estado >= PERIODO_ESTADO:
+                cola.put((MENSAJE_ESTADO, indice, {
+                    "frames": frames, "fps": frames_periodo / (ahora - t_estado), "ear": ear, "mar": mar,
+                    "cara": n_caras > 0, "pestaneos": maquina.pestaneos,
+                }))
+                frames_periodo = 0
+                t_estado = ahora
+
+    captura.detener()
+    fuente.release()
+    adaptacion.cerrar()
+    if alerta_previa:
+        cola.put((MENSAJE_ALERTA, indice, False, None))
+    duracion = time.perf_counter() - t_inicio
+    if fuente.es_en_vivo and not parar.is_set():
+        print(f"[ERROR] Cabina {indice}: la cámara dejó de dar frames")
+        raise SystemExit(CODIGO_FALLO_CAMARA)
+    cola.put((MENSAJE_FIN, indice, {
+        "frames": frames, "fps": frames / duracion if duracion > 0 else 0.0,
+        "alertas": alertas, "pestaneos": maquina.pestaneos,
+    }))
+
+
+class Supervisor:
+    """Lanza un trabajador por cabina, enruta sus alertas y relanza los que fallan"""
+
+    def __init__(self, cabinas, opciones, backoff_inicial=1.0, backoff_max=30.0, periodo_informe=10.0):
+        self.cabinas = cabinas
+        self.opciones = opciones
+        self.backoff_inicial = backoff_inicial
+        self.backoff_max = backoff_max
+        self.periodo_informe = periodo_informe
+        # spawn: cada trabajador arranca limpio (sin hilos ni estado de MediaPipe heredados)
+        self._contexto = multiprocessing.get_context("spawn")
+        self.cola = self._contexto.Queue()
+        self.parar = self._contexto.Event()
+        self.despachadores = [DespachadorBluetooth(c.puerto).iniciar() for c in cabinas]
+
+        n = len(cabinas)
+        self.procesos = [None] * n
+        self.terminada = [False] * n
+        self.reinicios = [0] * n
+        self.alertas = [0] * n
+        self.estado = [{} for _ in range(n)]
+        self.resumenes = [None] * n
+        self._backoff = [backoff_inicial] * n
+        self._relanzar_en = [None] * n
+        self._t_lanzado = [0.0] * n
+
+    def _lanzar(self, i):
+        proceso = self._contexto.Process(target=trabajador, name=f"cabina{i}",
+                                         args=(i, self.cabinas[i], self.opciones, self.cola, self.parar),
+                                         daemon=True)
+        proceso.start()
+        self.procesos[i] = proceso
+        self._t_lanzado[i] = time.monotonic()
+        self._relanzar_en[i] = None
+
+    def _atender(self, mensaje):
+        tipo, i = mensaje[0], mensaje[1]
+        if tipo == MENSAJE_ALERTA:
+            alerta, t_cierre = mensaje[2], mensaje[3]
+            self.despachadores[i].actualizar_parada(alerta, t_cierre)
+            if alerta:
+                self.alertas[i] += 1
+                print(f"[ALERTA] Cabina {i} ({self.cabinas[i].puerto}): fatiga detectada, parando vehículo")
+        elif tipo == MENSAJE_ESTADO:
+            self.estado[i] = mensaje[2]
+        elif tipo == MENSAJE_FIN:
+            self.resumenes[i] = mensaje[2]
+            self.terminada[i] = True
+
+    def _vigilar(self, ahora):
+        """Relanzar los trabajadores que murieron sin terminar su fuente"""
+        for i, proceso in enumerate(self.procesos):
+            if self.terminada[i] or proceso is None:
+                continue
+            if self._relanzar_en[i] is not None:
+                if ahora >= self._relanzar_en[i]:
+                    self.reinicios[i] += 1
+                    print(f"[INFO] Relanzando cabina {i} (reinicio {self.reinicios[i]})")
+                    self._lanzar(i)
+                continue
+            if proceso.is_alive() or proceso.exitcode == 0:
+                continue        # Salida limpia: su mensaje de fin aún está en la cola
+            # Caída: sin alerta hacia el vehículo mientras no haya trabajador
+            self.despachadores[i].actualizar_parada(False)
+            if ahora - self._t_lanzado[i] > 60.0:
+                self._backoff[i] = self.backoff_inicial
+            print(f"[ADVERTENCIA] Cabina {i} terminó con código {proceso.exitcode}; "
+                  f"reintento en {self._backoff[i]:.1f}s")
+            self._relanzar_en[i] = ahora + self._backoff[i]
+            self._backoff[i] = min(self._backoff[i] * 2, self.backoff_max)
+
+    def _informar(self):
+        for i, estado in enumerate(self.estado):
+            if not estado or self.terminada[i]:
+                continue
+            cara = f"EAR {estado['ear']:.3f}, MAR {estado['mar']:.3f}" if estado["cara"] else "sin conductor"
+            print(f"[INFO] Cabina {i}: {estado['fps']:.1f} FPS, {cara}, "
+                  f"{self.alertas[i]} alertas, {self.reinicios[i]} reinicios")
+
+    def ejecutar(self):
+        """Bucle del supervisor hasta que todas las fuentes terminan o Ctrl+C"""
+        for i in range(len(self.cabinas)):
+            self._lanzar(i)
+        t_informe = time.monotonic()
+        try:
+            while not all(self.terminada):
+                try:
+                    self._atender(self.cola.get(timeout=0.2))
+                    while True:
+                        self._atender(self.cola.get_nowait())
+                except queue.Empty:
+                    pass
+                ahora = time.monotonic()
+                self._vigilar(ahora)
+                if ahora - t_informe >= self.periodo_informe:
+                    self._informar()
+                    t_informe = ahora
+        except KeyboardInterrupt:
+            print("\n[INFO] Deteniendo cabinas...")
+        self.detener()
+
+    def detener(self):
+        """Parar trabajadores y enlaces Bluetooth"""
+        self.parar.set()
+        for proceso in self.procesos:
+            if proceso is not None:
+                proceso.join(timeout=5.0)
+                if proceso.is_alive():
+                    proceso.terminate()
+        while True:
+            try:
+                self._atender(self.cola.get_nowait())
+            except queue.Empty:
+                break
+        for despachador in self.despachadores:
+            despachador.actualizar_parada(False)
+            despachador.detener()
+
+    def resumen(self):
+        """Líneas de resumen por cabina y throughput total"""
+        lineas = []
+        total = 0.0
+        for i, cabina in enumerate(self.cabinas):
+            r = self.resumenes[i] or self.estado[i]
+            fps = r.get("fps", 0.0)
+            total += fps
+            lineas.append(f"Cabina {i} ({cabina.fuente} → {cabina.puerto}): {r.get('frames', 0)} frames, "
+                          f"{fps:.1f} FPS, {self.alertas[i]} alertas, {self.reinicios[i]} reinicios")
+        lineas.append(f"Throughput total: {total:.1f} FPS en {len(self.cabinas)} procesos")
+        return lineas
+
+
+def analizar_cabina(texto):
+    """FUENTE,PUERTO[,CONDUCTOR] → Cabina"""
+    partes = texto.split(",")
+    if len(partes) not in (2, 3):
+        raise argparse.ArgumentTypeError(f"Cabina inválida '{texto}' (FUENTE,PUERTO[,CONDUCTOR])")
+    return Cabina(partes[0], partes[1], partes[2] if len(partes) == 3 else None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Supervisor de varias cabinas (un proceso por cámara)")
+    parser.add_argument("--cabina", type=analizar_cabina, action="append", required=True,
+                        help="FUENTE,PUERTO[,CONDUCTOR]; se puede repetir")
+    parser.add_argument("--nucleos", default=None,
+                        help="núcleos de CPU para los trabajadores, p. ej. 2,3,4,5 "
+                             "(por defecto, los disponibles en orden; 'no' = sin afinidad)")
+    parser.add_argument("--tiempo-real", action="store_true",
+                        help="reproducir fuentes grabadas a su ritmo real")
+    parser.add_argument("--intervalo-max", type=int, default=1)
+    parser.add_argument("--roi", action="store_true")
+    parser.add_argument("--presencia", action="store_true")
+    parser.add_argument("--config", default=None,
+                        help="umbrales EAR/MAR y tiempo de alerta generados por calibracion.py")
+    parser.add_argument("--perfiles", default="perfiles", help="directorio de perfiles de conductor")
+    args = parser.parse_args()
+
+    if args.nucleos == "no":
+        nucleos = None
+    elif args.nucleos:
+        nucleos = [int(n) for n in args.nucleos.split(",")]
+    else:
+        nucleos = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else None
+    opciones = {
+        "nucleos": nucleos, "tiempo_real": args.tiempo_real, "intervalo_max": args.intervalo_max,
+        "roi": args.roi, "presencia": args.presencia, "config": args.config, "perfiles": args.perfiles,
+    }
+    if nucleos and len(nucleos) < len(args.cabina):
+        print(f"[ADVERTENCIA] {len(args.cabina)} cabinas y {len(nucleos)} núcleos: "
+              "varios trabajadores compartirán núcleo")
+
+    print("=" * 70)
+    print(f"SUPERVISOR DE CABINAS: {len(args.cabina)} trabajadores")
+    print("=" * 70)
+    supervisor = Supervisor(args.cabina, opciones)
+    supervisor.ejecutar()
+
+    print("\n" + "=" * 70)
+    print("RESUMEN DEL SUPERVISOR:")
+    for linea in supervisor.resumen():
+        print(linea)
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    main()
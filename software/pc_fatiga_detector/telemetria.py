@@ -0,0 +1,492 @@
+# telemetria.py - Telemetría del vehículo a partir de los printf del firmware
+# El firmware informa de su estado solo con printf por el USB (stdio):
+# "[Ultrasonic] Leitura: %.2f cm" en cada lectura, una línea "[Motor] ..." en
+# cada vuelta de la tarea de los motores y "[Bluetooth] ..." al recibir
+# comandos. El colector lee ese flujo (puerto /dev/ttyACM0 o un pty, p. ej.
+# el --log del simulador) y lo convierte en muestras con instante:
+#   - Distancia: (t, cm) de cada lectura del ultrasonido.
+#   - Motores: (t, estado, origen) de cada línea que fija el estado de los
+#     motores, incluidas las paradas y reanudaciones de vBluetoothTask.
+#   - Eventos del Bluetooth: parar, continuar, timeout, tramas con CRC malo y
+#     bytes perdidos con el buffer de recepción lleno (overrun).
+# Cada serie se guarda en un anillo NumPy de tamaño fijo (la memoria no crece
+# con la duración) y las consultas devuelven arrays estructurados.
+#
+# El análisis es incremental y sin expresiones regulares: los bloques leídos
+# se parten por '\n' (el resto incompleto espera al siguiente bloque), las
+# líneas fijas de los motores se resuelven con un diccionario y los números de
+# las lecturas se convierten de golpe, con NumPy, para todo el bloque. Las
+# líneas llevan el instante (time.time) de llegada de su bloque, así que se
+# pueden alinear con los frames del detector (--registro o --suscribir):
+# para cada alerta, cuánto tardó en pararse el vehículo y cuánto se acercó al
+# obstáculo mientras tanto.
+#
+# Uso:
+#   python telemetria.py /dev/ttyACM0 --suscribir fatiga
+#   python telemetria.py --pty            (y python simulador_vehiculo.py --log RUTA_DEL_PTY)
+
+import argparse
+import os
+import select
+import threading
+import time
+
+import numpy as np
+import serial
+
+from bluetooth import crear_pty
+from protocolo import FRENTE, RE, GIRO_DERECHA, PARADO
+from publicacion import SuscriptorMetricas
+from registro import episodios_alerta, leer_registro
+
+PUERTO_POR_DEFECTO = "/dev/ttyACM0"     # stdio USB de la Pico
+CAPACIDAD = 1 << 16                     # Muestras por serie (~1,8 h a 10 Hz, ~65 s a 1 kHz)
+
+ESTADOS_MOTOR = (PARADO, FRENTE, RE, GIRO_DERECHA)
+CODIGO_PARADO, CODIGO_FRENTE, CODIGO_RE, CODIGO_GIRO = range(len(ESTADOS_MOTOR))
+DESCONOCIDO = 255                       # Estado antes de la primera muestra
+ORIGEN_MOTOR = 0                        # vMotorControlTask
+ORIGEN_BLUETOOTH = 1                    # vBluetoothTask (parar / timeout) y motores desactivados por ella
+
+EVENTOS = ("parar", "continuar", "timeout", "crc", "overrun")
+EVENTO_PARAR, EVENTO_CONTINUAR, EVENTO_TIMEOUT, EVENTO_CRC, EVENTO_OVERRUN = range(len(EVENTOS))
+
+DTYPE_DISTANCIA = np.dtype([("t", "<f8"), ("cm", "<f4")])
+DTYPE_MOTOR = np.dtype([("t", "<f8"), ("estado", "u1"), ("origen", "u1")])
+DTYPE_EVENTO = np.dtype([("t", "<f8"), ("evento", "u1"), ("seq", "<i4")])     # seq -1: sin trama
+# En los eventos "overrun", seq es el total de bytes descartados desde el arranque
+
+# Una fila por alerta del detector alineada con la telemetría (NaN si no hay dato)
+DTYPE_ALINEACION = np.dtype([
+    ("t_alerta", "<f8"),
+    ("t_parada", "<f8"),                # Primera parada por Bluetooth desde la alerta
+    ("cierre_a_parada", "<f8"),
+    ("alerta_a_parada", "<f8"),
+    ("distancia_alerta", "<f4"),        # cm al obstáculo en la alerta y en la parada
+    ("distancia_parada", "<f4"),
+    ("acercamiento", "<f4"),            # distancia_alerta - distancia_parada
+    ("avance_estimado", "<f4"),         # Tiempo hacia delante (menos marcha atrás) × velocidad
+])
+
+PREFIJO_ULTRASONIDO = b"[Ultrasonic] Leitura: "
+SUFIJO_ULTRASONIDO = b" cm"
+PREFIJO_BLUETOOTH = b"[Bluetooth] "
+
+# printf de main.c que fijan el estado de los motores
+LINEAS_MOTOR = {
+    "[Motor] Desativado pelo Bluetooth": (PARADO, ORIGEN_BLUETOOTH),
+    "[Motor] Livre - andando para frente": (FRENTE, ORIGEN_MOTOR),
+    "[Motor] Obstáculo detectado - desviando": (PARADO, ORIGEN_MOTOR),
+    "[Motor] Ré": (RE, ORIGEN_MOTOR),
+    "[Motor] Gira para a direita": (GIRO_DERECHA, ORIGEN_MOTOR),
+    "[Motor] Parando após desvio": (PARADO, ORIGEN_MOTOR),
+    "[Motor] Sem leitura de distância válida": (PARADO, ORIGEN_MOTOR),
+}
+_LINEAS_MOTOR = {linea.encode(): (ESTADOS_MOTOR.index(estado), origen)
+                 for linea, (estado, origen) in LINEAS_MOTOR.items()}
+_PARAR = b"PARAR recebido"
+_CONTINUAR = b"CONTINUAR recebido"
+_TIMEOUT = "Timeout → CONTINUAR".encode()
+_CRC = "Trama com CRC inválido descartada".encode()
+_OVERRUN = b"Buffer RX cheio: "
+_SUFIJO_OVERRUN = b" bytes descartados"
+
+
+class AnilloMuestras:
+    """Anillo NumPy de tamaño fijo; las muestras más antiguas se sobrescriben"""
+
+    def __init__(self, dtype, capacidad=CAPACIDAD):
+        self.capacidad = capacidad
+        self._datos = np.zeros(capacidad, dtype)
+        self.total = 0                  # Muestras añadidas desde el inicio
+
+    def __len__(self):
+        return min(self.total, self.capacidad)
+
+    @property
+    def sobrescritas(self):
+        return max(self.total - self.capacidad, 0)
+
+    def agregar(self, lote):
+        """Añadir un array de muestras (del dtype del anillo) de una vez"""
+        n = len(lote)
+        if n > self.capacidad:
+            lote = lote[-self.capacidad:]
+            self.total += n - self.capacidad
+            n = self.capacidad
+        inicio = self.total % self.capacidad
+        primero = min(n, self.capacidad - inicio)
+        self._datos[inicio:inicio + primero] = lote[:primero]
+        self._datos[:n - primero] = lote[primero:]
+        self.total += n
+
+    def datos(self):
+        """Copia de las muestras en orden de llegada"""
+        if self.total <= self.capacidad:
+            return self._datos[:self.total].copy()
+        inicio = self.total % self.capacidad
+        return np.concatenate((self._datos[inicio:], self._datos[:inicio]))
+
+
+class Telemetria:
+    """Series de distancia, motores y eventos del Bluetooth, con consultas por tiempo
+
+    alimentar() la llama el hilo del colector y las consultas cualquier otro,
+    así que ambas pasan por un cerrojo.
+    """
+
+    def __init__(self, capacidad=CAPACIDAD):
+        self.distancia = AnilloMuestras(DTYPE_DISTANCIA, capacidad)
+        self.motores = AnilloMuestras(DTYPE_MOTOR, capacidad)
+        self.eventos = AnilloMuestras(DTYPE_EVENTO, capacidad)
+        self._cerrojo = threading.Lock()
+        self._resto = b""
+        self.lineas = 0
+        self.ignoradas = 0              # Líneas que no son de telemetría (o con un número ilegible)
+        self.bytes = 0
+
+    def alimentar(self, datos, t=None):
+        """Analizar un bloque del flujo de printf llegado en t (time.time); devuelve las líneas completas"""
+        t = time.time() if t is None else t
+        bloque = self._resto + datos if self._resto else datos
+        fin = bloque.rfind(b"\n")
+        if fin < 0:
+            self._resto = bloque
+            return 0
+        self._resto = bloque[fin + 1:]
+        lineas = bloque[:fin].split(b"\n")
+
+        lecturas = []
+        motores = []
+        eventos = []
+        ignoradas = 0
+        n_prefijo = len(PREFIJO_ULTRASONIDO)
+        n_sufijo = len(SUFIJO_ULTRASONIDO)
+        for linea in lineas:
+            if linea.endswith(b"\r"):           # stdio USB traduce '\n' a "\r\n"
+                linea = linea[:-1]
+            if linea.startswith(PREFIJO_ULTRASONIDO) and linea.endswith(SUFIJO_ULTRASONIDO):
+                lecturas.append(linea[n_prefijo:-n_sufijo])
+                continue
+            motor = _LINEAS_MOTOR.get(linea)
+            if motor is not None:
+                motores.append(motor)
+                continue
+            if linea.startswith(PREFIJO_BLUETOOTH):
+                evento = self._evento(linea[len(PREFIJO_BLUETOOTH):])
+                if evento is not None:
+                    eventos.append(evento)
+                    if evento[0] == EVENTO_PARAR:
+                        motores.append((CODIGO_PARADO, ORIGEN_BLUETOOTH))     # parar_motores()
+                    elif evento[0] == EVENTO_TIMEOUT:
+                        motores.append((CODIGO_FRENTE, ORIGEN_BLUETOOTH))     # mover_frente()
+                    continue
+            ignoradas += 1
+
+        distancias = np.empty(len(lecturas), DTYPE_DISTANCIA)
+        distancias["t"] = t
+        if lecturas:
+            try:
+                distancias["cm"] = np.array(lecturas).astype(np.float32)
+            except ValueError:
+                # Alguna línea cortada o corrupta: convertir una a una y descartar las malas
+                cm = np.array([_a_float(lectura) for lectura in lecturas], np.float32)
+                validas = ~np.isnan(cm)
+                ignoradas += int(np.count_nonzero(~validas))
+                distancias = distancias[validas]
+                distancias["cm"] = cm[validas]
+        muestras_motor = np.empty(len(motores), DTYPE_MOTOR)
+        muestras_motor["t"] = t
+        if motores:
+            columnas = np.array(motores, np.uint8)
+            muestras_motor["estado"] = columnas[:, 0]
+            muestras_motor["origen"] = columnas[:, 1]
+        muestras_evento = np.empty(len(eventos), DTYPE_EVENTO)
+        muestras_evento["t"] = t
+        if eventos:
+            columnas = np.array(eventos, np.int32)
+            muestras_evento["evento"] = columnas[:, 0]
+            muestras_evento["seq"] = columnas[:, 1]
+
+        with self._cerrojo:
+            self.distancia.agregar(distancias)
+            self.motores.agregar(muestras_motor)
+            self.eventos.agregar(muestras_evento)
+            self.lineas += len(lineas)
+            self.ignoradas += ignoradas
+            self.bytes += fin + 1
+        return len(lineas)
+
+    @staticmethod
+    def _evento(texto):
+        """(evento, seq) de una línea "[Bluetooth] ..." o None si no es un evento conocido"""
+        if texto.startswith(_PARAR):
+            return EVENTO_PARAR, _seq(texto[len(_PARAR):])
+        if texto.startswith(_CONTINUAR):
+            return EVENTO_CONTINUAR, _seq(texto[len(_CONTINUAR):])
+        if texto == _TIMEOUT:
+            return EVENTO_TIMEOUT, -1
+        if texto == _CRC:
+            return EVENTO_CRC, -1
+        if texto.startswith(_OVERRUN) and texto.endswith(_SUFIJO_OVERRUN):
+            try:
+                return EVENTO_OVERRUN, int(texto[len(_OVERRUN):-len(_SUFIJO_OVERRUN)])
+            except ValueError:
+                return None
+        return None
+
+    def series(self):
+        """Copias (distancia, motores, eventos) en orden de llegada"""
+        with self._cerrojo:
+            return self.distancia.datos(), self.motores.datos(), self.eventos.datos()
+
+    def distancia_en(self, t):
+        """Distancia interpolada en los instantes t (NaN fuera de lo muestreado)"""
+        with self._cerrojo:
+            distancia = self.distancia.datos()
+        if not len(distancia):
+            return np.full(np.shape(t), np.nan)
+        return np.interp(t, distancia["t"], distancia["cm"], left=np.nan, right=np.nan)
+
+    def estado_en(self, t):
+        """Estado de los motores (índice en ESTADOS_MOTOR, DESCONOCIDO antes de la primera muestra) en t"""
+        with self._cerrojo:
+            motores = self.motores.datos()
+        if not len(motores):
+            return np.full(np.shape(t), DESCONOCIDO, np.uint8)
+        indices = np.searchsorted(motores["t"], t, side="right") - 1
+        return np.where(indices >= 0, motores["estado"][np.maximum(indices, 0)], DESCONOCIDO).astype(np.uint8)
+
+    def tiempo_en_estado(self, t0, t1, estado):
+        """Segundos con los motores en `estado` entre t0 y t1"""
+        with self._cerrojo:
+            motores = self.motores.datos()
+        return _tiempo_en_estado(motores, t0, t1, ESTADOS_MOTOR.index(estado))
+
+    def alinear(self, episodios, velocidad=None):
+        """Una fila DTYPE_ALINEACION por episodio de alerta (registro.episodios_alerta)
+
+        La parada es la primera muestra con los motores parados por el Bluetooth
+        (origen ORIGEN_BLUETOOTH) a partir del inicio de la alerta; las paradas
+        de vMotorControlTask (obstáculo, sin lectura) no cuentan. Con
+        `velocidad` (cm/s) se estima además lo que avanzó el vehículo entre la
+        alerta y la parada.
+        """
+        distancia, motores, _ = self.series()
+        filas = np.full(len(episodios), np.nan, DTYPE_ALINEACION)
+        filas["t_alerta"] = episodios["t_alerta"]
+        if len(motores):
+            parados = motores["t"][(motores["estado"] == CODIGO_PARADO)
+                                   & (motores["origen"] == ORIGEN_BLUETOOTH)]
+            siguientes = np.searchsorted(parados, episodios["t_alerta"])
+            hay = siguientes < len(parados)
+            filas["t_parada"][hay] = parados[siguientes[hay]]
+        filas["alerta_a_parada"] = filas["t_parada"] - filas["t_alerta"]
+        filas["cierre_a_parada"] = filas["t_parada"] - episodios["t_cierre"]
+        if len(distancia):
+            filas["distancia_alerta"] = np.interp(filas["t_alerta"], distancia["t"], distancia["cm"],
+                                                  left=np.nan, right=np.nan)
+            con_parada = ~np.isnan(filas["t_parada"])
+            filas["distancia_parada"][con_parada] = np.interp(
+                filas["t_parada"][con_parada], distancia["t"], distancia["cm"], left=np.nan, right=np.nan)
+        filas["acercamiento"] = filas["distancia_alerta"] - filas["distancia_parada"]
+        if velocidad is not None and len(motores):
+            for fila in filas:
+                if not np.isnan(fila["t_parada"]):
+                    fila["avance_estimado"] = velocidad * (
+                        _tiempo_en_estado(motores, fila["t_alerta"], fila["t_parada"], CODIGO_FRENTE)
+                        - _tiempo_en_estado(motores, fila["t_alerta"], fila["t_parada"], CODIGO_RE))
+        return filas
+
+    def resumen(self):
+        return (f"Telemetría: {self.lineas} líneas ({self.bytes / 1e3:.1f} kB), {self.distancia.total} "
+                f"lecturas de distancia, {self.motores.total} muestras de motores, {self.eventos.total} "
+                f"eventos del Bluetooth, {self.ignoradas} líneas ignoradas")
+
+
+def _a_float(texto):
+    try:
+        return float(texto)
+    except ValueError:
+        return np.nan
+
+
+def _seq(texto):
+    """Número de " (seq N)" tras PARAR/CONTINUAR recebido; -1 con el protocolo ASCII"""
+    if texto.startswith(b" (seq ") and texto.endswith(b")"):
+        try:
+            return int(texto[6:-1])
+        except ValueError:
+            pass
+    return -1
+
+
+def _tiempo_en_estado(motores, t0, t1, codigo):
+    """Segundos en el estado `codigo` entre t0 y t1: cada muestra vale hasta la siguiente"""
+    if not len(motores) or t1 <= t0:
+        return 0.0
+    t = motores["t"]
+    desde = max(np.searchsorted(t, t0, side="right") - 1, 0)
+    hasta = np.searchsorted(t, t1, side="left")
+    tramo = t[desde:hasta]
+    inicios = np.maximum(tramo, t0)
+    finales = np.minimum(np.append(tramo[1:], t1), t1)
+    duraciones = np.maximum(finales - inicios, 0.0)
+    return float(duraciones[motores["estado"][desde:hasta] == codigo].sum())
+
+
+class ColectorTelemetria:
+    """Hilo que lee el flujo de printf (puerto serie o fd de un pty) y alimenta una Telemetria"""
+
+    def __init__(self, telemetria, puerto=None, fd=None, baudios=115200):
+        self.telemetria = telemetria
+        self.puerto = puerto
+        self.fd = fd
+        self.baudios = baudios
+        self._serial = None
+        self._activo = False
+        self._hilo = None
+        self.lecturas = 0
+
+    def iniciar(self):
+        if self.fd is None:
+            # En el stdio USB los baudios no se usan, pero pyserial los pide
+            self._serial = serial.Serial(self.puerto, self.baudios, timeout=0)
+            self.fd = self._serial.fileno()
+        self._activo = True
+        self._hilo = threading.Thread(target=self._bucle, name="telemetria", daemon=True)
+        self._hilo.start()
+        return self
+
+    def _bucle(self):
+        while self._activo:
+            if not select.select([self.fd], [], [], 0.1)[0]:
+                continue
+            try:
+                datos = os.read(self.fd, 65536)
+            except BlockingIOError:
+                continue
+            except OSError:
+                # pty sin nadie en el otro extremo todavía
+                time.sleep(0.1)
+                continue
+            if not datos:
+                time.sleep(0.1)
+                continue
+            self.lecturas += 1
+            self.telemetria.alimentar(datos, time.time())
+
+    def detener(self):
+        self._activo = False
+        if self._hilo is not None:
+            self._hilo.join(timeout=2.0)
+        if self._serial is not None:
+            self._serial.close()
+
+
+def _formato(valor, escala=1.0, unidad=""):
+    return "-" if np.isnan(valor) else f"{escala * valor:.0f}{unidad}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Colector de telemetría del vehículo (printf del firmware)")
+    parser.add_argument("puerto", nargs="?", default=PUERTO_POR_DEFECTO,
+                        help="puerto del stdio USB de la Pico")
+    parser.add_argument("--pty", action="store_true",
+                        help="leer de un pty nuevo en lugar del puerto (p. ej. para el --log del simulador)")
+    parser.add_argument("--capacidad", type=int, default=CAPACIDAD, help="muestras por serie")
+    parser.add_argument("--suscribir", default=None,
+                        help="alinear con las alertas del detector publicadas con este nombre (--publicar)")
+    parser.add_argument("--registro", default=None,
+                        help="alinear al terminar con las alertas de este registro (--grabar)")
+    parser.add_argument("--velocidad", type=float, default=None,
+                        help="velocidad del vehículo hacia delante (cm/s) para estimar el avance")
+    parser.add_argument("--duracion", type=float, default=None, help="segundos de captura (por defecto, hasta Ctrl+C)")
+    args = parser.parse_args()
+
+    telemetria = Telemetria(args.capacidad)
+    if args.pty:
+        maestro, ruta = crear_pty()
+        colector = ColectorTelemetria(telemetria, fd=maestro).iniciar()
+        print(f"[INFO] Telemetría en {ruta}")
+    else:
+        try:
+            colector = ColectorTelemetria(telemetria, args.puerto).iniciar()
+        except serial.SerialException as e:
+            print(f"[ERROR] No se pudo abrir {args.puerto}: {e}")
+            return
+        print(f"[INFO] Telemetría desde {args.puerto}")
+
+    suscriptor = None
+    lotes = []
+    limite = None if args.duracion is None else time.time() + args.duracion
+    t_informe = time.perf_counter()
+    lineas_informe = 0
+    try:
+        while limite is None or time.time() < limite:
+            if args.suscribir:
+                if suscriptor is None:
+                    try:
+                        suscriptor = SuscriptorMetricas(args.suscribir, desde_inicio=True)
+                    except (FileNotFoundError, ValueError):
+                        pass
+                if suscriptor is not None:
+                    lotes.append(suscriptor.leer())
+            time.sleep(0.2)
+            ahora = time.perf_counter()
+            if ahora - t_informe >= 1.0:
+                distancia, motores, _ = telemetria.series()
+                cm = f"{distancia['cm'][-1]:.1f} cm" if len(distancia) else "-"
+                estado = ESTADOS_MOTOR[motores["estado"][-1]] if len(motores) else "-"
+                print(f"[INFO] {(telemetria.lineas - lineas_informe) / (ahora - t_informe):.0f} líneas/s, "
+                      f"distancia {cm}, motores {estado}")
+                t_informe = ahora
+                lineas_informe = telemetria.lineas
+    except KeyboardInterrupt:
+        pass
+    colector.detener()
+    if suscriptor is not None:
+        lotes.append(suscriptor.leer())
+        suscriptor.cerrar()
+
+    registros = None
+    if args.registro:
+        registros, _ = leer_registro(args.registro)
+    elif lotes:
+        registros = np.concatenate(lotes)
+
+    print("\n" + "=" * 70)
+    print("RESUMEN DE TELEMETRÍA:")
+    print(telemetria.resumen())
+    distancia, motores, eventos = telemetria.series()
+    if len(distancia) > 1:
+        periodos = np.diff(distancia["t"])
+        print(f"Distancia: {distancia['cm'].min():.1f}-{distancia['cm'].max():.1f} cm, "
+              f"{(len(distancia) - 1) / max(distancia['t'][-1] - distancia['t'][0], 1e-9):.1f} lecturas/s "
+              f"(hueco máximo {1000 * periodos.max():.0f} ms)")
+    if len(motores):
+        t0, t1 = float(motores["t"][0]), float(motores["t"][-1])
+        print("Motores: " + ", ".join(f"{estado} {telemetria.tiempo_en_estado(t0, t1, estado):.1f}s"
+                                      for estado in ESTADOS_MOTOR))
+    if len(eventos):
+        print("Bluetooth: " + ", ".join(f"{nombre} x{int(np.count_nonzero(eventos['evento'] == i))}"
+                                        for i, nombre in enumerate(EVENTOS)))
+        overruns = eventos["seq"][eventos["evento"] == EVENTO_OVERRUN]
+        if len(overruns):
+            print(f"[ADVERTENCIA] Buffer de recepción del vehículo lleno: {int(overruns.max())} bytes descartados")
+    if registros is not None and len(registros):
+        filas = telemetria.alinear(episodios_alerta(registros), args.velocidad)
+        print(f"Alertas del detector: {len(filas)}")
+        for i, fila in enumerate(filas):
+            print(f"  {i + 1}: alerta→parada {_formato(fila['alerta_a_parada'], 1000, ' ms')}, "
+                  f"cierre→parada {_formato(fila['cierre_a_parada'], 1000, ' ms')}, "
+                  f"distancia {_formato(fila['distancia_alerta'], unidad=' cm')} → "
+                  f"{_formato(fila['distancia_parada'], unidad=' cm')}, "
+                  f"acercamiento {_formato(fila['acercamiento'], unidad=' cm')}"
+                  + (f", avance estimado {_formato(fila['avance_estimado'], unidad=' cm')}"
+                     if args.velocidad is not None else ""))
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+# visualizacion.py - Dibujo del panel de información y ventana de OpenCV
+# Solo se importa cuando hay pantalla: en modo headless el bucle de
+# detección no carga este módulo ni las utilidades de dibujo de MediaPipe.
+#
+# El overlay está cacheado: en los paneles opacos (fondo gris con métricas y
+# umbrales, barras de alerta) el fondo y las etiquetas fijas se renderizan
+# una vez y los valores se vuelven a dibujar con cv2.putText solo cuando
+# cambia su texto; los 20 puntos de ojos y boca se estampan en una sola
+# operación. Los textos sobre la imagen de la cámara siguen usando cv2.putText.
+
+import cv2
+import numpy as np
+import mediapipe as mp
+
+mp_drawing = mp.solutions.drawing_utils
+mp_face_mesh = mp.solutions.face_mesh
+
+# Desplazamientos (dy, dx) de un círculo relleno de radio 2 (cv2.circle(..., 2, ..., -1))
+_DISCO = np.argwhere(cv2.circle(np.zeros((5, 5), np.uint8), (2, 2), 2, 1, -1)) - 2
+
+
+def mostrar(titulo, frame, canal, espera_ms=1):
+    """Mostrar el frame y pasar la tecla pulsada (si la hay) al canal de control"""
+    cv2.imshow(titulo, frame)
+    tecla = cv2.waitKey(espera_ms) & 0xFF
+    if tecla != 0xFF:
+        canal.enviar(chr(tecla))
+
+
+def cerrar():
+    """Cerrar todas las ventanas de OpenCV"""
+    cv2.destroyAllWindows()
+
+
+def _pegar(frame, x, y, imagen):
+    """Copiar `imagen` en frame con esquina superior izquierda (x, y), recortando bordes"""
+    alto, ancho = frame.shape[:2]
+    h, w = imagen.shape[:2]
+    x0, y0 = max(x, 0), max(y, 0)
+    x1, y1 = min(x + w, ancho), min(y + h, alto)
+    if x0 >= x1 or y0 >= y1:
+        return
+    np.copyto(frame[y0:y1, x0:x1], imagen[y0 - y:y1 - y, x0 - x:x1 - x])
+
+
+def dibujar_puntos(frame, puntos, color=(255, 0, 0)):
+    """Estampar los puntos normalizados (n, 2) como círculos de radio 2 en una sola pasada"""
+    alto, ancho = frame.shape[:2]
+    validos = np.all((puntos >= 0.0) & (puntos <= 1.0), axis=1)
+    px = np.minimum(np.floor(puntos[validos, 0] * ancho), ancho - 1).astype(np.intp)
+    py = np.minimum(np.floor(puntos[validos, 1] * alto), alto - 1).astype(np.intp)
+    ys = (py[:, np.newaxis] + _DISCO[:, 0]).ravel()
+    xs = (px[:, np.newaxis] + _DISCO[:, 1]).ravel()
+    dentro = (ys >= 0) & (ys < alto) & (xs >= 0) & (xs < ancho)
+    frame[ys[dentro], xs[dentro]] = color
+
+
+class PanelCacheado:
+    """Rectángulo opaco con textos: fondo y etiquetas fijas pre-renderizados
+
+    Equivale a cv2.rectangle(..., -1) seguido de cv2.putText para cada texto
+    (los textos deben caber en el rectángulo). El fondo y las `etiquetas`
+    fijas se renderizan una vez por disposición; los `valores` (tuplas de
+    cv2.putText con el texto ya formateado) se dibujan sobre una copia de esa
+    capa solo cuando cambia alguno de ellos.
+    """
+
+    def __init__(self, fondo):
+        self.fondo = fondo
+        self._estaticos = {}        # (rect, etiquetas) → fondo con las etiquetas
+        self._clave = None
+        self._imagen = None
+
+    def _estatico(self, rect, etiquetas):
+        estatico = self._estaticos.get((rect, etiquetas))
+        if estatico is None:
+            x0, y0, x1, y1 = rect
+            estatico = np.empty((y1 - y0 + 1, x1 - x0 + 1, 3), np.uint8)
+            estatico[...] = self.fondo
+            for texto, (x, y), fuente, escala, color, grosor in etiquetas:
+                cv2.putText(estatico, texto, (x - x0, y - y0), fuente, escala, color, grosor)
+            self._estaticos[(rect, etiquetas)] = estatico
+        return estatico
+
+    def dibujar(self, frame, rect, etiquetas, valores=()):
+        """Pegar el panel `rect` = (x0, y0, x1, y1) con sus `etiquetas` fijas y sus `valores`"""
+        clave = (rect, etiquetas, valores)
+        if clave != self._clave:
+            estatico = self._estatico(rect, etiquetas)
+            if self._imagen is None or self._imagen.shape != estatico.shape:
+                self._imagen = np.empty_like(estatico)
+            np.copyto(self._imagen, estatico)
+            x0, y0 = rect[:2]
+            for texto, (x, y), fuente, escala, color, grosor in valores:
+                cv2.putText(self._imagen, texto, (x - x0, y - y0), fuente, escala, color, grosor)
+            self._clave = clave
+        _pegar(frame, rect[0], rect[1], self._imagen)
+
+
+class RenderizadorPruebaRapida:
+    """Overlay cacheado de prueba_rapida.py"""
+
+    def __init__(self):
+        self._panel = PanelCacheado((50, 50, 50))
+        self._barra_alerta = PanelCacheado((0, 0, 255))
+
+    def dibujar(self, frame, caras, contador_pestaneos, ear_umbral, mar_umbral, tiempo_alerta,
+                en_espera=False):
+        """Dibujar el panel; `caras` = [(ear, mar, condicion, tiempo_fatiga)]"""
+        alto, ancho = frame.shape[:2]
+        simplex = cv2.FONT_HERSHEY_SIMPLEX
+
+        # Textos del panel informativo (fondo gris) y del resto del frame
+        etiquetas = []
+        valores = []
+        externos = []
+        alerta = False
+        for ear, mar, condicion, tiempo_fatiga in caras:
+            # Verde si abierto, rojo si cerrado / naranja si boca abierta
+            color_ear = (0, 255, 0) if ear >= ear_umbral else (0, 0, 255)
+            color_mar = (255, 165, 0) if mar >= mar_umbral else (0, 255, 0)
+            valores += [
+                (f"EAR: {ear:.3f}", (10, 30), simplex, 0.8, color_ear, 2),
+                (f"MAR: {mar:.3f}", (10, 65), simplex, 0.8, color_mar, 2),
+                (f"Umbral EAR: {ear_umbral}", (10, 100), simplex, 0.6, (255, 255, 255), 1),
+                (f"Umbral MAR: {mar_umbral}", (10, 125), simplex, 0.6, (255, 255, 255), 1),
+            ]
+
+            if condicion == "fatiga":
+                alerta = alerta or tiempo_fatiga >= tiempo_alerta
+                valores.append((f"Tiempo ojos cerrados: {tiempo_fatiga:.1f}s", (10, 155),
+                                simplex, 0.7, (0, 0, 255), 2))
+                condicion_texto = "Evaluando: FATIGA (ojos+boca cerrados)"
+            elif condicion == "risa":
+                etiquetas.append(("RISA/BOSTEZO DETECTADO", (10, 155), simplex, 0.7, (255, 165, 0), 2))
+                externos.append(("NO es fatiga (algoritmo EAR+MAR funcionando)", (ancho-500, 50),
+                                 simplex, 0.6, (0, 255, 255), 1))
+                condicion_texto = "Evaluando: RISA (ojos cerrados, boca abierta)"
+            else:
+                etiquetas.append(("Estado: NORMAL", (10, 155), simplex, 0.7, (0, 255, 0), 2))
+                condicion_texto = "Evaluando: NORMAL"
+
+            externos += [
+                (f"Detecciones: {contador_pestaneos}", (ancho-200, 30), simplex, 0.7, (255, 255, 255), 2),
+                (condicion_texto, (ancho-500, alto-10), simplex, 0.5, (255, 255, 0), 1),
+            ]
+
+        if not caras:
+            # No se detecta rostro
+            etiquetas.append(("Rostro no detectado", (10, 30), simplex, 0.8, (0, 0, 255), 2))
+            if en_espera:
+                etiquetas.append(("Modo espera: FaceMesh en pausa", (10, 65), simplex, 0.6, (0, 255, 255), 1))
+
+        self._panel.dibujar(frame, (0, 0, 450, 180), tuple(etiquetas), tuple(valores))
+
+        if alerta:
+            # ALERTA DE FATIGA
+            self._barra_alerta.dibujar(frame, (0, alto-80, ancho, alto), (
+                ("VEHICULO SE DETENDRIA AQUI - FATIGA DETECTADA", (ancho//6, alto-30),
+                 simplex, 0.8, (255, 255, 255), 2),
+            ))
+
+        for texto, org, fuente, escala, color, grosor in externos:
+            cv2.putText(frame, texto, org, fuente, escala, color, grosor)
+
+        # Instrucciones en pantalla
+        cv2.putText(frame, "Instrucciones: Cerrar ojos 1.5s -> Alerta | Sonreir -> No alerta | 'q'=salir",
+                    (10, alto-30), simplex, 0.5, (255, 255, 255), 1)
+
+
+class RenderizadorOriginal:
+    """Overlay cacheado de detector_original.py"""
+
+    def __init__(self, contornos=True):
+        self.contornos = contornos
+        self._panel = PanelCacheado((58, 58, 55))
+        self._alerta = PanelCacheado((0, 0, 255))
+        self._espera = PanelCacheado((58, 58, 55))
+
+    def dibujar_landmarks(self, frame, face_landmarks, puntos, roi=None):
+        """Dibujar contornos de FaceMesh (opcional) y los 20 puntos de ojos y boca
+
+        `roi` = (x0, y0, x1, y1) si FaceMesh se ejecutó sobre un recorte: sus
+        landmarks se dibujan sobre esa zona del frame.
+        """
+        if self.contornos and face_landmarks is not None:
+            zona = frame if roi is None else frame[roi[1]:roi[3], roi[0]:roi[2]]
+            mp_drawing.draw_landmarks(
+                zona,
+                face_landmarks,
+                mp_face_mesh.FACEMESH_CONTOURS,
+                landmark_drawing_spec=mp_drawing.DrawingSpec(
+                    color=(255, 102, 102),
+                    thickness=1,
+                    circle_radius=1
+                ),
+                connection_drawing_spec=mp_drawing.DrawingSpec(
+                    color=(102, 204, 0),
+                    thickness=1,
+                    circle_radius=1
+                )
+            )
+
+        # Puntos de interés (ojos y boca) desde el buffer del motor de métricas
+        dibujar_puntos(frame, puntos, (255, 0, 0))
+
+    def dibujar_panel(self, frame, ear, mar, mar_limiar, contagem_piscadas, tempo, alerta):
+        """Dibujar el panel de información y la barra de alerta"""
+        duplex = cv2.FONT_HERSHEY_DUPLEX
+        blanco = (255, 255, 255)
+        estado_boca = "Abierto" if mar >= mar_limiar else "Cerrado"
+
+        # Panel de información (fondo gris)
+        self._panel.dibujar(frame, (0, 1, 290, 140), (), (
+            (f"EAR: {round(ear, 2)}", (1, 24), duplex, 0.9, blanco, 2),
+            (f"MAR: {round(mar, 2)} {estado_boca}", (1, 50), duplex, 0.9, blanco, 2),
+            (f"Pestaneos: {contagem_piscadas}", (1, 120), duplex, 0.9, (109, 233, 219), 2),
+            (f"Tiempo: {round(tempo, 3)}", (1, 80), duplex, 0.9, blanco, 2),
+        ))
+
+        if alerta:
+            # Barra de alerta ROJA
+            self._alerta.dibujar(frame, (30, 400, 610, 452), (
+                ("Puede ser que esté con sueño,", (60, 420), duplex, 0.85, blanco, 1),
+                ("considere descansar.", (180, 450), duplex, 0.85, blanco, 1),
+            ))
+
+    def dibujar_espera(self, frame):
+        """Aviso de modo espera (sin conductor: FaceMesh en pausa)"""
+        self._espera.dibujar(frame, (0, 1, 290, 60), (
+            ("SIN CONDUCTOR", (1, 24), cv2.FONT_HERSHEY_DUPLEX, 0.9, (0, 255, 255), 2),
+            ("Modo espera", (1, 50), cv2.FONT_HERSHEY_DUPLEX, 0.7, (255, 255, 255), 1),
+        ))
@@ -65,7 +65,7 @@ bool ssd1306_init(ssd1306_t *p, uint16_t width, uint16_t height, uint8_t address
     p->address=address;
 
     p->i2c_i=i2c_instance;
-
+    p->shadow=NULL;
 
     p->bufsize=(p->pages)*(p->width);
     if((p->buffer=malloc(p->bufsize+1))==NULL) {
@@ -117,6 +117,8 @@ bool ssd1306_init(ssd1306_t *p, uint16_t width, uint16_t height, uint8_t address
 
 inline void ssd1306_deinit(ssd1306_t *p) {
     free(p->buffer-1);
+    free(p->shadow);
+    p->shadow=NULL;
 }
 
 inline void ssd1306_poweroff(ssd1306_t *p) {
@@ -291,4 +293,122 @@ void ssd1306_show(ssd1306_t *p) {
     *(p->buffer-1)=0x40;
 
     fancy_write(p->i2c_i, p->address, p->buffer-1, p->bufsize+1, "ssd1306_show");
+
+    if(p->shadow)
+        memcpy(p->shadow, p->buffer, p->bufsize);
+}
+
+// first and last column of a page that differ from the display; false if none
+static bool ssd1306_dirty_columns(ssd1306_t *p, uint8_t page, uint8_t *first, uint8_t *last) {
+    const uint8_t *buf=p->buffer+page*p->width;
+    const uint8_t *shadow=p->shadow+page*p->width;
+    int32_t lo=0, hi=p->width-1;
+
+    while(lo<=hi && buf[lo]==shadow[lo])
+        ++lo;
+    if(lo>hi)
+        return false;
+    while(buf[hi]==shadow[hi])
+        --hi;
+
+    *first=lo;
+    *last=hi;
+    return true;
+}
+
+size_t ssd1306_show_partial(ssd1306_t *p) {
+    // six [addr, 0x00, cmd] writes and [addr, 0x40, buffer]
+    size_t full=6*3+2+p->bufsize;
+    size_t cost=0;
+    uint8_t first, last;
+
+    if(p->shadow==NULL) {
+        // unknown display RAM: send everything once
+        p->shadow=malloc(p->bufsize);
+        ssd1306_show(p);
+        return full;
+    }
+
+    // [addr, 0x00, 6 window commands] and [addr, 0x40, columns] per changed page
+    for(uint8_t page=0; page<p->pages; ++page)
+        if(ssd1306_dirty_columns(p, page, &first, &last))
+            cost+=8+2+last-first+1;
+    if(cost>=full) {
+        ssd1306_show(p);
+        return full;
+    }
+
+    uint8_t offset=p->width==64?32:0;
+    for(uint8_t page=0; page<p->pages; ++page) {
+        if(!ssd1306_dirty_columns(p, page, &first, &last))
+            continue;
+
+        // Co=0: every byte after the control byte is a command
+        uint8_t cmds[]= {0x00, SET_COL_ADDR, first+offset, last+offset, SET_PAGE_ADDR, page, page};
+        fancy_write(p->i2c_i, p->address, cmds, sizeof(cmds), "ssd1306_show_partial");
+
+        // borrow the byte before the columns for the data prefix, as ssd1306_show does
+        uint8_t *data=p->buffer+page*p->width+first;
+        uint8_t saved=*(data-1);
+        *(data-1)=0x40;
+        fancy_write(p->i2c_i, p->address, data-1, last-first+2, "ssd1306_show_partial");
+        *(data-1)=saved;
+
+        memcpy(p->shadow+page*p->width+first, data, last-first+1);
+    }
+
+    return cost;
+}
+
+void ssd1306_anim_init(ssd1306_anim_t *a, const uint8_t *data, const uint32_t *offsets, uint16_t frames, uint8_t width, uint8_t pages) {
+    a->data=data;
+    a->offsets=offsets;
+    a->frames=frames;
+    a->width=width;
+    a->pages=pages;
+    a->frame=0;
+}
+
+// decodes len bytes of RLE into dst (xor: apply them as changes), returns the next input byte
+static const uint8_t *ssd1306_rle_decode(const uint8_t *src, uint8_t *dst, size_t len, bool xor) {
+    while(len) {
+        uint8_t c=*src++;
+        bool repeat=c&0x80;
+        size_t run=repeat?(c&0x7F)+2:c+1;
+        size_t n=run<len?run:len;
+
+        for(size_t i=0; i<n; ++i) {
+            uint8_t val=repeat?*src:src[i];
+            dst[i]=xor?dst[i]^val:val;
+        }
+        src+=repeat?1:run;
+        dst+=n;
+        len-=n;
+    }
+    return src;
+}
+
+bool ssd1306_anim_draw_next(ssd1306_t *p, ssd1306_anim_t *a, uint32_t x, uint32_t page) {
+    if(x+a->width>p->width || page+a->pages>p->pages)
+        return false;
+
+    uint8_t *origin=p->buffer+page*p->width+x;
+    const uint8_t *src=a->data+a->offsets[a->frame];
+
+    if(a->frame==0) {
+        for(uint8_t i=0; i<a->pages; ++i)
+            src=ssd1306_rle_decode(src, origin+i*p->width, a->width, false);
+    } else {
+        // [page] [first column] [length] RLE(changes)
+        while(*src!=SSD1306_ANIM_END) {
+            uint8_t pg=src[0], col=src[1], len=src[2];
+            if(pg>=a->pages || col+len>a->width)
+                break;
+            src=ssd1306_rle_decode(src+3, origin+pg*p->width+col, len, true);
+        }
+    }
+
+    if(++(a->frame)>=a->frames)
+        a->frame=0;
+    return true;
 }
\ No newline at end of file
@@ -68,8 +68,26 @@ typedef struct {
     bool external_vcc; 	/**< whether display uses external vcc */ 
     uint8_t *buffer;	/**< display buffer */
     size_t bufsize;		/**< buffer size */
+    uint8_t *shadow;	/**< copy of the display RAM for ssd1306_show_partial (allocated on first use) */
 } ssd1306_t;
 
+/**
+*	@brief marks the end of the delta records of a frame in an animation stream
+*/
+#define SSD1306_ANIM_END 0xFF
+
+/**
+*	@brief animation generated by img_to_array.py --animation (keyframe + RLE deltas)
+*/
+typedef struct {
+    const uint8_t *data;		/**< NAME_anim: keyframe followed by the delta records of every frame */
+    const uint32_t *offsets;	/**< NAME_offsets: start of every frame in data */
+    uint16_t frames;			/**< NAME_FRAMES */
+    uint8_t width;				/**< NAME_WIDTH */
+    uint8_t pages;				/**< NAME_PAGES */
+    uint16_t frame;				/**< next frame to draw */
+} ssd1306_anim_t;
+
 /**
 *	@brief initialize display
 *
@@ -134,6 +152,20 @@ void ssd1306_invert(ssd1306_t *p, uint8_t inv);
 */
 void ssd1306_show(ssd1306_t *p);
 
+/**
+	@brief display only what changed since the last show, for frequent small updates
+
+	Compares the buffer with a copy of what the display holds and, for every
+	page that changed, sends just the columns between the first and the last
+	changed one. Falls back to a full update when that is cheaper. The first
+	call allocates the copy and sends the whole buffer.
+
+	@param[in] p : instance of display
+
+	@return bytes written to the i2c bus (address bytes included)
+*/
+size_t ssd1306_show_partial(ssd1306_t *p);
+
 /**
 	@brief clear display buffer
 
@@ -204,6 +236,37 @@ void ssd1306_bmp_show_image_with_offset(ssd1306_t *p, const uint8_t *data, const
 */
 void ssd1306_bmp_show_image(ssd1306_t *p, const uint8_t *data, const long size);
 
+/**
+	@brief prepare an animation generated by img_to_array.py --animation
+
+	@param[in] a : animation
+	@param[in] data : NAME_anim
+	@param[in] offsets : NAME_offsets
+	@param[in] frames : NAME_FRAMES
+	@param[in] width : NAME_WIDTH
+	@param[in] pages : NAME_PAGES
+*/
+void ssd1306_anim_init(ssd1306_anim_t *a, const uint8_t *data, const uint32_t *offsets, uint16_t frames, uint8_t width, uint8_t pages);
+
+/**
+	@brief draw the next frame of an animation on buffer
+
+	Frame 0 is drawn whole; every other frame only applies its changes to the
+	previous one, so nothing else may draw over the animation between calls
+	(call ssd1306_anim_init again to restart from the keyframe). Pair it with
+	ssd1306_show_partial to send only the changed columns.
+
+	@param[in] p : instance of display
+	@param[in] a : animation
+	@param[in] x : x position of the left edge
+	@param[in] page : page (y / 8) of the top edge
+	
+	@return bool.
+	@retval true if the frame was drawn
+	@retval false if the animation does not fit the display at that position
+*/
+bool ssd1306_anim_draw_next(ssd1306_t *p, ssd1306_anim_t *a, uint32_t x, uint32_t page);
+
 /**
 	@brief draw char with given font
 
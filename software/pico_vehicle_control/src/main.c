@@ -8,6 +8,7 @@
 #include <string.h>
 #include "hardware/uart.h"
 #include "hardware/irq.h"
+#include "hardware/sync.h"
 
 // Requisitos do FreeRTOS
 void init_run_time_timer(void) {}
@@ -30,6 +31,28 @@ volatile bool parado_por_bluetooth = false;
 #define UART_TX_PIN 0
 #define UART_RX_PIN 1
 
+// Protocolo com o PC (ver pc_fatiga_detector/protocolo.py), tramas de 10 bytes:
+// [0xA5][comando][dado][seq u16 LE][t_us u32 LE][CRC-8 dos bytes 1..8]
+// Cada 'p' ou 'c' recebido é confirmado com uma trama 'a' que devolve o seq e
+// o t_us do PC e, em dado, o estado do veículo.
+#define TRAMA_INICIO      0xA5
+#define TRAMA_TAMANHO     10
+#define CMD_PARAR         'p'
+#define CMD_CONTINUAR     'c'
+#define CMD_CONFIRMACAO   'a'
+#define ESTADO_PARADO     0x01   // Parado pelo Bluetooth
+#define ESTADO_OBSTACULO  0x02   // Obstáculo a menos de 20 cm
+#define TIMEOUT_PARAR_US  (2 * 1000 * 1000)
+
+// Buffer circular da recepção: a interrupção da UART escreve, a task do
+// Bluetooth lê (um produtor e um consumidor, sem mutex)
+#define RX_TAMANHO 64            // Potência de 2
+static uint8_t rx_buffer[RX_TAMANHO];
+static volatile uint32_t rx_cabeca = 0;    // Só a ISR escreve
+static volatile uint32_t rx_cauda = 0;     // Só a task escreve
+static volatile uint32_t rx_overruns = 0;   // Bytes descartados com o buffer cheio (só a ISR escreve)
+static TaskHandle_t xBluetoothTaskHandle = NULL;
+
 // Variáveis globais
 volatile float distance = 0;
 volatile bool motor_ativo = true;
@@ -103,31 +126,160 @@ void vMotorControlTask(void *pvParameters) {
     }
 }
 
+// Interrupção de recepção da UART: esvazia a FIFO no buffer circular e acorda a task
+void on_uart_rx(void) {
+    BaseType_t acordar = pdFALSE;
+
+    while (uart_is_readable(UART_ID)) {
+        uint8_t byte = (uint8_t) uart_getc(UART_ID);
+        uint32_t cabeca = rx_cabeca;
+        if (cabeca - rx_cauda == RX_TAMANHO) {
+            rx_overruns++;
+            continue;
+        }
+        rx_buffer[cabeca % RX_TAMANHO] = byte;
+        __dmb();  // O byte precisa estar visível antes do índice (a task pode estar no outro núcleo)
+        rx_cabeca = cabeca + 1;
+    }
+
+    if (xBluetoothTaskHandle != NULL) {
+        vTaskNotifyGiveFromISR(xBluetoothTaskHandle, &acordar);
+    }
+    portYIELD_FROM_ISR(acordar);
+}
+
+static bool rx_ler(uint8_t *byte) {
+    uint32_t cauda = rx_cauda;
+    if (cauda == rx_cabeca) return false;
+    __dmb();
+    *byte = rx_buffer[cauda % RX_TAMANHO];
+    __dmb();  // Libera a posição só depois de ler o byte
+    rx_cauda = cauda + 1;
+    return true;
+}
+
+// CRC-8, polinômio 0x07, valor inicial 0
+static uint8_t crc8(const uint8_t *dados, size_t tamanho) {
+    uint8_t crc = 0;
+    for (size_t i = 0; i < tamanho; i++) {
+        crc ^= dados[i];
+        for (int bit = 0; bit < 8; bit++) {
+            crc = (crc & 0x80) ? (uint8_t) ((crc << 1) ^ 0x07) : (uint8_t) (crc << 1);
+        }
+    }
+    return crc;
+}
+
+static uint8_t estado_veiculo(void) {
+    float current_distance;
+    xSemaphoreTake(xDistanceMutex, portMAX_DELAY);
+    current_distance = distance;
+    xSemaphoreGive(xDistanceMutex);
+
+    uint8_t estado = 0;
+    if (parado_por_bluetooth) estado |= ESTADO_PARADO;
+    if (current_distance > 0 && current_distance < 20.0) estado |= ESTADO_OBSTACULO;
+    return estado;
+}
+
+// Confirmação: mesmo seq e t_us da trama recebida, comando 'a' e o estado no dado
+static void enviar_confirmacao(const uint8_t *trama) {
+    uint8_t resposta[TRAMA_TAMANHO];
+    memcpy(resposta, trama, TRAMA_TAMANHO);
+    resposta[1] = CMD_CONFIRMACAO;
+    resposta[2] = estado_veiculo();
+    resposta[TRAMA_TAMANHO - 1] = crc8(&resposta[1], TRAMA_TAMANHO - 2);
+    uart_write_blocking(UART_ID, resposta, TRAMA_TAMANHO);
+}
+
+static void parar_por_bluetooth(void) {
+    parado_por_bluetooth = true;
+    parar_motores();
+    ultimo_parar = get_absolute_time();
+}
+
+static void processar_trama(const uint8_t *trama) {
+    uint16_t seq = (uint16_t) (trama[3] | (trama[4] << 8));
+
+    if (trama[1] == CMD_PARAR) {
+        parar_por_bluetooth();
+        printf("[Bluetooth] PARAR recebido (seq %u)\n", seq);
+    } else if (trama[1] == CMD_CONTINUAR) {
+        // A task dos motores volta a andar (ou a desviar) na próxima volta
+        parado_por_bluetooth = false;
+        printf("[Bluetooth] CONTINUAR recebido (seq %u)\n", seq);
+    } else {
+        printf("[Bluetooth] Comando desconhecido: %c\n", trama[1]);
+        return;
+    }
+    // Confirma depois de atuar nos motores
+    enviar_confirmacao(trama);
+}
+
 void vBluetoothTask(void *pvParameters) {
+    uint8_t trama[TRAMA_TAMANHO];
+    size_t pos = 0;
+    uint8_t byte;
+    uint32_t overruns_informados = 0;
+
+    // A interrupção é habilitada aqui, com o handle da task já válido
+    irq_set_exclusive_handler(UART0_IRQ, on_uart_rx);
+    irq_set_enabled(UART0_IRQ, true);
+    uart_set_irq_enables(UART_ID, true, false);
+
     while (1) {
-        if (uart_is_readable(uart0)) {
-            char c = uart_getc(uart0);
-            if (c == '\n' || c == '\r') continue;
-
-            if (c == 'p') {
-                parado_por_bluetooth = true;
-                parar_motores();
-                ultimo_parar = get_absolute_time();
-                printf("[Bluetooth] PARAR recebido\n");
-            } else {
-                printf("[Bluetooth] Ignorado: %c\n", c);
+        // Dorme até a interrupção avisar que chegaram bytes (ou 100 ms, para o timeout)
+        ulTaskNotifyTake(pdTRUE, pdMS_TO_TICKS(100));
+
+        while (rx_ler(&byte)) {
+            if (pos == 0) {
+                if (byte == TRAMA_INICIO) {
+                    trama[pos++] = byte;
+                } else if (byte == CMD_PARAR) {
+                    // Protocolo anterior: 'p' solto, sem confirmação
+                    parar_por_bluetooth();
+                    printf("[Bluetooth] PARAR recebido\n");
+                } else if (byte != '\n' && byte != '\r') {
+                    printf("[Bluetooth] Ignorado: %c\n", byte);
+                }
+                continue;
+            }
+
+            trama[pos++] = byte;
+            if (pos < TRAMA_TAMANHO) continue;
+
+            if (crc8(&trama[1], TRAMA_TAMANHO - 2) == trama[TRAMA_TAMANHO - 1]) {
+                processar_trama(trama);
+                pos = 0;
+                continue;
+            }
+
+            printf("[Bluetooth] Trama com CRC inválido descartada\n");
+            // Se um byte se perdeu, a próxima trama pode começar dentro desta
+            pos = 0;
+            for (size_t i = 1; i < TRAMA_TAMANHO; i++) {
+                if (trama[i] == TRAMA_INICIO) {
+                    pos = TRAMA_TAMANHO - i;
+                    memmove(trama, &trama[i], pos);
+                    break;
+                }
             }
         }
 
+        // Bytes perdidos com o buffer circular cheio: informa o total quando aumenta
+        uint32_t overruns = rx_overruns;
+        if (overruns != overruns_informados) {
+            printf("[Bluetooth] Buffer RX cheio: %lu bytes descartados\n", (unsigned long) overruns);
+            overruns_informados = overruns;
+        }
+
         // Verifica timeout: se já se passaram 2 segundos sem 'p', continuar andando
         if (parado_por_bluetooth &&
-            absolute_time_diff_us(ultimo_parar, get_absolute_time()) > 2 * 1000 * 1000) {
+            absolute_time_diff_us(ultimo_parar, get_absolute_time()) > TIMEOUT_PARAR_US) {
             mover_frente();
             parado_por_bluetooth = false;
             printf("[Bluetooth] Timeout → CONTINUAR\n");
         }
-
-        vTaskDelay(pdMS_TO_TICKS(100));
     }
 }
 
@@ -141,7 +293,8 @@ int main() {
     gpio_set_function(UART_RX_PIN, GPIO_FUNC_UART);
     uart_set_hw_flow(UART_ID, false, false);
     uart_set_format(UART_ID, 8, 1, UART_PARITY_NONE);
-    uart_set_fifo_enabled(UART_ID, false);
+    // FIFO ligada: a interrupção dispara com alguns bytes ou por timeout de recepção
+    uart_set_fifo_enabled(UART_ID, true);
 
     printf("Inicializando motores e sensores...\n");
 
@@ -163,7 +316,7 @@ int main() {
 
     xTaskCreate(vUltrasonicTask, "Ultrasonic", 256, NULL, 2, NULL);
    xTaskCreate(vMotorControlTask, "Motor", 256, NULL, 1, NULL);
-    xTaskCreate(vBluetoothTask, "Bluetooth", 256, NULL, 1, NULL);
+    xTaskCreate(vBluetoothTask, "Bluetooth", 256, NULL, 1, &xBluetoothTaskHandle);
 
     printf("Iniciando FreeRTOS Scheduler...\n");
     vTaskStartScheduler();